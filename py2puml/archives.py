@@ -0,0 +1,177 @@
+"""Reading of python source files from wheels, sdists and zip archives.
+
+A member of an archive is named after the archive and its path inside
+the archive, separated by '!/', e.g. 'dist/mypkg-1.0-py3-none-any.whl!/mypkg/core.py'.
+Such names can be used wherever a source file name is expected.
+
+Members are read in place, only when needed: a zip archive (.whl, .zip)
+decompresses each member separately. A .tar.gz archive being a single
+compressed stream, its members are read in a single pass over it, see
+`Archive.read()`.
+"""
+import errno
+import os
+import threading
+from collections import OrderedDict
+
+# separator of the archive name and of the path of a member inside
+MEMBER_SEPARATOR = '!/'
+# suffixes of the supported archive formats
+ZIP_SUFFIXES = ('.whl', '.zip')
+TAR_SUFFIXES = ('.tar.gz', '.tgz')
+
+def is_archive(path):
+    """Tells whether given path names an archive, or a path inside one."""
+    return MEMBER_SEPARATOR in path or path.endswith(ZIP_SUFFIXES + TAR_SUFFIXES)
+
+def split_member(path):
+    """Splits the name of an archive member.
+    @return (archive, member path) tuple, None if not inside an archive.
+    """
+    archive, sep, member = path.partition(MEMBER_SEPARATOR)
+    if not sep:
+        return None
+    return archive, member.strip('/')
+
+def member_name(archive, member):
+    """Builds the name of an archive member."""
+    return archive + MEMBER_SEPARATOR + member
+
+class Archive:
+    """An open archive, with the index of its files.
+
+    Members can be read from several threads.
+    """
+    def __init__(self, path):
+        """Opens an archive.
+        @raise OSError if it cannot be read
+        """
+        self.path = path
+        # (mtime, size) of the archive file when opened
+        self.stamp = None
+        self.lock = threading.Lock()
+        # member path, without leading './' -> ZipInfo or TarInfo
+        self.members = {}
+        # tar members to keep on next pass, contents of tar members read
+        self.wanted = set()
+        self.contents = {}
+        if path.endswith(TAR_SUFFIXES):
+            self.zip = None
+            for info in self._tar_pass():
+                if info.isfile():
+                    self.members[_normalize(info.name)] = info
+        else:
+            import zipfile
+            try:
+                self.zip = zipfile.ZipFile(path)
+            except zipfile.BadZipFile as err:
+                raise OSError(errno.EINVAL, 'Bad archive: %s' % err, path)
+            for info in self.zip.infolist():
+                if not info.is_dir():
+                    self.members[_normalize(info.filename)] = info
+
+    def _tar_pass(self, keep=None):
+        """Reads a tar archive through, in a single forward pass.
+
+        @param keep: names of the members whose contents are kept
+        @return list of TarInfo of all members
+        @raise OSError if it cannot be read
+        """
+        import tarfile
+        import zlib
+        infos = []
+        try:
+            with tarfile.open(self.path, 'r|*') as tar:
+                for info in tar:
+                    infos.append(info)
+                    if keep and info.isfile() and _normalize(info.name) in keep:
+                        self.contents[_normalize(info.name)] = tar.extractfile(info).read()
+        except (tarfile.TarError, EOFError, zlib.error) as err:
+            raise OSError(errno.EINVAL, 'Bad archive: %s' % err, self.path)
+        return infos
+
+    def want(self, members):
+        """Tells which members are going to be read, so that the members of
+        a tar archive are all decompressed in one pass, on first read."""
+        with self.lock:
+            self.wanted.update(members)
+
+    def read(self, member):
+        """Reads the content of a member.
+
+        The members of a zip archive are decompressed separately. A tar
+        archive being compressed as a whole, reading its members one by
+        one would decompress it again for each of them: the wanted members,
+        or else all the members of the same type as the one being read, are
+        read in a single pass, and kept in memory until read.
+
+        @return bytes
+        @raise FileNotFoundError if there is no such member
+        """
+        info = self.members.get(member)
+        if info is None:
+            raise FileNotFoundError(errno.ENOENT, 'No such file or directory',
+                                    member_name(self.path, member))
+        with self.lock:
+            if self.zip is not None:
+                return self.zip.read(info)
+            if member not in self.contents:
+                keep = self.wanted
+                if not keep:
+                    suffix = os.path.splitext(member)[1]
+                    keep = {name for name in self.members
+                            if os.path.splitext(name)[1] == suffix}
+                keep.add(member)
+                self._tar_pass(keep)
+                self.wanted = set()
+            return self.contents.pop(member)
+
+    def close(self):
+        """Releases the archive file and the member contents not read."""
+        if self.zip is not None:
+            self.zip.close()
+        self.contents = {}
+
+def _normalize(name):
+    """Member path, without leading './' or '/'."""
+    while name.startswith('./'):
+        name = name[2:]
+    return name.lstrip('/')
+
+# number of archives kept open by a process
+MAX_OPEN_ARCHIVES = 8
+
+# (archive path, process id) -> Archive, as open files are not shared
+# with worker processes, least recently used first
+_ARCHIVES = OrderedDict()
+_ARCHIVES_LOCK = threading.Lock()
+
+def open_archive(path):
+    """Opens an archive, once per process and as long as it is unchanged.
+
+    Only the `MAX_OPEN_ARCHIVES` most recently used archives are kept open,
+    older ones are closed.
+    @raise OSError if it cannot be read
+    """
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    key = (path, os.getpid())
+    with _ARCHIVES_LOCK:
+        archive = _ARCHIVES.get(key)
+        if archive is None or archive.stamp != stamp:
+            if archive is not None:
+                archive.close()
+            archive = _ARCHIVES[key] = Archive(path)
+            archive.stamp = stamp
+        _ARCHIVES.move_to_end(key)
+        while len(_ARCHIVES) > MAX_OPEN_ARCHIVES:
+            _ARCHIVES.popitem(last=False)[1].close()
+        return archive
+
+def read_member(path):
+    """Reads the content of an archive member, given its name.
+    @return bytes
+    @raise OSError if it cannot be read
+    """
+    archive, member = split_member(path)
+    return open_archive(archive).read(member)
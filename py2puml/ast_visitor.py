@@ -2,18 +2,38 @@
 """Custom Abstract Syntax Tree visitors"""
 
 import ast
+import io
 import logging
 import sys
+from collections import Counter, OrderedDict, deque, namedtuple
+from functools import partial
 from code_info import CodeInfo, ClassInfo
+from profiler import PhaseTimer
+from settings import Settings
 
 logger = logging.getLogger() # (__name__)
 
+# maximum number of threads reading files ahead
+READ_THREADS = 4
 
 
-class TreeVisitor(ast.NodeVisitor):
-    """`ast.NodeVisitor` is the primary tool for ‘scanning’ the tree.
-    To use it, subclass it and override methods visit_Foo, corresponding to the
-    node classes (see Meet the Nodes).
+
+# fields of compound statements holding nested statements, in walking order
+STATEMENT_FIELDS = frozenset(('body', 'handlers', 'orelse', 'finalbody', 'cases'))
+# (visitor class, node class) -> handler, see `TreeVisitor._handler()`
+_HANDLERS = {}
+
+class TreeVisitor:
+    """Extracts classes and module globals from a python source file.
+
+    Only statements are walked: expressions never hold a class or function
+    definition. Walking uses an explicit stack rather than recursion, so
+    deeply nested code cannot exhaust the interpreter stack.
+
+    A statement is handled by the visit_Foo method of its node class
+    (see Meet the Nodes), which returns the nested statements to walk
+    next if any. Compound statements without a handler (if, for, try,
+    with, ...) are walked through.
 
     >>> visitor = TreeVisitor("examples/person.py")
     >>> visitor.parse(
@@ -21,67 +41,174 @@ class TreeVisitor(ast.NodeVisitor):
 
     """
     # List to put the class data.
-    def __init__(self, srcfile, context=None):
+    def __init__(self, srcfile, context=None, errfile=None):
         self.srcfile = srcfile
         self.context = context
+        # where to report parsing errors, sys.stderr if None
+        self.errfile = errfile
         self.classinfo = None
         self.moduleinfo = None
         self.constructor = False
         self.tree = None
+        # infos of a file scanned for headers only, see `_scan()`
+        self.scanned = None
+        # Counter of parsed files and syntax errors, if instrumented
+        self.counts = None
 
-    def parse(self, errormsg=None):
-        """Use AST to parse the source file."""
+    def read(self, errormsg=None):
+        """Reads the source file content.
+        @return bytes, or None if the file cannot be read.
+        """
+        errfile = self.errfile or sys.stderr
         try:
-            with open(self.srcfile) as src:
-                self.tree = ast.parse(src.read())
-            return self.tree
+            import archives
+            if archives.MEMBER_SEPARATOR in self.srcfile:
+                source = archives.read_member(self.srcfile)
+            else:
+                with open(self.srcfile, 'rb') as src:
+                    source = src.read()
+            # the encoding declaration (PEP 263) or BOM is checked like the
+            # interpreter does, bytes being decoded by ast.parse() itself
+            import tokenize
+            tokenize.detect_encoding(io.BytesIO(source).readline)
+            return source
 
         except FileNotFoundError as err:
-            sys.stderr.write(str(err) + ", skipping\n")
+            errfile.write(str(err) + ", skipping\n")
+        except SyntaxError as err:
+            errfile.write('Encoding error in {0}: {1}\n'.format(self.srcfile, err.msg))
+        if errormsg:
+            errfile.write(errormsg + "\n")
+        return None
+
+    def parse(self, errormsg=None, source=None):
+        """Use AST to parse the source file.
+
+        Files of at least `header_scan_size` bytes are scanned for headers
+        instead, when the setting is not 0, see `scanner.HeaderScanner`.
+
+        @param source: file content if already read, as bytes or str
+        """
+        if source is None:
+            source = self.read(errormsg)
+            if source is None:
+                return False
+        if self._scan(source):
+            return True
+        errfile = self.errfile or sys.stderr
+        try:
+            # the encoding of bytes is detected by ast as by the interpreter
+            self.tree = ast.parse(source)
+            if self.counts is not None:
+                self.counts['files_parsed'] += 1
+            return self.tree
+
         except SyntaxError as see:
-            sys.stderr.write('Syntax error in {0}:{1}:{2}: {3}'.format(
+            if self.counts is not None:
+                self.counts['files_syntax_errors'] += 1
+            errfile.write('Syntax error in {0}:{1}:{2}: {3}'.format(
                 self.srcfile, see.lineno, see.offset, see.text))
         if errormsg:
-            sys.stderr.write(errormsg + "\n")
+            errfile.write(errormsg + "\n")
         return False
 
+    def _scan(self, source):
+        """Extracts the infos of a huge file without parsing it as a whole.
+        @return whether the file was scanned, its infos being reported
+                by visit_tree()
+        """
+        settings = getattr(self.context, 'settings', None)
+        if not settings or not settings.header_scan_size or \
+                len(source) < settings.header_scan_size:
+            return False
+        import scanner # only loaded for huge files
+        try:
+            self.scanned = scanner.scan(source, settings.write_globals)
+        except scanner.UnsupportedSyntax as err:
+            logger.info("Parsing %s as a whole: %s", self.srcfile, err)
+            if self.counts is not None:
+                self.counts['files_header_fallbacks'] += 1
+            return False
+        if self.counts is not None:
+            self.counts['files_parsed'] += 1
+            self.counts['files_header_scanned'] += 1
+        return True
+
     def visit_tree(self):
-        """Visits the parsed tree."""
-        return self.visit(self.tree)
+        """Visits the parsed tree, then releases it:
+        infos only hold names and formatted texts."""
+        if self.scanned is not None:
+            infos, self.scanned = self.scanned, None
+            for info in infos:
+                info.done(self.context)
+            return
+        # statements to walk, in reverse order, and end of scope callbacks
+        stack = [self.tree]
+        self.tree = None
+        visitor_class = self.__class__
+        while stack:
+            node = stack.pop()
+            if not isinstance(node, ast.AST):
+                node()
+                continue
+            key = (visitor_class, node.__class__)
+            handler = _HANDLERS.get(key)
+            if handler is None:
+                handler = _HANDLERS[key] = self._handler(node.__class__)
+            nested = handler(self, node)
+            if nested:
+                stack.extend(reversed(nested))
+
+    @classmethod
+    def _handler(cls, node_class):
+        """Finds the function handling given node class, called with
+        the visitor and the node. Handlers are not bound to the visitor,
+        so that caching them makes no reference cycle keeping the visitor
+        and its infos alive."""
+        handler = getattr(cls, 'visit_' + node_class.__name__, None)
+        if handler is not None:
+            return handler
+        fields = [field for field in node_class._fields if field in STATEMENT_FIELDS]
+        if not fields:
+            return _no_statements
+        # nested statements of a compound statement,
+        # with except and case clauses which are walked the same way
+        return lambda visitor, node: [child for field in fields for child in getattr(node, field)]
 
     def visit_Module(self, node):
         """
-        Overrides AST module visitor (top level).
+        Module visitor (top level).
 
         :param node ast.Node : The parsed code
+        :return the statements to walk
         """
         # Instanciate moduleinfo if required
-        # self.moduleinfo = context.getboolean(
-        #     'module','write-globals', fallback=False) and CodeInfo() or None
-        self.moduleinfo = CodeInfo() if self.context.opt_globals() else None
+        self.moduleinfo = CodeInfo() if self.context.settings.write_globals else None
 
         # Run through all children of the module
-        for child in node.body:
-            self.visit(child)
+        return node.body + [self._end_module]
 
+    def _end_module(self):
+        "Reports the module globals once walked."
         if self.moduleinfo:
             self.moduleinfo.done(self.context)
 
-
     def visit_ClassDef(self, node):
         """
-        Overrides AST class definition visitor.
+        Class definition visitor.
 
         :param node: The node of the class.
+        :return the statements to walk
         """
         # push context
         prev_classinfo = self.classinfo
         self.classinfo = ClassInfo(node)
 
         # Run through all children of the class definition
-        for child in node.body:
-            self.visit(child)
+        return node.body + [partial(self._end_class, prev_classinfo)]
 
+    def _end_class(self, prev_classinfo):
+        "Reports a class definition once walked."
         # finished class parsing, report it now.
         if self.classinfo:
             self.classinfo.done(self.context)
@@ -90,21 +217,25 @@ class TreeVisitor(ast.NodeVisitor):
         self.classinfo = prev_classinfo
 
     def visit_FunctionDef(self, node):
-        "Overrides AST function definition visitor"
+        "Function definition visitor, walks constructors only."
         if self.classinfo:
             # Check if this s the constructor.
             if node.name == '__init__':
                 self.constructor = True
                 # Find all assignment expressions in the constructor.
-                for code in node.body:
-                    self.visit(code)
-                self.constructor = False
+                return node.body + [partial(self._end_constructor, node)]
             self.classinfo.add_method(node)
         elif self.moduleinfo:
             self.moduleinfo.add_function(node)
+        return None
+
+    def _end_constructor(self, node):
+        "Registers the constructor once walked."
+        self.constructor = False
+        self.classinfo.add_method(node)
 
     def visit_Assign(self, node):
-        "Overrides AST assignment statement visitor"
+        "Assignment statement visitor"
         # FIXME assignments to imported names may incorrectly report variable declaration
         # pylint: disable=unnecessary-lambda
         if self.constructor:
@@ -124,8 +255,214 @@ class TreeVisitor(ast.NodeVisitor):
                 fn = lambda x: self.moduleinfo.add_variable(x)
                 # pylint disable=unnecessary-lambda
             else:
-                return
+                return None
             for target in node.targets:
                 # keep only simple names
                 if isinstance(target, ast.Name):
                     fn(target.id)
+        return None
+
+def _no_statements(visitor, node): # pylint: disable=unused-argument
+    "Handler of simple statements, holding no nested statement."
+    return None
+
+
+class InfoCollector:
+    """Stand-in for a PUML_Generator context, recording the infos reported
+    by a TreeVisitor instead of printing them.
+
+    This allows running the parsing phase away from the generator,
+    e.g. in a worker process, and replaying it later in the generator
+    with `PUML_Generator.emit_file()`.
+    """
+    def __init__(self, settings=None):
+        self.settings = settings or Settings()
+        self.infos = []
+
+    def print_classinfo(self, classinfo):
+        """Records a parsed class definition."""
+        self.infos.append(classinfo)
+
+    def print_codeinfo(self, codeinfo):
+        """Records parsed module globals."""
+        self.infos.append(codeinfo)
+
+
+def read_source(srcfile, errormsg=None):
+    """Reads a source file, like `TreeVisitor.read()`, capturing errors.
+    This is done by read-ahead threads, see `read_ahead()`.
+
+    @return (source, errors) tuple: the file content as bytes, None if the
+            file cannot be read, and the error messages text.
+    """
+    errors = io.StringIO()
+    source = TreeVisitor(srcfile, errfile=errors).read(errormsg)
+    return source, errors.getvalue()
+
+def read_ahead(srcfiles, depth, errormsg=None):
+    """Reads source files in background threads, ahead of their processing.
+
+    At most `depth` files are read ahead, so that memory use does not grow
+    with the number of files. Files are not read ahead if depth is 0.
+
+    @param srcfiles: iterable of source file names, consumed lazily
+    @param depth: number of files read ahead
+    @return iterator of (srcfile, read) tuples, read being the result of
+            `read_source()`, or None if the file has not been read ahead.
+    """
+    if not depth:
+        for srcfile in srcfiles:
+            yield srcfile, None
+        return
+    from concurrent.futures import ThreadPoolExecutor
+    pending = deque()
+    with ThreadPoolExecutor(min(depth, READ_THREADS)) as pool:
+        for srcfile in srcfiles:
+            pending.append((srcfile, pool.submit(read_source, srcfile, errormsg)))
+            if len(pending) > depth:
+                srcfile, future = pending.popleft()
+                yield srcfile, future.result()
+        while pending:
+            srcfile, future = pending.popleft()
+            yield srcfile, future.result()
+
+class ModelMemo:
+    """Infos extracted during a run, by content of their source file,
+    so that files having the same content are parsed only once.
+
+    Only the most recently used `size` models are kept.
+    """
+    def __init__(self, size):
+        self.size = size
+        # content key -> infos
+        self.models = OrderedDict()
+        # number of files whose infos were reused
+        self.duplicates = 0
+
+    @staticmethod
+    def key(read):
+        """Computes the content key of a file.
+
+        @param read: result of `read_source()`
+        @return the key, None if the file could not be read
+        """
+        if read is None or read[0] is None:
+            return None
+        import hashlib
+        return hashlib.blake2b(read[0], digest_size=16).digest()
+
+    def get(self, key):
+        """Infos extracted from the same content, counted as a duplicate.
+        @return list of infos, None if not found
+        """
+        infos = self.models.get(key)
+        if infos is not None:
+            self.models.move_to_end(key)
+            self.duplicates += 1
+        return infos
+
+    def put(self, key, infos):
+        """Keeps the infos extracted from a content, if any."""
+        if key is None or infos is None:
+            return
+        self.models[key] = infos
+        if len(self.models) > self.size:
+            self.models.popitem(last=False)
+
+
+# infos extracted by a pool worker process, see `init_worker()`
+_worker_memo = None
+
+def init_worker(dedup_models):
+    """Initializes a worker process of `extract_in_worker()`: files having
+    the same content as a file it extracted before are not parsed again.
+
+    @param dedup_models: number of models kept, see `ModelMemo`,
+           0 to parse all files
+    """
+    global _worker_memo # pylint: disable=global-statement
+    _worker_memo = ModelMemo(dedup_models) if dedup_models else None
+
+# Result of `extract()`
+Extraction = namedtuple('Extraction', ['infos', 'errors', 'cached', 'times', 'counts'])
+Extraction.__new__.__defaults__ = (None, None)
+
+def extract(srcfile, settings=None, errormsg=None, cache=None, profile=False, read=None):
+    """Parses a single source file and collects its infos, without output.
+
+    Being a plain function of picklable arguments, it can be run by a
+    process pool. Error messages are captured rather than written, so the
+    caller can report them in the original order.
+
+    @param settings Settings: configuration options (default None)
+    @param cache ExtractionCache: where to look for infos extracted earlier
+           from the same content, and to store new ones (default None)
+    @param profile: whether to measure the time spent in each phase,
+           and count parsed files
+    @param read: result of `read_source()` if the file was read ahead
+    @return Extraction(infos, errors, cached, times, counts) tuple: the
+            list of collected infos, None if the file was skipped, the error
+            messages text, whether the infos were found in cache, and the
+            phase timings and parsing counters if profiling.
+    """
+    errors = io.StringIO()
+    collector = InfoCollector(settings)
+    visitor = TreeVisitor(srcfile, collector, errfile=errors)
+    timer = None
+    if profile:
+        timer = PhaseTimer()
+        visitor.counts = Counter()
+    if read is None:
+        source = visitor.read(errormsg)
+    else:
+        source, read_errors = read
+        errors.write(read_errors)
+    if timer:
+        timer.lap('read')
+    if source is None:
+        return Extraction(None, errors.getvalue(), False, timer and timer.times, visitor.counts)
+    if cache:
+        key = cache.key(source)
+        infos = cache.get(key)
+        if timer:
+            timer.lap('cache')
+        if infos is not None:
+            return Extraction(infos, '', True, timer and timer.times, visitor.counts)
+    parsed = bool(visitor.parse(errormsg, source))
+    if timer:
+        timer.lap('parse')
+    if not parsed:
+        return Extraction(None, errors.getvalue(), False, timer and timer.times, visitor.counts)
+    visitor.visit_tree()
+    if timer:
+        timer.lap('visit')
+    if cache:
+        cache.put(key, collector.infos)
+        if timer:
+            timer.lap('cache')
+    return Extraction(collector.infos, errors.getvalue(), False, timer and timer.times, visitor.counts)
+
+def extract_in_worker(srcfile, settings=None, errormsg=None, cache=None, profile=False):
+    """Runs `extract()` in a pool worker process, reusing the infos the
+    process extracted from the same content, if any, see `init_worker()`.
+
+    @return (extraction, duplicate) tuple: the Extraction, and whether its
+            infos were reused
+    """
+    memo = _worker_memo
+    if memo is None:
+        return extract(srcfile, settings, errormsg, cache, profile), False
+    timer = PhaseTimer() if profile else None
+    read = read_source(srcfile, errormsg)
+    if timer:
+        timer.lap('read')
+    key = memo.key(read)
+    infos = memo.get(key)
+    if infos is not None:
+        return Extraction(infos, read[1], False, timer and timer.times,
+                          Counter() if profile else None), True
+    result = extract(srcfile, settings, errormsg, cache, profile, read)
+    if timer:
+        result.times['read'] = timer.times['read']
+    memo.put(key, result.infos)
+    return result, False
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Benchmark of the extraction of classes from parsed trees.
+
+Compares `TreeVisitor.visit_tree()`, which only walks statements with an
+explicit stack, with the previous recursive `ast.NodeVisitor` descent,
+which also walked every expression. Both must give the same output.
+Trees are parsed beforehand, only the walking is timed.
+
+Sources are given python files (default: a few standard library modules),
+plus a generated module typical of generated code: large data tables and
+a long `if __name__ == '__main__'` block.
+
+    $ python benchmarks/bench_extract.py [file.py ...]
+"""
+# pylint: disable=invalid-name
+import ast
+import io
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# pylint: disable=wrong-import-position
+from ast_visitor import InfoCollector, TreeVisitor
+from code_info import ClassInfo, CodeInfo
+from puml_generator import PUML_Generator
+from settings import Settings
+
+DEFAULT_SOURCES = ['argparse', 'configparser', 'logging/__init__', 'typing', 'ast']
+
+class RecursiveVisitor(ast.NodeVisitor):
+    "Previous implementation of TreeVisitor, walking the whole tree recursively"
+    def __init__(self, context):
+        self.context = context
+        self.classinfo = None
+        self.moduleinfo = None
+        self.constructor = False
+
+    def visit_Module(self, node): # pylint: disable=missing-docstring
+        self.moduleinfo = CodeInfo() if self.context.settings.write_globals else None
+        for child in node.body:
+            self.visit(child)
+        if self.moduleinfo:
+            self.moduleinfo.done(self.context)
+
+    def visit_ClassDef(self, node): # pylint: disable=missing-docstring
+        prev_classinfo = self.classinfo
+        self.classinfo = ClassInfo(node)
+        for child in node.body:
+            self.visit(child)
+        if self.classinfo:
+            self.classinfo.done(self.context)
+        self.classinfo = prev_classinfo
+
+    def visit_FunctionDef(self, node): # pylint: disable=missing-docstring
+        if self.classinfo:
+            if node.name == '__init__':
+                self.constructor = True
+                for code in node.body:
+                    self.visit(code)
+                self.constructor = False
+            self.classinfo.add_method(node)
+        elif self.moduleinfo:
+            self.moduleinfo.add_function(node)
+
+    def visit_Assign(self, node): # pylint: disable=missing-docstring
+        if self.constructor:
+            for target in node.targets:
+                if (isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name)
+                        and target.value.id == 'self'):
+                    self.classinfo.add_member(target.attr)
+            return
+        if self.classinfo:
+            add = self.classinfo.add_classvar
+        elif self.moduleinfo:
+            add = self.moduleinfo.add_variable
+        else:
+            return
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                add(target.id)
+
+def generated_source(rows=2000, calls=2000):
+    "A module in the style of generated code, with a few classes"
+    lines = ["TABLE = {"]
+    lines += ["    %d: (%d, 'name%d', [%d, %d, {'k': %d.5}])," % (i, i, i, i, -i, i)
+              for i in range(rows)]
+    lines += ["}", "", "class Record:",
+              "    def __init__(self, key):",
+              "        self.key = key",
+              "        self.row = TABLE[key]", "",
+              "if __name__ == '__main__':"]
+    lines += ["    print(Record(%d).row[2][2]['k'] * (%d + %d) - len(TABLE))" % (i, i, i)
+              for i in range(calls)]
+    return '\n'.join(lines) + '\n'
+
+def walk_new(tree, settings):
+    "Extracts infos with the current visitor"
+    collector = InfoCollector(settings)
+    visitor = TreeVisitor('<bench>', collector)
+    visitor.tree = tree
+    visitor.visit_tree()
+    return collector.infos
+
+def walk_old(tree, settings):
+    "Extracts infos with the previous visitor"
+    collector = InfoCollector(settings)
+    RecursiveVisitor(collector).visit(tree)
+    return collector.infos
+
+def main(filenames):
+    "Runs the benchmark"
+    if not filenames:
+        libdir = os.path.dirname(os.__file__)
+        filenames = [os.path.join(libdir, name + '.py') for name in DEFAULT_SOURCES]
+    sources = []
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            sources.append((os.path.basename(filename), f.read()))
+    sources.append(('<generated>', generated_source()))
+
+    settings = Settings()
+    gen = PUML_Generator(io.StringIO())
+    failures = 0
+    for name, source in sources:
+        tree = ast.parse(source)
+        if gen.render(walk_new(tree, settings)) != gen.render(walk_old(tree, settings)):
+            print("%-20s output mismatch" % name)
+            failures += 1
+            continue
+        times = []
+        for func in (walk_old, walk_new):
+            timer = timeit.Timer(lambda func=func: func(tree, settings))
+            number, total = timer.autorange()
+            times.append(min([total] + timer.repeat(repeat=2, number=number)) / number)
+        print("%-20s recursive %8.2f ms  pruned %8.2f ms  x%.1f" % (
+            name, times[0] * 1e3, times[1] * 1e3, times[0] / times[1]))
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
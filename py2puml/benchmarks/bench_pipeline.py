@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Benchmark suite of the py2puml pipeline, on a generated corpus.
+
+Times each phase separately: 'read', 'parse', 'visit', 'format' and 'write',
+with flat output and with namespaces (--root), then complete command runs,
+and measures the peak memory of generating a diagram. Timings are the
+best of several runs.
+
+Results can be saved as JSON, and compared with the results of a previous
+run: any metric worse than the baseline by more than the threshold is a
+regression, and makes the benchmark fail.
+
+    $ python benchmarks/bench_pipeline.py --output baseline.json
+    ... change the code ...
+    $ python benchmarks/bench_pipeline.py --baseline baseline.json
+"""
+# pylint: disable=invalid-name
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# pylint: disable=wrong-import-position
+from corpus import Corpus
+from profiler import Profiler
+from puml_generator import PUML_Generator, PUML_Generator_NS
+
+PHASES = ('read', 'parse', 'visit', 'format', 'write')
+
+def time_phases(files, root=None, repeat=3):
+    """Generates a diagram in-process, timing each phase.
+
+    @param root: corpus directory for namespaces, None for flat output
+    @return dict of phase -> best wall time in seconds
+    """
+    best = {}
+    for i in range(repeat): # pylint: disable=unused-variable
+        if root:
+            gen = PUML_Generator_NS(io.StringIO(), root)
+        else:
+            gen = PUML_Generator(io.StringIO())
+        gen.profiler = Profiler()
+        gen.header()
+        gen.do_files(files)
+        gen.footer()
+        phases = gen.profiler.report()['phases']
+        for phase in PHASES:
+            wall = phases.get(phase, {'wall': 0.0})['wall']
+            best[phase] = min(best.get(phase, wall), wall)
+    return best
+
+def time_command(directory, repeat=3):
+    """Runs the py2puml command on the corpus.
+    @return best wall time in seconds
+    """
+    output = os.path.join(directory, 'out.puml')
+    command = [sys.executable, 'py2puml.py', '--root', directory, '-o', output, directory]
+    best = None
+    for i in range(repeat): # pylint: disable=unused-variable
+        start = time.perf_counter()
+        subprocess.run(command, cwd=HERE, check=True)
+        wall = time.perf_counter() - start
+        best = wall if best is None else min(best, wall)
+    return best
+
+def peak_memory(files, root):
+    """Generates a diagram with namespaces, tracing memory allocations.
+    @return peak of allocated memory, in bytes
+    """
+    tracemalloc.start()
+    try:
+        gen = PUML_Generator_NS(io.StringIO(), root)
+        gen.header()
+        gen.do_files(files)
+        gen.footer()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run(corpus, repeat=3):
+    """Runs all the benchmarks on a corpus written in a temporary directory.
+    @return the results dict
+    """
+    metrics = {}
+    with tempfile.TemporaryDirectory() as directory:
+        files = corpus.write(directory)
+        for name, root in (('flat', None), ('ns', directory)):
+            for phase, wall in time_phases(files, root, repeat).items():
+                metrics['%s.%s' % (name, phase)] = wall
+        metrics['command'] = time_command(directory, repeat)
+        metrics['memory.peak'] = peak_memory(files, directory)
+    return {
+        'corpus': dict(corpus.settings(), files=len(files)),
+        'python': platform.python_version(),
+        'metrics': metrics,
+    }
+
+def compare(results, baseline, threshold, noise):
+    """Compares results with a baseline.
+
+    @param threshold: relative increase of a metric making it a regression
+    @param noise: smaller increases of timings, in seconds, are ignored
+    @return list of the regressed metrics names
+    """
+    if results['corpus'] != baseline['corpus']:
+        print("warning: baseline corpus differs:", baseline['corpus'])
+    regressions = []
+    print("%-16s %12s %12s %8s" % ('metric', 'baseline', 'current', 'change'))
+    for name, value in sorted(results['metrics'].items()):
+        old = baseline['metrics'].get(name)
+        if old is None:
+            continue
+        change = (value - old) / old if old else 0.0
+        regressed = change > threshold and (name.startswith('memory') or value - old > noise)
+        if regressed:
+            regressions.append(name)
+        print("%-16s %12s %12s %+7.1f%%%s" % (
+            name, _format(name, old), _format(name, value), change * 100,
+            '  REGRESSION' if regressed else ''))
+    return regressions
+
+def _format(name, value):
+    "Formats a metric value"
+    if name.startswith('memory'):
+        return '%.1f MB' % (value / 2**20)
+    return '%.1f ms' % (value * 1e3)
+
+def main(argv=None):
+    "Runs the benchmark suite"
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with the results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='relative increase making a regression (default %(default)s)')
+    parser.add_argument('--noise', type=float, default=0.005,
+                        help='ignored increase of timings, in seconds (default %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='best of how many runs (default %(default)s)')
+    defaults = Corpus()
+    for option, value in defaults.settings().items():
+        parser.add_argument('--' + option, type=type(value), default=value,
+                            help='corpus parameter (default %(default)s)')
+    args = parser.parse_args(argv)
+
+    corpus = Corpus(**{option: getattr(args, option) for option in defaults.settings()})
+    results = run(corpus, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if not args.baseline:
+        for name, value in sorted(results['metrics'].items()):
+            print("%-16s %12s" % (name, _format(name, value)))
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold, args.noise)
+    if regressions:
+        print("%d regression(s): %s" % (len(regressions), ', '.join(regressions)))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
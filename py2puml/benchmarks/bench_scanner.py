@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Benchmark of the header-only scanner against the full ast parsing.
+
+Extracts the infos of each source with `ast.parse()` and the TreeVisitor,
+then with the `scanner.HeaderScanner`, which must give the same output.
+Reports the best time of a few runs and the peak memory allocated, as
+measured by tracemalloc in a separate run.
+
+Sources are given python files (default: a few standard library modules),
+plus generated modules typical of the huge files the scanner is meant
+for: a lookup table and protobuf-like message stubs.
+
+    $ python benchmarks/bench_scanner.py [--runs N] [file.py ...]
+"""
+# pylint: disable=invalid-name
+import argparse
+import ast
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# pylint: disable=wrong-import-position
+from ast_visitor import InfoCollector, TreeVisitor
+from puml_generator import PUML_Generator
+from scanner import scan
+from settings import Settings
+
+DEFAULT_SOURCES = ['argparse', 'typing', 'ast']
+
+def lookup_table(rows=60000):
+    "A module holding a large data table, and a few classes"
+    lines = ['"""Generated table."""', 'TABLE = {']
+    lines += ["    %d: ('name%d', %d, %.3f, [%d, -%d])," % (i, i, i * 7, i / 3, i, i)
+              for i in range(rows)]
+    lines += ['}', '', 'class Row:', '    def __init__(self, key):',
+              '        self.key = key', '        self.value = TABLE[key]']
+    return '\n'.join(lines) + '\n'
+
+def message_stubs(messages=600, fields=12):
+    "A module of protobuf-like message classes, with long method bodies"
+    lines = ['"""Generated stubs."""', 'import struct', '']
+    for i in range(messages):
+        lines += ['class Message%d(object):' % i,
+                  '    __slots__ = (%s)' % ', '.join("'f%d'" % j for j in range(fields)),
+                  '    DESCRIPTOR = %r' % bytes(range(i % 50, i % 50 + 60)),
+                  '    def __init__(self, %s):' % ', '.join('f%d=None' % j for j in range(fields))]
+        lines += ['        self.f%d = f%d' % (j, j) for j in range(fields)]
+        lines += ['    def SerializeToString(self) -> bytes:', '        out = []']
+        for j in range(fields):
+            lines += ['        if self.f%d is not None:' % j,
+                      "            out.append(struct.pack('<i', %d))" % j]
+        lines += ["        return b''.join(out)", '']
+    return '\n'.join(lines) + '\n'
+
+def extract_ast(source, settings):
+    "Extracts infos from the whole tree"
+    collector = InfoCollector(settings)
+    visitor = TreeVisitor('<bench>', collector)
+    visitor.tree = ast.parse(source)
+    visitor.visit_tree()
+    return collector.infos
+
+def extract_scan(source, settings):
+    "Extracts infos with the header scanner"
+    return scan(source, settings.write_globals)
+
+def best_time(func, source, settings, runs):
+    "Best wall time of a few runs, in seconds"
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(source, settings)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def peak_memory(func, source, settings):
+    "Peak memory allocated by an extraction, in bytes"
+    tracemalloc.start()
+    try:
+        func(source, settings)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def main(argv=None):
+    "Runs the benchmark"
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=3,
+                        help='best of how many runs (default %(default)s)')
+    parser.add_argument('files', nargs='*', help='python source files')
+    args = parser.parse_args(argv)
+    filenames = args.files
+    if not filenames:
+        libdir = os.path.dirname(os.__file__)
+        filenames = [os.path.join(libdir, name + '.py') for name in DEFAULT_SOURCES]
+    sources = []
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            sources.append((os.path.basename(filename), f.read()))
+    sources.append(('<lookup table>', lookup_table().encode('utf-8')))
+    sources.append(('<message stubs>', message_stubs().encode('utf-8')))
+
+    settings = Settings()
+    gen = PUML_Generator(io.StringIO())
+    failures = 0
+    for name, source in sources:
+        if gen.render(extract_ast(source, settings)) != gen.render(extract_scan(source, settings)):
+            print("%-16s output mismatch" % name)
+            failures += 1
+            continue
+        times = [best_time(func, source, settings, args.runs)
+                 for func in (extract_ast, extract_scan)]
+        peaks = [peak_memory(func, source, settings) / 1e6
+                 for func in (extract_ast, extract_scan)]
+        print("%-16s %6.2f MB  ast %8.1f ms %7.1f MB  scanner %8.1f ms %7.1f MB  x%.1f" % (
+            name, len(source) / 1e6, times[0] * 1e3, peaks[0], times[1] * 1e3, peaks[1],
+            times[0] / times[1]))
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Benchmark of function signatures rendering.
+
+Compares `signature.format_arguments()` with the previous implementation of
+`PUML_Generator.arglist()`, which copied the arguments node and rendered it
+with astor, on all the functions found in given python files
+(default: a few standard library modules).
+
+    $ python benchmarks/bench_signature.py [file.py ...]
+"""
+# pylint: disable=invalid-name
+import ast
+import copy
+import os
+import re
+import sys
+import timeit
+
+import astor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from signature import format_arguments # pylint: disable=wrong-import-position
+
+DEFAULT_SOURCES = ['argparse', 'configparser', 'logging/__init__', 'typing', 'ast']
+
+def astor_arguments(args, omit_first=False, omit_defaults=False):
+    "Previous implementation, as was in PUML_Generator.arglist()"
+    args = copy.deepcopy(args)
+    if omit_first:
+        args.args.pop(0)
+    if omit_defaults:
+        args.defaults = []
+        args.kw_defaults = []
+    return astor.to_source(args).rstrip()
+
+def unwrap(text):
+    "Undoes the wrapping of long lines by astor, unwanted in diagrams"
+    return re.sub(r'\n\s*', '', text)
+
+def collect(filenames):
+    "Lists the arguments nodes of all functions defined in given files"
+    nodes = []
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            tree = ast.parse(f.read())
+        nodes.extend(node.args for node in ast.walk(tree)
+                     if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)))
+    return nodes
+
+def main(filenames):
+    "Runs the benchmark"
+    if not filenames:
+        libdir = os.path.dirname(os.__file__)
+        filenames = [os.path.join(libdir, name + '.py') for name in DEFAULT_SOURCES]
+    nodes = collect(filenames)
+    # astor misplaces defaults of positional-only parameters
+    compared = [args for args in nodes if not getattr(args, 'posonlyargs', None)]
+    mismatches = [astor_arguments(args) for args in compared
+                  if format_arguments(args) != unwrap(astor_arguments(args))]
+    print("%d functions in %d files, %d mismatches" % (
+        len(nodes), len(filenames), len(mismatches)))
+    for text in mismatches[:10]:
+        print("  mismatch:", text)
+
+    for name, func in (('astor', astor_arguments), ('direct', format_arguments)):
+        timer = timeit.Timer(lambda func=func: [func(args) for args in compared])
+        number, total = timer.autorange()
+        best = min([total] + timer.repeat(repeat=2, number=number)) / number
+        print("%-8s %8.2f ms per pass, %6.2f us per function" % (
+            name, best * 1e3, best * 1e6 / len(compared)))
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
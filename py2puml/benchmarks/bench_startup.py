@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Benchmark of the py2puml command startup time.
+
+Measures the import time of the py2puml module with `python -X importtime`,
+lists the slowest imported modules, and times a complete run on a small
+file. Fails if the import time exceeds the budget, so that new heavy
+imports at module level get noticed.
+
+    $ python benchmarks/bench_startup.py [--budget MS] [--runs N]
+"""
+# pylint: disable=invalid-name
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# import time budget of the py2puml module, in milliseconds
+DEFAULT_BUDGET = 40.0
+
+def import_times():
+    """Imports py2puml in a fresh interpreter.
+    @return dict of module name -> (self, cumulative) import time in us
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import py2puml'],
+                          cwd=HERE, stderr=subprocess.PIPE, universal_newlines=True,
+                          check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+def run_time():
+    """Runs the py2puml command on a small file.
+    @return wall time in seconds
+    """
+    start = time.perf_counter()
+    subprocess.run([sys.executable, 'py2puml.py', 'examples/person.py'],
+                   cwd=HERE, stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+def main(argv=None):
+    "Runs the benchmark"
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help='import time budget in ms (default %(default)s)')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='best of how many runs (default %(default)s)')
+    args = parser.parse_args(argv)
+
+    # the best run is the least disturbed by other processes
+    runs = [import_times() for i in range(args.runs)]
+    best = min(runs, key=lambda times: times['py2puml'][1])
+    total = best['py2puml'][1] / 1e3
+    print("import py2puml: %.1f ms (budget %.1f ms)" % (total, args.budget))
+    print("slowest modules (self time):")
+    for name, (own, cumulative) in sorted(best.items(), key=lambda item: -item[1][0])[:10]:
+        print("  %-24s %7.1f ms %7.1f ms cumulative" % (name, own / 1e3, cumulative / 1e3))
+
+    wall = min(run_time() for i in range(args.runs))
+    print("py2puml examples/person.py: %.1f ms" % (wall * 1e3))
+    return 1 if total > args.budget else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Deterministic generator of python source trees, used as benchmark input.
+
+The corpus is made of packages of modules holding classes, whose methods
+have a mix of decorators, default values and annotations. The same
+parameters and seed always give the same files.
+
+    $ python benchmarks/corpus.py DIR [--packages N] [--modules M] [--classes K]
+"""
+# pylint: disable=invalid-name
+import argparse
+import os
+import random
+import sys
+
+DECORATORS = ['@staticmethod', '@classmethod', '@property', '@abstractmethod',
+              '@functools.lru_cache(maxsize=128)', '@contextlib.contextmanager']
+DEFAULTS = ['None', '0', '-1', '2.5', "'text'", 'True', '()', '(1, 2)', '[]',
+            "{'key': 1}", 'object()', 'os.sep', '...']
+ANNOTATIONS = ['int', 'str', 'float', 'bool', 'bytes', 'typing.List[int]',
+               'typing.Dict[str, typing.Any]', 'typing.Optional[str]', "'Forward'"]
+
+class Corpus:
+    """Parameters of a generated corpus.
+
+    @param packages: number of packages
+    @param modules: number of modules per package
+    @param classes: number of classes per module
+    @param methods: number of methods per class, besides __init__
+    @param params: maximum number of parameters per method
+    @param decorators: ratio of decorated methods
+    @param defaults: ratio of parameters with default values
+    @param annotations: ratio of annotated parameters
+    @param seed: random seed
+    """
+    def __init__(self, packages=4, modules=10, classes=10, methods=6, params=4,
+                 decorators=0.3, defaults=0.4, annotations=0.5, seed=0):
+        self.packages = packages
+        self.modules = modules
+        self.classes = classes
+        self.methods = methods
+        self.params = params
+        self.decorators = decorators
+        self.defaults = defaults
+        self.annotations = annotations
+        self.seed = seed
+
+    def settings(self):
+        """The corpus parameters, as a dict."""
+        return dict(vars(self))
+
+    def write(self, directory):
+        """Writes the corpus files.
+
+        @param directory: where to create the packages
+        @return list of written file names, in walking order
+        """
+        files = []
+        for p in range(self.packages):
+            package = os.path.join(directory, 'package%d' % p)
+            os.makedirs(package, exist_ok=True)
+            files.append(self._write(os.path.join(package, '__init__.py'), ''))
+            for m in range(self.modules):
+                rnd = random.Random('%d/%d/%d' % (self.seed, p, m))
+                files.append(self._write(os.path.join(package, 'module%d.py' % m),
+                                         self.module_source(rnd)))
+        return files
+
+    @staticmethod
+    def _write(filename, text):
+        with open(filename, 'w') as f:
+            f.write(text)
+        return filename
+
+    def module_source(self, rnd):
+        """Generates the source of a module."""
+        lines = ['"""Generated module."""',
+                 'import contextlib', 'import functools', 'import os', 'import typing',
+                 'from abc import abstractmethod', '',
+                 'CONSTANT = %d' % rnd.randrange(1000),
+                 'TABLE = {%s}' % ', '.join('%d: %r' % (i, 'v%d' % i) for i in range(10)),
+                 '']
+        names = []
+        for c in range(self.classes):
+            name = 'Class%d' % c
+            bases = rnd.sample(names, min(len(names), rnd.randrange(3))) or ['object']
+            lines.extend(self.class_source(rnd, name, bases))
+            names.append(name)
+        lines.extend(self.function_source(rnd, 'helper', decorated=False))
+        lines += ['', "if __name__ == '__main__':",
+                  '    print(%s)' % ', '.join('%s()' % name for name in names[:3]), '']
+        return '\n'.join(lines)
+
+    def class_source(self, rnd, name, bases):
+        """Generates the source lines of a class."""
+        lines = ['class %s(%s):' % (name, ', '.join(bases)),
+                 '    """Generated class."""',
+                 '    counter = 0',
+                 '    _registry = {}', '',
+                 '    def __init__(self, value=None):']
+        lines += ['        self.%s%d = value' % (rnd.choice(['attr', '_attr']), i)
+                  for i in range(rnd.randint(1, 4))]
+        lines.append('')
+        for m in range(self.methods):
+            lines.extend('    ' + line if line else line for line in self.function_source(
+                rnd, rnd.choice(['method', '_method', '__method']) + str(m), method=True))
+        return lines
+
+    def function_source(self, rnd, name, method=False, decorated=True):
+        """Generates the source lines of a function or method."""
+        lines = []
+        static = False
+        if decorated and rnd.random() < self.decorators:
+            decorator = rnd.choice(DECORATORS)
+            static = decorator == '@staticmethod'
+            lines.append(decorator)
+        params = ['self'] if method and not static else []
+        count = rnd.randint(0, self.params)
+        kinds = sorted(rnd.random() < self.defaults for i in range(count))
+        for i, default in enumerate(kinds):
+            param = 'arg%d' % i
+            if rnd.random() < self.annotations:
+                param += ': ' + rnd.choice(ANNOTATIONS)
+            if default:
+                param += '=' + rnd.choice(DEFAULTS)
+            params.append(param)
+        if rnd.random() < 0.2:
+            params.append('*args')
+        if rnd.random() < 0.2:
+            params.append('**kwargs')
+        returns = ' -> %s' % rnd.choice(ANNOTATIONS) if rnd.random() < self.annotations else ''
+        lines += ['def %s(%s)%s:' % (name, ', '.join(params), returns),
+                  '    """Generated function."""',
+                  '    result = [i * 2 for i in range(%d)]' % rnd.randrange(100),
+                  '    return result', '']
+        return lines
+
+def main(argv=None):
+    "Writes a corpus"
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('directory')
+    defaults = Corpus()
+    for option, value in defaults.settings().items():
+        parser.add_argument('--' + option, type=type(value), default=value,
+                            help='(default %(default)s)')
+    args = vars(parser.parse_args(argv))
+    directory = args.pop('directory')
+    files = Corpus(**args).write(directory)
+    print("%d files written in %s" % (len(files), directory))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,31 +1,81 @@
 """
-Classes for managing infos and ast nodes about parsed python code.
+Classes for managing infos about parsed python code.
 
-Infos are fed by some ast.NodeVisitor and used by some PUML_Generator.
+Infos are fed by the TreeVisitor and used by some PUML_Generator.
+They keep no ast node: names, signatures and decorators are rendered
+while parsing, so that infos are small and cheap to pickle.
 """
 import logging
 import ast
 
+from signature import format_expr, split_arguments
+
 logger = logging.getLogger() # (__name__) # pylint: disable=invalid-name
 
+def deco_marker(dec):
+    """Renders a function decorator as a plantuml marker."""
+    if not isinstance(dec, ast.Name):
+        # dotted names and calls
+        return '@' + format_expr(dec)
+    if dec.id == 'staticmethod':
+        return 'static'
+    if dec.id == 'abstractmethod':
+        return 'abstract'
+    return '@' + dec.id
+
+class FunctionInfo:
+    """
+    A parsed function or method definition.
+
+    Parameters are rendered one by one, options such as omit-self
+    or omit-defaults being applied when printing.
+    """
+    __slots__ = ('name', 'params', 'markers', 'static')
+
+    def __init__(self, name, params=(), markers=(), static=False):
+        self.name = name
+        # (text, default) pairs, see signature.split_arguments()
+        self.params = params
+        # rendered decorators
+        self.markers = markers
+        self.static = static
+
+    @classmethod
+    def from_node(cls, node):
+        """Builds the infos of an ast.FunctionDef node, left unchanged."""
+        static = any(isinstance(dec, ast.Name) and dec.id == 'staticmethod'
+                     for dec in node.decorator_list)
+        return cls(node.name, split_arguments(node.args),
+                   tuple(deco_marker(dec) for dec in node.decorator_list),
+                   static)
+
+    def __repr__(self):
+        return 'FunctionInfo(%r, %r, %r, %r)' % (
+            self.name, self.params, self.markers, self.static)
+
 class CodeInfo:
     """
     Container for collecting information about various code elements .
     """
+    __slots__ = ('_variables', 'functions')
+
     def __init__(self):
-        self.variables = []
+        # dict as an insertion-ordered set
+        self._variables = {}
         self.functions = []
 
+    @property
+    def variables(self):
+        """The list of variable names, in order of first assignment."""
+        return list(self._variables)
+
     def add_variable(self, name):
         "Registers a global variable"
-        if name not in self.variables:
-            self.variables.append(name)
+        self._variables[name] = None
 
     def add_function(self, node):
         "Registers a function"
-        # don't store unneeded body
-        node.body = ast.Pass()
-        self.functions.append(node)
+        self.functions.append(FunctionInfo.from_node(node))
 
     def done(self, context):
         "Signals end of module parsing."
@@ -48,14 +98,17 @@ class ClassInfo(CodeInfo):
 
     Elements are grouped by type in arrays while parsing, printing done last.
     """
+    __slots__ = ('classname', 'bases', '_members')
+
     def __init__(self, node):
         super().__init__()
-        logger.info("New ClassInfo: %s", ast.dump(node))
+        if logger.isEnabledFor(logging.INFO):
+            # dumping the whole class tree is costly
+            logger.info("New ClassInfo: %s", ast.dump(node))
         self.classname = node.name
-        self.bases = node.bases
-        # self.classvars = []
-        self.members = []
-        # self.methods = []
+        # rendered base classes expressions
+        self.bases = tuple(format_expr(base) for base in node.bases)
+        self._members = {}
 
     @property
     def classvars(self):
@@ -63,6 +116,11 @@ class ClassInfo(CodeInfo):
         Class variables are shared by all instances."""
         return self.variables
 
+    @property
+    def members(self):
+        """The list of instance variables, in order of first assignment."""
+        return list(self._members)
+
     @property
     def methods(self):
         """The list of parsed methods of the class"""
@@ -74,12 +132,10 @@ class ClassInfo(CodeInfo):
 
     def add_member(self, name):
         "Registers an instance variable if new"
-        if name not in self.members:
-            self.members.append(name)
+        self._members[name] = None
 
     def add_method(self, node):
         "Registers a method"
-        node.body = None
         self.add_function(node)
 
     def done(self, context):
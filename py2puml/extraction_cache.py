@@ -0,0 +1,138 @@
+"""On-disk cache of the infos extracted from python source files.
+
+Entries are keyed by the file content, the configuration options which
+the extracted infos depend on and the tool version, so that a cache
+directory can be shared by several runs, checkouts or machines.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+
+import version
+
+logger = logging.getLogger() # (__name__) # pylint: disable=invalid-name
+
+# default cache size limit, in bytes
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+class ExtractionCache:
+    """Persistent store of extracted infos, with a size limit.
+
+    The least recently used entries are evicted by `prune()` when the
+    total size of the cache exceeds `max_size`.
+
+    Instances are picklable, so they can be handed to worker processes.
+    Hit and miss counters are maintained by the caller (see
+    `PUML_Generator.do_files()`), as workers only hold copies.
+    """
+    # configuration sections the extracted infos depend on
+    SECTIONS = ('methods', 'module')
+    # version of the pickled infos layout, see code_info
+    FORMAT = 2
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE, config=None):
+        """Constructor.
+
+        @param directory: where to store the cache entries, created if needed
+        @param max_size: size limit of the cache, in bytes
+        @param config ConfigParser: settings used for extraction
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.fingerprint = self.config_fingerprint(config)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def config_fingerprint(cls, config=None):
+        """Builds the text identifying the tool version and the relevant
+        configuration options, included in every cache key."""
+        lines = ['py2puml %s format %d' % (version.__version__, cls.FORMAT)]
+        for section in cls.SECTIONS:
+            if config and config.has_section(section):
+                lines.append('[%s]' % section)
+                lines.extend('%s=%s' % item for item in sorted(config.items(section)))
+        return '\n'.join(lines)
+
+    def key(self, source):
+        """Computes the cache key of given source file content (bytes)."""
+        digest = hashlib.sha256(self.fingerprint.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(source)
+        return digest.hexdigest()
+
+    def path(self, key):
+        """File name of a cache entry."""
+        return os.path.join(self.directory, key[:2], key[2:] + '.pickle')
+
+    def get(self, key):
+        """Loads a cache entry, marking it as recently used.
+        @return the cached infos, or None if not found.
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                infos = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError) as err:
+            logger.warning("Ignoring bad cache entry %s: %s", path, err)
+            return None
+        return infos
+
+    def put(self, key, infos):
+        """Stores a cache entry.
+        The file is replaced atomically, to be safe with concurrent runs.
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(infos, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpname, path)
+        except OSError as err:
+            logger.warning("Cannot write cache entry %s: %s", path, err)
+            try:
+                os.remove(tmpname)
+            except OSError:
+                pass
+
+    def entries(self):
+        """Lists the cache entries as (mtime, size, path) tuples."""
+        entries = []
+        for subdir in os.scandir(self.directory):
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                if entry.name.endswith('.pickle'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def prune(self):
+        """Evicts least recently used entries until the cache fits its size limit.
+        @return the number of evicted entries
+        """
+        entries = self.entries()
+        total = sum(size for mtime, size, path in entries)
+        evicted = 0
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        return evicted
+
+    def report(self):
+        """Logs the cache usage counters."""
+        logger.info("Cache %s: %d hits, %d misses",
+                    self.directory, self.hits, self.misses)
@@ -0,0 +1,179 @@
+"""Incremental regeneration of a diagram, based on the changes known to git.
+
+The rendered fragments of all source files are saved in a state file,
+with the commit they were generated from. On next run, git tells which
+files changed since then (`git diff --name-status`, no network needed):
+only those are parsed again, the fragments of the others are reused.
+
+Files renamed without change keep their fragment, as namespaces are
+computed when writing. Deleted files are dropped. Files with uncommitted
+changes, and files git does not track (ignored ones included), are parsed,
+but not saved in the state, so that the state only holds fragments of
+committed contents.
+"""
+import json
+import logging
+import os
+import subprocess
+
+import archives
+
+logger = logging.getLogger() # (__name__) # pylint: disable=invalid-name
+
+def git(*args, cwd=None):
+    """Runs a git command.
+    @return its output
+    @raise subprocess.CalledProcessError if the command fails
+    """
+    return subprocess.run(('git',) + args, cwd=cwd, check=True,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True).stdout
+
+class GitChanges:
+    """Files of a git checkout changed since a base commit, working tree
+    changes and untracked files included. Files which git does not track,
+    like ignored ones, are never considered unchanged.
+
+    Paths are relative to the top level directory of the checkout.
+    """
+    def __init__(self, base, cwd=None):
+        """Constructor.
+
+        @param base: the base commit or ref
+        @param cwd: a directory of the checkout, current directory if None
+        """
+        self.base = base
+        self.toplevel = git('rev-parse', '--show-toplevel', cwd=cwd).strip()
+        # added, modified or renamed with changes
+        self.changed = set()
+        self.deleted = set()
+        # new path -> old path, of files renamed without change
+        self.renamed = {}
+        fields = git('diff', '--name-status', '-M', '-z', base, '--',
+                     cwd=self.toplevel).split('\0')
+        fields.reverse()
+        while len(fields) > 1:
+            status = fields.pop()
+            path = fields.pop()
+            if status[0] in 'RC':
+                new = fields.pop()
+                if status == 'R100':
+                    self.renamed[new] = path
+                else:
+                    self.changed.add(new)
+                if status[0] == 'R':
+                    self.deleted.add(path)
+            elif status[0] == 'D':
+                self.deleted.add(path)
+            else:
+                self.changed.add(path)
+        self.changed.update(git('ls-files', '--others', '--exclude-standard', '-z',
+                                cwd=self.toplevel).split('\0')[:-1])
+        self.tracked = set(git('ls-files', '-z', cwd=self.toplevel).split('\0')[:-1])
+
+    def key(self, srcfile):
+        """Path of a source file, relative to the top level of the checkout."""
+        return os.path.relpath(os.path.abspath(srcfile), self.toplevel).replace(os.sep, '/')
+
+    def unchanged(self, key):
+        """Path of given file at base commit, None if it was changed
+        or is not tracked. Archive members follow their archive."""
+        path, sep, member = key.partition(archives.MEMBER_SEPARATOR)
+        if path in self.changed or path not in self.tracked:
+            return None
+        return self.renamed.get(path, path) + sep + member
+
+def _reason(err):
+    """Message of a failed git command."""
+    return (getattr(err, 'stderr', None) or str(err)).strip()
+
+def load_state(filename, fingerprint):
+    """Reads the fragments saved by a previous run.
+    @return (commit, fragments) tuple, (None, {}) if no usable state.
+    """
+    try:
+        with open(filename) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None, {}
+    except (OSError, ValueError) as err:
+        logger.warning("Ignoring bad state file %s: %s", filename, err)
+        return None, {}
+    if state.get('fingerprint') != fingerprint:
+        logger.info("Configuration changed since %s was saved", filename)
+        return None, {}
+    return state.get('commit'), state.get('fragments', {})
+
+def save_state(filename, fingerprint, commit, fragments):
+    """Saves the fragments of committed files for next run."""
+    tmpname = filename + '.tmp'
+    with open(tmpname, 'w') as f:
+        json.dump({'fingerprint': fingerprint, 'commit': commit,
+                   'fragments': fragments}, f)
+    os.replace(tmpname, filename)
+
+def regenerate(gen, srcfiles, filename, base=None, errormsg=None, jobs=1, cache=None):
+    """Outputs the diagram of given files, parsing only the files changed
+    since the state was saved.
+
+    @param gen PUML_Generator: output generator
+    @param srcfiles: iterable of source file names, in a git checkout
+    @param filename: state file, created if missing
+    @param base: git ref expected to be the commit the state was saved
+           from, the default. Fragments are only valid for that commit, so
+           they are all dropped if base is another commit.
+    @param errormsg: message to print when a file is skipped
+    @param jobs: number of processes for parsing many files at once
+    @param cache ExtractionCache: persistent cache of extracted infos
+    @return the list of parsed files
+    """
+    from extraction_cache import ExtractionCache
+    srcfiles = list(srcfiles)
+    fingerprint = ExtractionCache.config_fingerprint(gen.config)
+    commit, saved = load_state(filename, fingerprint)
+    base = base or commit
+    changes = None
+    if base and saved:
+        try:
+            if git('rev-parse', '--verify', '-q', base + '^{commit}').strip() != commit:
+                logger.warning("State saved at %s, not %s, parsing all files",
+                               commit, base)
+            else:
+                changes = GitChanges(base)
+        except (subprocess.CalledProcessError, OSError) as err:
+            logger.warning("Cannot compare with %s, parsing all files: %s",
+                           base, _reason(err))
+
+    fragments = {}
+    parsed = []
+    for srcfile in srcfiles:
+        old = changes and changes.unchanged(changes.key(srcfile))
+        if old in saved:
+            fragments[srcfile] = saved[old]
+        else:
+            parsed.append(srcfile)
+    for srcfile, infos in gen.extract_files(parsed, errormsg, jobs, cache):
+        fragments[srcfile] = None if infos is None else gen.render(infos)
+    logger.info("Parsed %d of %d files, %d deleted since %s", len(parsed), len(srcfiles),
+                len(changes.deleted) if changes else 0, base)
+
+    gen.header()
+    # grouped by namespace, even if streaming
+    for srcfile in gen.output_order(srcfiles):
+        if fragments[srcfile] is not None:
+            gen.write_file(srcfile, fragments[srcfile])
+    gen.footer()
+
+    # only committed contents are saved
+    try:
+        head = GitChanges('HEAD')
+    except (subprocess.CalledProcessError, OSError) as err:
+        logger.warning("State not saved: %s", _reason(err))
+        return parsed
+    saved = {}
+    for srcfile, fragment in fragments.items():
+        key = head.key(srcfile)
+        if fragment is not None and head.unchanged(key) == key:
+            saved[key] = fragment
+    save_state(filename, fingerprint, git('rev-parse', 'HEAD').strip(), saved)
+    return parsed
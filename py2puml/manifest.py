@@ -0,0 +1,200 @@
+"""Generation of several diagrams at once, from a manifest file.
+
+The manifest is an ini file, each section being a target diagram:
+
+    [DEFAULT]
+    config = py2puml.ini
+
+    [classes]
+    sources = src/mypackage
+    root = src
+    output = docs/classes.puml
+
+    [api]
+    sources = src/mypackage/api/*.py src/mypackage/client.py
+    config = py2puml.ini compact.ini
+    exclude = test_*
+    output = docs/api.puml
+
+Target options:
+ * sources: python files, directories or glob patterns ('**' matching
+   any subdirectories), separated by white space. Required.
+ * output: the diagram file to write. Required.
+ * root: create namespaces from this directory.
+ * config: ini files replacing the configuration of the command.
+ * include, exclude: more glob patterns of the files to select or skip
+   in directories, like the command options.
+
+Relative paths are relative to the directory of the manifest.
+
+Each source file is parsed once, however many targets include it, then
+all the targets are rendered from the extracted infos.
+"""
+import configparser
+import glob
+import io
+import logging
+import os
+
+from code_info import ClassInfo
+from puml_generator import PUML_Generator, make_generator
+from settings import Settings
+from sources import iter_sources
+
+logger = logging.getLogger() # (__name__) # pylint: disable=invalid-name
+
+class Target:
+    """A diagram to generate, as described in a manifest section."""
+    def __init__(self, name, sources, output, root=None, config=None,
+                 include=(), exclude=()):
+        """Constructor.
+
+        @param name: the target name, for messages
+        @param sources: python files, directories or glob patterns
+        @param output: the diagram file name
+        @param root: if given, modules are grouped in namespaces
+               after their path relative to this directory
+        @param config ConfigParser: custom settings (default None)
+        @param include: more glob patterns of the files to select
+        @param exclude: more glob patterns of the files to skip
+        """
+        self.name = name
+        self.sources = tuple(sources)
+        self.output = output
+        self.root = root
+        self.config = config or configparser.ConfigParser()
+        self.settings = Settings(self.config)
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+
+    def __repr__(self):
+        return 'Target(%r, %r, %r)' % (self.name, self.sources, self.output)
+
+    def srcfiles(self):
+        """Lists the source files of the target, in order."""
+        paths = []
+        for source in self.sources:
+            if glob.has_magic(source):
+                paths.extend(sorted(glob.glob(source, recursive=True)))
+            else:
+                paths.append(source)
+        return list(iter_sources(paths,
+                                 include=self.settings.include + self.include,
+                                 exclude=self.settings.exclude + self.exclude))
+
+class Manifest:
+    """Targets of a manifest, sharing the parsing of their source files."""
+    def __init__(self, targets):
+        self.targets = list(targets)
+
+    @classmethod
+    def read(cls, filename, config=None):
+        """Reads a manifest file.
+
+        @param config ConfigParser: settings of targets without config option
+        @raise ValueError if the manifest is invalid
+        @raise OSError if it cannot be read
+        """
+        manifest = configparser.ConfigParser(interpolation=None)
+        with open(filename) as f:
+            manifest.read_file(f)
+        base = os.path.dirname(filename)
+
+        def path(name):
+            return os.path.join(base, os.path.expanduser(name))
+
+        targets = []
+        for name in manifest.sections():
+            section = manifest[name]
+            for option in ('sources', 'output'):
+                if not section.get(option, '').strip():
+                    raise ValueError("Missing %r option in target [%s] of %s"
+                                     % (option, name, filename))
+            target_config = config
+            if section.get('config'):
+                target_config = configparser.ConfigParser()
+                for config_file in section['config'].split():
+                    if not target_config.read(path(config_file)):
+                        raise ValueError("Config file %s of target [%s] not found"
+                                         % (config_file, name))
+            root = section.get('root')
+            targets.append(Target(name, [path(source) for source in section['sources'].split()],
+                                  path(section['output']),
+                                  root=path(root) if root else None,
+                                  config=target_config,
+                                  include=section.get('include', '').split(),
+                                  exclude=section.get('exclude', '').split()))
+        if not targets:
+            raise ValueError("No target in %s" % filename)
+        return cls(targets)
+
+    def parse_config(self):
+        """Configuration of the parsing of source files, common to all targets.
+
+        Only module globals depend on configuration: they are collected if any
+        target needs them, and left out when rendering the other targets.
+        Files are scanned for headers from the smallest `header-scan-size`
+        set by a target, as scanning gives the same infos.
+        """
+        config = configparser.ConfigParser()
+        config['module'] = {
+            'write-globals': str(any(t.settings.write_globals for t in self.targets))}
+        sizes = [t.settings.header_scan_size for t in self.targets if t.settings.header_scan_size]
+        if sizes:
+            config['sources'] = {'header-scan-size': str(min(sizes))}
+        return config
+
+    def build(self, errormsg=None, jobs=1, cache=None, read_ahead=None):
+        """Generates the diagrams of all targets.
+
+        @param errormsg: message to print when a file is skipped
+        @param jobs: number of processes parsing files, then rendering
+               targets, None or 0 for one per CPU
+        @param cache ExtractionCache: persistent cache of extracted infos,
+               built with `parse_config()`
+        @param read_ahead: number of files read ahead of parsing, if serial
+        @return dict of target name -> number of files in the diagram
+        """
+        srcfiles = {target.name: target.srcfiles() for target in self.targets}
+        # union of source files, in order of first appearance
+        allfiles = list(dict.fromkeys(srcfile for files in srcfiles.values()
+                                      for srcfile in files))
+        parser = PUML_Generator(io.StringIO(), self.parse_config())
+        if read_ahead is not None:
+            parser.read_ahead = read_ahead
+        model = dict(parser.extract_files(allfiles, errormsg, jobs, cache))
+        logger.info("Parsed %d files for %d targets", len(allfiles), len(self.targets))
+
+        # each target gets the infos of its files only
+        tasks = [(target, [(srcfile, model[srcfile]) for srcfile in srcfiles[target.name]
+                           if model[srcfile] is not None])
+                 for target in self.targets]
+        if jobs == 1 or len(tasks) < 2:
+            counts = [render_target(target, files) for target, files in tasks]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(jobs or None) as pool:
+                counts = list(pool.map(render_target, *zip(*tasks)))
+        return {target.name: count for target, count in zip(self.targets, counts)}
+
+def render_target(target, files):
+    """Writes the diagram of a target.
+
+    Being a plain function of picklable arguments, it can be run by a
+    process pool.
+
+    @param target Target: the diagram to write
+    @param files: list of (srcfile, infos) tuples, as extracted with the
+           `Manifest.parse_config()` settings
+    @return the number of files in the diagram
+    """
+    with open(target.output, 'w') as dest:
+        gen = make_generator(dest, target.config, target.root)
+        gen.header()
+        for srcfile, infos in files:
+            if not gen.settings.write_globals:
+                infos = [info for info in infos if isinstance(info, ClassInfo)]
+            gen.emit_file(srcfile, infos)
+        gen.footer()
+    logger.info("Target [%s]: %d files written to %s", target.name, len(files), target.output)
+    return len(files)
@@ -0,0 +1,99 @@
+"""Export of the metrics of a run, for monitoring diagram builds.
+
+Metrics are the counters and phase timings collected by a `Profiler`, and
+the peak memory of the process. They are written in the Prometheus text
+format, as read by the node exporter textfile collector, or as JSON if
+the file name ends with '.json'.
+"""
+import json
+import os
+import time
+
+# counter name -> help text
+COUNTERS = {
+    'files_scanned': 'Source files scanned.',
+    'files_parsed': 'Source files parsed.',
+    'files_syntax_errors': 'Source files skipped for syntax errors.',
+    'files_header_scanned': 'Huge source files scanned for headers only.',
+    'files_header_fallbacks': 'Huge source files parsed as a whole, not scannable.',
+    'files_cached': 'Source files served from the extraction cache.',
+    'files_duplicate': 'Source files not parsed, having the same content as another one.',
+    'classes': 'Classes emitted.',
+    'methods': 'Methods emitted.',
+    'globals': 'Module globals emitted, variables and functions.',
+    'bytes_written': 'Bytes of diagram written.',
+}
+
+def peak_rss():
+    """Peak resident memory of the process and of its terminated workers.
+    @return (self, children) tuple of sizes in bytes, None if unknown
+    """
+    try:
+        import resource
+    except ImportError: # not available on Windows
+        return None, None
+    # kilobytes on Linux, bytes on macOS
+    unit = 1 if os.uname().sysname == 'Darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit)
+
+def collect(profiler):
+    """Gathers the metrics of a run.
+    @param profiler Profiler: counters and timings of the run
+    @return dict of metrics
+    """
+    report = profiler.report(top=0)
+    rss, workers_rss = peak_rss()
+    return {
+        'counters': {name: profiler.counters.get(name, 0) for name in COUNTERS},
+        'phases': {phase: times['wall'] for phase, times in sorted(report['phases'].items())},
+        'run_seconds': report['run']['wall'],
+        'peak_rss_bytes': rss,
+        'workers_peak_rss_bytes': workers_rss,
+        'timestamp': time.time(),
+    }
+
+def format_prometheus(metrics):
+    """Formats metrics in the Prometheus text exposition format.
+    @return the text
+    """
+    lines = []
+    def metric(name, kind, help_text, samples):
+        lines.append('# HELP py2puml_%s %s' % (name, help_text))
+        lines.append('# TYPE py2puml_%s %s' % (name, kind))
+        for labels, value in samples:
+            lines.append('py2puml_%s%s %r' % (name, labels, value))
+
+    for name, help_text in COUNTERS.items():
+        metric(name + '_total', 'counter', help_text, [('', metrics['counters'][name])])
+    metric('phase_seconds', 'gauge', 'Wall time spent in each processing phase.',
+           [('{phase="%s"}' % phase, wall) for phase, wall in metrics['phases'].items()])
+    metric('run_seconds', 'gauge', 'Wall time of the run.', [('', metrics['run_seconds'])])
+    if metrics['peak_rss_bytes'] is not None:
+        metric('peak_rss_bytes', 'gauge', 'Peak resident memory of the process.',
+               [('', metrics['peak_rss_bytes'])])
+        metric('workers_peak_rss_bytes', 'gauge',
+               'Peak resident memory of the largest worker process.',
+               [('', metrics['workers_peak_rss_bytes'])])
+    metric('last_run_timestamp_seconds', 'gauge', 'End time of the run.',
+           [('', metrics['timestamp'])])
+    return '\n'.join(lines) + '\n'
+
+def write(filename, profiler):
+    """Writes the metrics of a run.
+
+    The file is replaced atomically, so that collectors never read
+    a partial file.
+
+    @param filename: JSON file if ending with '.json', Prometheus text otherwise
+    @param profiler Profiler: counters and timings of the run
+    """
+    metrics = collect(profiler)
+    if filename.endswith('.json'):
+        text = json.dumps(metrics, indent=2) + '\n'
+    else:
+        text = format_prometheus(metrics)
+    tmpname = filename + '.tmp'
+    with open(tmpname, 'w') as f:
+        f.write(text)
+    os.replace(tmpname, filename)
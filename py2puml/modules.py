@@ -0,0 +1,103 @@
+"""Resolution of module names to source paths, without importing anything.
+
+Modules are searched like the interpreter would import them, with the
+import system finders, but no module is imported or executed: the top
+level name is found with `importlib.util.find_spec()`, which does not
+import it, and submodules with `PathFinder` in their parent locations,
+as `find_spec()` would import the parent packages of a dotted name.
+
+Resolved paths are cached in a JSON file, valid as long as the interpreter
+and its sys.path are the same, and the paths still exist.
+"""
+import json
+import logging
+import os
+import sys
+
+logger = logging.getLogger() # (__name__) # pylint: disable=invalid-name
+
+def default_cache_file():
+    """Cache of module paths in the user cache directory."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_home, 'py2puml', 'modules.json')
+
+def find_module_paths(name):
+    """Finds the source of a module or package.
+
+    @param name: dotted module name, e.g. 'email.mime'
+    @return list of paths: the module file, or the package directories,
+            several ones for a namespace package
+    @raise ImportError if not found, or without python source
+    """
+    import importlib.util
+    from importlib.machinery import PathFinder
+    parts = name.split('.')
+    try:
+        spec = importlib.util.find_spec(parts[0])
+    except (ImportError, ValueError):
+        spec = None
+    for i in range(1, len(parts)):
+        if spec is None or not spec.submodule_search_locations:
+            spec = None
+            break
+        spec = PathFinder.find_spec('.'.join(parts[:i + 1]),
+                                    list(spec.submodule_search_locations))
+    if spec is None:
+        raise ModuleNotFoundError("No module named %r" % name, name=name)
+    if spec.submodule_search_locations:
+        return list(spec.submodule_search_locations)
+    if spec.origin and spec.origin.endswith('.py'):
+        return [spec.origin]
+    raise ImportError("No python source for module %r (%s)" % (name, spec.origin), name=name)
+
+class ModuleResolver:
+    """Resolves module names to source paths, with a persistent cache."""
+    def __init__(self, cache_file=None):
+        """Constructor.
+
+        @param cache_file: JSON file of resolved paths, created if needed,
+               no cache if None
+        """
+        self.cache_file = cache_file
+        # identifies the interpreter and its module search path
+        self.fingerprint = '\n'.join([sys.executable] + sys.path)
+        self.paths = {}
+        self.changed = False
+        self.hits = 0
+        if cache_file:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_file) as f:
+                cache = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as err:
+            logger.warning("Ignoring bad module cache %s: %s", self.cache_file, err)
+            return
+        if cache.get('fingerprint') == self.fingerprint:
+            self.paths = cache.get('modules', {})
+
+    def resolve(self, name):
+        """Source paths of a module, see `find_module_paths()`.
+        @raise ImportError if not found, or without python source
+        """
+        paths = self.paths.get(name)
+        if paths and all(os.path.exists(path) for path in paths):
+            self.hits += 1
+            return paths
+        paths = self.paths[name] = find_module_paths(name)
+        self.changed = True
+        return paths
+
+    def save(self):
+        """Writes the cache file, if anything was resolved."""
+        if not self.cache_file or not self.changed:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+        tmpname = '%s.%d.tmp' % (self.cache_file, os.getpid())
+        with open(tmpname, 'w') as f:
+            json.dump({'fingerprint': self.fingerprint, 'modules': self.paths}, f, indent=1)
+        os.replace(tmpname, self.cache_file)
+        self.changed = False
@@ -0,0 +1,136 @@
+"""Output files for build tools: written only when their content changes,
+and make dependency files listing the inputs of a diagram.
+
+An output file left untouched keeps its modification time, so that make
+and file watchers do not render the diagram again when it did not change.
+"""
+import errno
+import hashlib
+import logging
+import os
+import sys
+
+logger = logging.getLogger() # (__name__) # pylint: disable=invalid-name
+
+class ChangedOutput:
+    """Text output file, replaced atomically and only if its content changed.
+
+    Writes go to a temporary file next to the output, which is compared
+    with the output on `close()`, then renamed over it or removed.
+    """
+    def __init__(self, name):
+        """Constructor, the output is not changed until closed.
+
+        @param name: output file name
+        """
+        self.name = name
+        self.tmpname = '%s.%d.tmp' % (name, os.getpid())
+        # temporary file, opened by the first write
+        self.file = None
+        # whether closing replaced the output, None before
+        self.replaced = None
+
+    def _file(self):
+        if self.file is None:
+            self.file = open(self.tmpname, 'w')
+        return self.file
+
+    def write(self, text):
+        """Writes text to the new version of the output."""
+        return self._file().write(text)
+
+    def flush(self):
+        """Flushes the new version, without changing the output."""
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        """Replaces the output by the new version, if different.
+        @return whether the output was replaced
+        """
+        if self.replaced is not None:
+            return self.replaced
+        self._file().close()
+        self.file = None
+        if file_digest(self.tmpname) == file_digest(self.name):
+            os.remove(self.tmpname)
+            logger.info("Unchanged output %s left untouched", self.name)
+            self.replaced = False
+        else:
+            os.replace(self.tmpname, self.name)
+            self.replaced = True
+        return self.replaced
+
+    def discard(self):
+        """Drops the new version, leaving the output as it was."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.replaced is None:
+            try:
+                os.remove(self.tmpname)
+            except FileNotFoundError:
+                pass
+            self.replaced = False
+
+def file_digest(filename):
+    """Hashes the content of a file.
+    @return the digest, None if the file does not exist
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.digest()
+
+def open_output(name, if_changed=False):
+    """Opens the output file of a diagram.
+
+    @param name: file name, '-' for the standard output
+    @param if_changed: only replace the file if its content changes,
+           see `ChangedOutput`
+    @return writable text file
+    @raise OSError if it cannot be written
+    """
+    if name == '-':
+        return sys.stdout
+    if if_changed:
+        # fails now rather than once the diagram is generated,
+        # without creating the output
+        if os.path.isdir(name):
+            raise IsADirectoryError(errno.EISDIR, os.strerror(errno.EISDIR), name)
+        target = name if os.path.exists(name) else os.path.dirname(name) or os.curdir
+        if not os.path.isdir(os.path.dirname(name) or os.curdir):
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), name)
+        if not os.access(target, os.W_OK):
+            raise PermissionError(errno.EACCES, os.strerror(errno.EACCES), target)
+        return ChangedOutput(name)
+    return open(name, 'w')
+
+def depfile_name(output):
+    """Default dependency file of an output: its name with a .d suffix."""
+    return os.path.splitext(output)[0] + '.d'
+
+def _escape(filename):
+    """Quotes a file name for a make rule."""
+    return filename.replace('$', '$$').replace('#', '\\#').replace(' ', '\\ ')
+
+def write_depfile(filename, target, inputs):
+    """Writes a make rule of the files a target depends on.
+
+    Each input also gets a rule without prerequisites nor recipe, so that
+    make does not fail when it is deleted, like with `gcc -MP`.
+
+    @param filename: dependency file, only replaced if changed
+    @param target: file built from the inputs
+    @param inputs: names of the input files, duplicates are ignored
+    """
+    inputs = [_escape(name) for name in dict.fromkeys(inputs)]
+    output = ChangedOutput(filename)
+    output.write(_escape(target) + ':' + ''.join(' \\\n  ' + name for name in inputs) + '\n')
+    for name in inputs:
+        output.write('\n%s:\n' % name)
+    output.close()
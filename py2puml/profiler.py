@@ -0,0 +1,99 @@
+"""Timing of the processing phases of py2puml runs.
+
+Phases are: 'read' the source files, 'parse' them with ast, 'visit' the
+trees, look up and store the 'cache', 'format' and 'write' the output.
+Events are counted too, such as parsed files or emitted classes.
+"""
+import time
+from collections import Counter
+
+class PhaseTimer:
+    """Measures wall and CPU time spent in successive phases."""
+    __slots__ = ('times', '_wall', '_cpu')
+
+    def __init__(self):
+        # phase -> [wall, cpu] seconds
+        self.times = {}
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def lap(self, phase):
+        """Adds the time elapsed since the previous lap to given phase."""
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        times = self.times.setdefault(phase, [0.0, 0.0])
+        times[0] += wall - self._wall
+        times[1] += cpu - self._cpu
+        self._wall = wall
+        self._cpu = cpu
+
+
+class Profiler:
+    """Collects phase timings per source file and event counters,
+    and reports them.
+
+    Generators only time and count their work when given a profiler,
+    so that profiling costs nothing when disabled.
+    """
+    def __init__(self):
+        # srcfile -> phase -> [wall, cpu]
+        self.files = {}
+        # event name -> count
+        self.counters = Counter()
+        self.timer = PhaseTimer()
+
+    def count(self, name, n=1):
+        """Counts events."""
+        self.counters[name] += n
+
+    def add(self, srcfile, times, counts=None):
+        """Records phase timings and event counts of a source file."""
+        if counts:
+            self.counters.update(counts)
+        if not times:
+            return
+        file_times = self.files.setdefault(srcfile, {})
+        for phase, (wall, cpu) in times.items():
+            total = file_times.setdefault(phase, [0.0, 0.0])
+            total[0] += wall
+            total[1] += cpu
+
+    def report(self, top=10):
+        """Builds the profiling report.
+
+        @param top: number of slowest files to list
+        @return dict with the run and per phase totals, the counters,
+                and the slowest files, by wall time.
+        """
+        self.timer.lap('run')
+        phases = {}
+        for file_times in self.files.values():
+            for phase, (wall, cpu) in file_times.items():
+                total = phases.setdefault(phase, [0.0, 0.0])
+                total[0] += wall
+                total[1] += cpu
+        slowest = sorted(
+            ((sum(wall for wall, cpu in file_times.values()), srcfile)
+             for srcfile, file_times in self.files.items()),
+            reverse=True)[:top]
+        wall, cpu = self.timer.times['run']
+        return {
+            'run': {'wall': wall, 'cpu': cpu},
+            'files': len(self.files),
+            'counters': dict(self.counters),
+            'phases': {phase: {'wall': wall, 'cpu': cpu}
+                       for phase, (wall, cpu) in phases.items()},
+            'slowest': [
+                {'file': srcfile, 'wall': wall,
+                 'cpu': sum(cpu for w, cpu in self.files[srcfile].values()),
+                 'phases': {phase: {'wall': w, 'cpu': c}
+                            for phase, (w, c) in self.files[srcfile].items()}}
+                for wall, srcfile in slowest],
+        }
+
+    def write(self, filename, top=10):
+        """Writes the profiling report as JSON."""
+        import json
+        with open(filename, 'w') as f:
+            json.dump(self.report(top), f, indent=2)
+            f.write('\n')
@@ -3,77 +3,99 @@
 # pylint: disable=invalid-name
 
 # standard lib imports
-import ast
-import copy
 import logging
 import os
+import sys
+from collections import deque
 
-# other imports
-import astor
-from ast_visitor import TreeVisitor
+# this project imports
+from ast_visitor import (ModelMemo, TreeVisitor, extract, extract_in_worker, init_worker,
+                         read_ahead, read_source)
+from code_info import FunctionInfo, deco_marker
+from profiler import PhaseTimer
+from settings import Settings
+from signature import first_param_name, join_params
 
 # puml printation unit
 TAB = '  '
+# number of source files read ahead of parsing, by default
+DEFAULT_READ_AHEAD = 16
+# number of distinct models kept to reuse for files of same content
+DEFAULT_DEDUP_MODELS = 1024
+# a few only when streaming, so that memory use stays small
+STREAMING_DEDUP_MODELS = 4
 # module logger
 logger = logging.getLogger() # (__name__)
 
 class PUML_Generator:
     """Formats data for PlantUML.
     """
-    def __init__(self, dest, config=None):
+    def __init__(self, dest, config=None, settings=None):
         """Constructor.
 
         @param dest stream : File-like object to write to
         @param config ConfigParser : custom settings (default None)
+        @param settings Settings : options already resolved from config,
+               if any (default None)
         """
         self.dest = dest
         self.config = config
+        # options resolved once, read as attributes while formatting
+        self.settings = settings or Settings(config)
         self.sourcename = None
+        # lines being recorded by render(), instead of printed
+        self.fragment = None
+        # Profiler collecting phase timings, if profiling
+        self.profiler = None
+        # where to report skipped files, sys.stderr if None
+        self.errfile = None
+        # number of files read by background threads while parsing, if serial
+        self.read_ahead = DEFAULT_READ_AHEAD
+        # output each file of do_files() at once, see `output_order()`
+        self.streaming = False
+        # models kept for files of same content in extract_files(), 0 to parse each file
+        self.dedup_models = DEFAULT_DEDUP_MODELS
+        # number of files whose infos were reused from a file of same content
+        self.duplicates = 0
 
     def opt_prolog(self):
         """Configured prolog for the PlantUML output.
-        @return prolog string (defaulting to empty string) or False if no configuration available.
+        @return prolog string (defaulting to empty string)
         """
-        return self.config and self.config.get(
-            'puml', 'prolog', fallback='')
+        return self.settings.prolog
 
     def opt_epilog(self):
         """Configured epilog for the PlantUML output.
-        @return epilog string (defaulting to empty string) or False if no configuration available.
+        @return epilog string (defaulting to empty string)
         """
-        return self.config and self.config.get(
-            'puml', 'epilog', fallback='')
+        return self.settings.epilog
 
     def opt_globals(self):
         """Tells whether the module globals should be reported.
         @return boolean
         """
-        return self.config and self.config.getboolean(
-            'module', 'write-globals', fallback=False)
+        return self.settings.write_globals
 
     def opt_omit_self(self):
         """Tells whether the methods argument lists should include 'self'.
         This option could be useful to reduce classes width in diagram.
         @return boolean, False by default
         """
-        return self.config and self.config.getboolean(
-            'methods', 'omit-self', fallback=False)
+        return self.settings.omit_self
 
     def opt_write_arglist(self, section='methods'):
         """Tells whether functions and methods argument lists be included.
         This option could be useful to reduce classes width in diagram.
         @return boolean, True by default
         """
-        return not self.config or self.config.getboolean(
-            section, 'write-arg-list', fallback=True)
+        return self.settings.write_arglist(section)
 
     def opt_omit_defaults(self, section='methods'):
         """Tells whether default values should be omitted in functions and methods argument.
         This option could be useful to reduce classes width in diagram.
         @return boolean, False by default
         """
-        return self.config and self.config.getboolean(
-            section, 'omit-defaults', fallback=False)
+        return self.settings.omit_defaults(section)
 
     def start_file(self, sourcename):
         """Sets up the output context for a single python source file"""
@@ -85,20 +107,29 @@ class PUML_Generator:
         self.sourcename = None
 
     def output(self, *args):
-        """Prints given arguments to destination.
+        """Prints given arguments to destination,
+        or records them as a line of the fragment being rendered.
         Override this for more formatting control.
 
-        @param *args: arguments to be passed to the print() function.
+        @param *args: arguments to be joined by spaces, as print() does.
         """
-        print(*args, file=self.dest)
+        line = ' '.join(str(arg) for arg in args)
+        if self.fragment is not None:
+            self.fragment.append(line)
+        else:
+            self._write(line + '\n')
+
+    def _write(self, text):
+        """Writes text to destination, counting written bytes if profiling."""
+        self.dest.write(text)
+        if self.profiler is not None:
+            self.profiler.count('bytes_written', len(text.encode('utf-8')))
 
     def header(self):
         """Outputs file header: settings and namespaces."""
         self.output("@startuml")
-        if self.config:
-            prolog = self.config.get('puml', 'prolog', fallback=None)
-            if prolog:
-                self.output(prolog + "\n")
+        if self.settings.prolog:
+            self.output(self.settings.prolog + "\n")
 
     def footer(self):
         """Outputs file footer.
@@ -106,50 +137,229 @@ class PUML_Generator:
         Prints configured epilog if exists and close puml section marker.
         """
         # append the epilog if provided
-        if self.config:
-            epilog = self.config.get('puml', 'epilog', fallback=None)
-            if epilog:
-                self.output(epilog + "\n")
+        if self.settings.epilog:
+            self.output(self.settings.epilog + "\n")
 
         # End the PlantUML files.
         self.output('@enduml')
 
+    def _visitor(self, srcfile):
+        """Builds the tree visitor of a source file, counting its parsing
+        if profiling."""
+        visitor = TreeVisitor(srcfile, self, self.errfile)
+        if self.profiler is not None:
+            self.profiler.count('files_scanned')
+            visitor.counts = self.profiler.counters
+        return visitor
+
     def do_file(self, srcfile, errormsg=None):
         """Processes a single python source file,
            building output as configured while walking the tree.
         """
         # The tree visitor will use it
-        visitor = TreeVisitor(srcfile, self)
+        visitor = self._visitor(srcfile)
         if visitor.parse(errormsg):
             self.start_file(srcfile)
             visitor.visit_tree()
             self.end_file()
 
+    def render(self, infos):
+        """Formats the infos collected from a single python source file,
+        without writing them.
+
+        @param infos: list of ClassInfo/CodeInfo, as returned by `extract()`
+        @return the fragment: list of output lines, which can be written
+                any number of times with `write_file()`.
+        """
+        self.fragment = []
+        try:
+            for info in infos:
+                info.done(self)
+            return self.fragment
+        finally:
+            self.fragment = None
+
+    def write_file(self, srcfile, fragment):
+        """Outputs the rendered fragment of a single python source file,
+           in its own context.
+        """
+        self.start_file(srcfile)
+        for line in fragment:
+            self.output(line)
+        self.end_file()
+
+    def emit_file(self, srcfile, infos):
+        """Outputs the infos collected from a single python source file,
+           just like do_file() does while walking the tree.
+
+        @param srcfile: the source file name
+        @param infos: list of ClassInfo/CodeInfo, as returned by `extract()`
+        """
+        if self.profiler is None:
+            self.write_file(srcfile, self.render(infos))
+            return
+        timer = PhaseTimer()
+        fragment = self.render(infos)
+        timer.lap('format')
+        self.write_file(srcfile, fragment)
+        timer.lap('write')
+        self.profiler.add(srcfile, timer.times)
+
+    def extract_files(self, srcfiles, errormsg=None, jobs=1, cache=None):
+        """Reads and parses several python source files.
+
+        With more than one job, files are read and parsed by a pool of
+        worker processes, results being still yielded in the original order.
+        Otherwise the next files are read by background threads while
+        parsing, see `read_ahead`. Errors are reported as the results come.
+
+        Source files are consumed lazily: only a few files ahead of the
+        current result are submitted to the workers.
+
+        When `dedup_models` is set, files having the same content as a file
+        seen before are not parsed again: the same infos are yielded for
+        each of them. Files are then read ahead in any case when serial,
+        while each worker process only knows the files it extracted.
+
+        @param srcfiles: iterable of source file names
+        @param errormsg: message to print when a file is skipped
+        @param jobs: number of worker processes, None or 0 for one per CPU
+        @param cache ExtractionCache: persistent cache of extracted infos
+        @return iterator of (srcfile, infos) tuples,
+                infos being None for skipped files.
+        """
+        profile = self.profiler is not None
+        duplicates = self.duplicates
+        single = isinstance(srcfiles, (list, tuple)) and len(srcfiles) < 2
+        memo = None
+        if self.dedup_models and not single:
+            memo = ModelMemo(STREAMING_DEDUP_MODELS if self.streaming else self.dedup_models)
+        if jobs == 1 or single:
+            # next files are read while the current one is parsed
+            depth = 0 if single else self.read_ahead
+            for srcfile, read in read_ahead(srcfiles, depth, errormsg):
+                if memo is None:
+                    yield self._check_result(srcfile, extract(
+                        srcfile, self.settings, errormsg, cache, profile, read), cache)
+                    continue
+                if read is None:
+                    read = read_source(srcfile, errormsg)
+                key = memo.key(read)
+                infos = memo.get(key)
+                if infos is not None:
+                    yield self._duplicate(srcfile, infos)
+                    continue
+                result = self._check_result(srcfile, extract(
+                    srcfile, self.settings, errormsg, cache, profile, read), cache)
+                memo.put(key, result[1])
+                yield result
+            self._report_duplicates(self.duplicates - duplicates)
+            return
+
+        from concurrent.futures import ProcessPoolExecutor
+        jobs = jobs or os.cpu_count()
+        # enough pending files to keep all workers busy
+        window = jobs * 8
+        # files are read by the workers, each one keeping its own models
+        pending = deque()
+        with ProcessPoolExecutor(jobs, initializer=init_worker,
+                                 initargs=(memo.size if memo else 0,)) as pool:
+            for srcfile in srcfiles:
+                pending.append((srcfile, pool.submit(
+                    extract_in_worker, srcfile, self.settings, errormsg, cache, profile)))
+                if len(pending) >= window:
+                    yield self._pool_result(*pending.popleft(), cache=cache)
+            while pending:
+                yield self._pool_result(*pending.popleft(), cache=cache)
+        self._report_duplicates(self.duplicates - duplicates)
+
+    def _pool_result(self, srcfile, future, cache):
+        """Waits for the extraction of a file by a worker process.
+        @return (srcfile, infos) tuple
+        """
+        result, duplicate = future.result()
+        if duplicate:
+            self.duplicates += 1
+            if self.profiler is not None:
+                self.profiler.count('files_duplicate')
+        return self._check_result(srcfile, result, cache)
+
+    def _duplicate(self, srcfile, infos):
+        """Counts a file whose infos were extracted from another file.
+        @return (srcfile, infos) tuple
+        """
+        self.duplicates += 1
+        if self.profiler is not None:
+            self.profiler.count('files_scanned')
+            self.profiler.count('files_duplicate')
+        return srcfile, infos
+
+    @staticmethod
+    def _report_duplicates(count):
+        """Logs the number of files not parsed again."""
+        if count:
+            logger.info("%d duplicate files collapsed", count)
+
+    def _check_result(self, srcfile, result, cache=None):
+        """Reports errors, cache usage, timings and counters of an extraction result.
+        @return (srcfile, infos) tuple
+        """
+        if self.profiler is not None:
+            self.profiler.add(srcfile, result.times, result.counts)
+            self.profiler.count('files_scanned')
+            if result.cached:
+                self.profiler.count('files_cached')
+        if result.errors:
+            (self.errfile or sys.stderr).write(result.errors)
+        if cache and result.infos is not None:
+            if result.cached:
+                cache.hits += 1
+            else:
+                cache.misses += 1
+        return srcfile, result.infos
+
+    def output_order(self, srcfiles):
+        """Orders source files as they would be output: as given."""
+        return srcfiles
+
+    def do_files(self, srcfiles, errormsg=None, jobs=1, cache=None):
+        """Processes several python source files, in given order.
+
+        Output is the same as calling do_file() for each file,
+        see `extract_files()` for parameters.
+
+        When `streaming`, files are processed in `output_order()`, each file
+        being written and flushed, and its model released, before the next
+        one is parsed: memory use does not grow with the number of files.
+        """
+        if self.streaming:
+            srcfiles = self.output_order(srcfiles)
+        for srcfile, infos in self.extract_files(srcfiles, errormsg, jobs, cache):
+            if infos is not None:
+                self.emit_file(srcfile, infos)
+                if self.streaming:
+                    self.dest.flush()
+            del infos
+
     @staticmethod
     def _deco_marker(dec):
         """helper function for functions decorators"""
-        if isinstance(dec, ast.Attribute):
-            return '@' + astor.to_source(dec).rstrip()
-        if dec.id == 'staticmethod':
-            return 'static'
-        if dec.id == 'abstractmethod':
-            return 'abstract'
-        return '@' + dec.id
+        return deco_marker(dec)
 
     @staticmethod
     def is_static_method(meth):
         """Tells if given method is marked as static."""
-        for dec in meth.decorator_list:
-            if isinstance(dec, ast.Name) and dec.id == 'staticmethod':
-                return True
+        return meth.static
 
     def print_classinfo(self, classinfo):
         """Prints class definition as plantuml script."""
+        if self.profiler is not None:
+            self.profiler.count('classes')
+            self.profiler.count('methods', len(classinfo.methods))
         for base in classinfo.bases:
-            expr = astor.to_source(base).rstrip()
             # ignore base if 'object'
-            if expr != 'object':
-                self.output(expr, "<|--", classinfo.classname)
+            if base != 'object':
+                self.output(base, "<|--", classinfo.classname)
         # class and instance members
         self.output("class", classinfo.classname, "{")
         for m in classinfo.classvars:
@@ -160,13 +370,15 @@ class PUML_Generator:
             self.output(TAB + "{0}{1}({2}){3}".format(
                 classinfo.visibility(m.name),
                 m.name, self.arglist(m, ismethod=True),
-                ','.join(["{%s}" % (self._deco_marker(dec),) for dec in m.decorator_list])
+                ','.join(["{%s}" % (marker,) for marker in m.markers])
             ))
         self.output("}\n")
 
     def print_codeinfo(self, codeinfo):
         """Prints module globals as plantuml script."""
-        assert self.opt_globals()
+        assert self.settings.write_globals
+        if self.profiler is not None:
+            self.profiler.count('globals', len(codeinfo.variables) + len(codeinfo.functions))
         # logger.warning("module.write-globals is not implemented")
         # represents data as a special class in plantuml
         self.output("class", "__module__", "{")
@@ -180,41 +392,114 @@ class PUML_Generator:
 
     def arglist(self, fdef, ismethod=False):
         """Builds the argument list string of a function or method,
-        according to configured options."""
-        section = 'methods' if ismethod else 'module'
-        if not self.opt_write_arglist(section):
-            return ''
-
-        # avoid changing orginal args
-        args = copy.deepcopy(fdef.args)
-
-        # omit-self ?
-        if ismethod and self.opt_omit_self() and not self.is_static_method(fdef):
-            self_arg = args.args.pop(0)
-            if self_arg.arg != 'self':
+        according to configured options.
+
+        @param fdef FunctionInfo: the function, or its ast.FunctionDef node
+        @param ismethod: apply methods options rather than module ones
+        """
+        if not isinstance(fdef, FunctionInfo):
+            fdef = FunctionInfo.from_node(fdef)
+        settings = self.settings
+        if ismethod:
+            if not settings.methods_write_arglist:
+                return ''
+            omit_defaults = settings.methods_omit_defaults
+            # omit-self ?
+            omit_self = settings.omit_self and not self.is_static_method(fdef)
+        else:
+            if not settings.module_write_arglist:
+                return ''
+            omit_defaults = settings.module_omit_defaults
+            omit_self = False
+
+        if omit_self:
+            self_name = first_param_name(fdef.params)
+            if self_name != 'self':
                 logger.warning("Unexpected name %r for method 'self' parameter in %s()",
-                               self_arg.arg, fdef.name)
+                               self_name, fdef.name)
+
+        return join_params(fdef.params, omit_first=omit_self,
+                           omit_defaults=omit_defaults)
 
-        # omit-defaults ?
-        if self.opt_omit_defaults(section):
-            args.defaults = []
-            args.kw_defaults = []
+class NamespaceTree:
+    """Rendered fragments of source files, grouped by namespace.
 
-        return astor.to_source(args).rstrip()
+    Each namespace holds, in order of first appearance, the fragments of
+    its own files and its inner namespaces. Walking the tree gives the
+    files of each namespace together, and keeps the original order of
+    files whose namespaces were already grouped.
+    """
+    __slots__ = ('children', 'items')
+
+    def __init__(self):
+        # name -> NamespaceTree
+        self.children = {}
+        # NamespaceTree or (srcfile, fragment) tuples
+        self.items = []
+
+    def add(self, namespaces, srcfile, fragment):
+        """Adds the fragment of a source file in given namespace."""
+        node = self
+        for name in namespaces:
+            child = node.children.get(name)
+            if child is None:
+                child = node.children[name] = NamespaceTree()
+                node.items.append(child)
+            node = child
+        node.items.append((srcfile, fragment))
+
+    def __iter__(self):
+        """Iterates over the (srcfile, fragment) tuples, grouped by namespace."""
+        stack = [iter(self.items)]
+        while stack:
+            for item in stack[-1]:
+                if isinstance(item, NamespaceTree):
+                    stack.append(iter(item.items))
+                    break
+                yield item
+            else:
+                stack.pop()
 
 class PUML_Generator_NS(PUML_Generator):
     """Formats data for PlantUML.
+
+    Files are grouped by namespace, whatever their order: written files
+    are held in a `NamespaceTree` until the footer is output, so that each
+    namespace is opened once. Files are output as they come if `grouped`
+    is set to False, or when `streaming`, in which case `do_files()`
+    groups the file names before processing them.
     """
-    def __init__(self, dest, root, config=None):
-        super().__init__(dest, config)
+    def __init__(self, dest, root, config=None, settings=None):
+        super().__init__(dest, config, settings)
         self.root = root
         self.namespaces = []
+        self.grouped = True
+        # files held until the footer, if grouped
+        self.tree = NamespaceTree()
 
     @property
     def depth(self):
         """Levels of current namespace nesting"""
         return len(self.namespaces)
 
+    def namespaces_of(self, sourcename):
+        """Namespace hierarchy of a source file, from root.
+
+        Files in an archive are named after their path in the archive,
+        from root if it is a directory of the same archive.
+        """
+        import archives
+        member = archives.split_member(sourcename)
+        if member is None:
+            names = os.path.splitext(os.path.relpath(sourcename, self.root))[0]
+            return names.split(os.path.sep)
+        archive, path = member
+        root = archives.split_member(self.root)
+        if root and os.path.abspath(root[0]) == os.path.abspath(archive) \
+                and path.startswith(root[1] + '/'):
+            path = path[len(root[1]) + 1:]
+        return os.path.splitext(path)[0].split('/')
+
     def start_file(self, sourcename):
         """Sets up the output context for a single python source file.
         This is where namespaces nesting is generated.
@@ -222,8 +507,7 @@ class PUML_Generator_NS(PUML_Generator):
         super().start_file(sourcename)
 
         # make namespace hierarchy from root if supplied
-        names = os.path.splitext(os.path.relpath(sourcename, self.root))[0]
-        namespaces = names.split(os.path.sep)
+        namespaces = self.namespaces_of(sourcename)
 
         # determine the common path
         n = 0
@@ -250,14 +534,71 @@ class PUML_Generator_NS(PUML_Generator):
         self.namespaces.append(name)
 
     def output(self, *args):
-        """Formats given arguments to destination with proper indentation."""
-        if self.namespaces:
-            print(TAB * self.depth, end="", file=self.dest)
+        """Formats given arguments to destination with proper indentation.
+        Rendered fragments are not indented until written."""
+        if self.namespaces and self.fragment is None:
+            self._write(TAB * self.depth)
         super().output(*args)
 
+    def do_file(self, srcfile, errormsg=None):
+        """Processes a single python source file, see `PUML_Generator.do_file()`.
+        If grouped, its output is held until the footer, unless streaming.
+        """
+        if not self.grouped or self.streaming:
+            super().do_file(srcfile, errormsg)
+            return
+        visitor = self._visitor(srcfile)
+        if visitor.parse(errormsg):
+            self.fragment = []
+            try:
+                visitor.visit_tree()
+                fragment = self.fragment
+            finally:
+                self.fragment = None
+            self.write_file(srcfile, fragment)
+
+    def write_file(self, srcfile, fragment):
+        """Outputs the rendered fragment of a single python source file,
+           or holds it until the footer if grouped.
+        """
+        if self.grouped and not self.streaming:
+            self.tree.add(self.namespaces_of(srcfile), srcfile, fragment)
+        else:
+            super().write_file(srcfile, fragment)
+
+    def output_order(self, srcfiles):
+        """Orders source files as they would be output: grouped by namespace
+        if `grouped`. Only file names are held."""
+        if not self.grouped:
+            return srcfiles
+        tree = NamespaceTree()
+        for srcfile in srcfiles:
+            tree.add(self.namespaces_of(srcfile), srcfile, None)
+        return [srcfile for srcfile, fragment in tree]
+
+    def flush(self):
+        """Outputs the files held so far, grouped by namespace."""
+        tree, self.tree = self.tree, NamespaceTree()
+        for srcfile, fragment in tree:
+            super().write_file(srcfile, fragment)
+
     def footer(self):
-        """Outputs file footer: close namespaces and marker."""
+        """Outputs file footer: held files, close namespaces and marker."""
+        self.flush()
         # Close the namespaces
         while self.namespaces:
             self.pop_ns(self.depth)
         super().footer()
+
+def make_generator(dest, config=None, root=None, settings=None):
+    """Builds a .puml generator.
+
+    @param dest stream: File-like object to write to
+    @param config ConfigParser: custom settings (default None)
+    @param root: if given, modules are grouped in namespaces
+           after their path relative to this directory
+    @param settings Settings: options already resolved from config, if any
+    """
+    if root:
+        return PUML_Generator_NS(dest=dest, root=root, config=config, settings=settings)
+    return PUML_Generator(dest=dest, config=config, settings=settings)
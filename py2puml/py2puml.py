@@ -19,17 +19,15 @@ Missing:
 
 # standard lib imports
 import configparser
+import io
 import logging
-import logging.config
 import os
 import sys
 
-# other imports
-import yaml
-
 # this project imports
-from version import __version__
-from puml_generator import PUML_Generator, PUML_Generator_NS
+# optional features modules are imported when used, for a fast startup
+from puml_generator import DEFAULT_READ_AHEAD, make_generator
+from sources import iter_sources
 
 HOME_DIR = os.path.dirname(__file__)
 
@@ -45,20 +43,103 @@ CONFIG_FILENAMES = (
     '.py2puml.ini',
     'py2puml.ini',
 )
+# logging configuration for synchronous debug tracing, see --log-config
 LOGGING_CFG = os.path.join(HOME_DIR, 'logging.yaml')
 
-with open(LOGGING_CFG) as f:
-    logging.config.dictConfig(yaml.load(f))
+# log formats
+STANDARD_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+TRACING_FORMAT = "%(asctime)s [%(name)s] %(levelname)s in %(funcName)s" \
+                 " at %(pathname)s:%(lineno)d : %(message)s"
+
 logger = logging.getLogger() # (__name__)
+# handlers added by the last setup_logging()
+_log_handlers = []
+
+def setup_logging(log_file=None, level='DEBUG', config_file=None):
+    """Configures logging for command line use.
+
+    By default only warnings are logged, to stderr. The log file is opt-in:
+    its records are written by a background thread, fed through a queue,
+    so that logging does not slow down processing. The queue is shared with
+    forked worker processes (--jobs), whose records are written too.
+    Handlers added by a previous call are removed.
+
+    @param log_file: name of the log file, None for no log file
+    @param level: level name of the records written to the log file
+    @param config_file: YAML logging configuration replacing the above,
+           as loaded by `logging.config.dictConfig()`
+    @return the QueueListener writing the log file, to be stopped at exit,
+            or None
+    """
+    while _log_handlers:
+        handler = _log_handlers.pop()
+        logger.removeHandler(handler)
+        handler.close()
+    if config_file:
+        from logging.config import dictConfig
+        import yaml
+        with open(config_file) as f:
+            dictConfig(yaml.safe_load(f))
+        return None
+
+    console = logging.StreamHandler()
+    console.setLevel(logging.WARNING)
+    console.setFormatter(logging.Formatter(STANDARD_FORMAT))
+    logger.addHandler(console)
+    _log_handlers.append(console)
+    logger.setLevel(logging.WARNING)
+    if not log_file:
+        return None
+
+    from logging.handlers import QueueHandler, QueueListener
+    import multiprocessing
+    level = logging.getLevelName(level.upper())
+    file_handler = logging.FileHandler(log_file, mode='w', encoding='utf8')
+    file_handler.setFormatter(logging.Formatter(TRACING_FORMAT))
+    records = multiprocessing.Queue()
+    queue_handler = QueueHandler(records)
+    queue_handler.setLevel(level)
+    logger.addHandler(queue_handler)
+    _log_handlers.append(queue_handler)
+    logger.setLevel(min(level, logging.WARNING))
+    listener = QueueListener(records, file_handler)
+    listener.start()
+    return listener
 
 def cli_parser():
     "Builds a command line parser suitable for this tool."
     import argparse
 
+    class HelpFormatter(argparse.RawDescriptionHelpFormatter):
+        "Fills in the version number, only computed when help is printed."
+        def add_text(self, text):
+            if text and '%(version)s' in text:
+                import version
+                text = text.replace('%(version)s', version.__version__)
+            super().add_text(text)
+
+    def count(minimum):
+        "Argument type of integers not less than minimum."
+        def parse(text):
+            value = int(text)
+            if value < minimum:
+                raise argparse.ArgumentTypeError('%d is less than %d' % (value, minimum))
+            return value
+        parse.__name__ = 'int'
+        return parse
+
+    def seconds(text):
+        "Argument type of positive durations, in seconds."
+        value = float(text)
+        if not 0 < value < float('inf'):
+            raise argparse.ArgumentTypeError('%s is not a positive duration' % text)
+        return value
+    seconds.__name__ = 'float'
+
     # Takes a python file as a parameter.
     parser = argparse.ArgumentParser(
         prog='py2uml',
-        description='py2puml v' + __version__ +
+        description='py2puml v%(version)s' +
         '\nby Michelle Baert, based on work from Martin B. K. Grønholdt.\n\n' +
         '    Create PlantUML classes from Python source code.',
         epilog='If no config file is provided, settings are loaded\n' +
@@ -70,19 +151,181 @@ def cli_parser():
         '      - <WORK_DIR>/py2puml.ini\n' +
         '\nIf the provided config filename cannot be found,\n' +
         'the program will use no config at all.\n',
-        formatter_class=argparse.RawDescriptionHelpFormatter)
+        formatter_class=HelpFormatter)
     parser.add_argument('-c', '--config',
                         help='Configuration file (replace defaults)')
-    parser.add_argument('-o', '--output', type=argparse.FileType('w'),
-                        default=sys.stdout,
+    parser.add_argument('-o', '--output', default='-',
                         help='The name of the ouput PlantUML file.')
+    parser.add_argument('--if-changed', action='store_true',
+                        help='Replace the output file only if its content changed,'
+                        ' keeping its modification time otherwise')
+    parser.add_argument('-MD', dest='depfile', action='store_const', const='',
+                        help='Write a make dependency file of the output, listing'
+                        ' the source and config files read, named after the'
+                        ' output with a .d suffix')
+    parser.add_argument('-MF', dest='depfile', metavar='DEP_FILE',
+                        help='Write the make dependency file to DEP_FILE (implies -MD)')
     parser.add_argument('-r', '--root', #default='',
                         help='Project root directory.'
                         ' Create namespaces from there')
-    parser.add_argument('py_file', nargs='+',
-                        help='the Python source files to parse.')
+    parser.add_argument('-j', '--jobs', type=count(0), default=1,
+                        help='Number of processes parsing source files'
+                        ' in parallel (0: one per CPU)')
+    parser.add_argument('--read-ahead', type=count(0), default=DEFAULT_READ_AHEAD, metavar='N',
+                        help='Number of files read by background threads while'
+                        ' parsing, 0 to disable (default %(default)s).')
+    parser.add_argument('--cache-dir',
+                        help='Directory where to keep parsing results'
+                        ' between runs (cache hits are counted by --metrics)')
+    parser.add_argument('--cache-size', type=count(0), default=256,
+                        help='Size limit of the cache directory, in MiB'
+                        ' (default: 256)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Output each file as soon as parsed, so that memory'
+                        ' use does not grow with the number of files')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='Keep running, regenerating the output'
+                        ' when source files change')
+    parser.add_argument('--interval', type=seconds, default=1.0,
+                        help='Seconds between source files checks'
+                        ' in watch mode (default: 1)')
+    parser.add_argument('--git-state', metavar='JSON_FILE',
+                        help='Regenerate incrementally: parse only the files changed'
+                        ' in git since this state file was saved, then update it.')
+    parser.add_argument('--git-base', metavar='REF',
+                        help='With --git-state, reuse the saved fragments only if'
+                        ' the state was saved at this git ref, parse all files'
+                        ' otherwise.')
+    parser.add_argument('-m', '--module', action='append', default=[], metavar='NAME',
+                        help='Parse an installed module or package, found by name'
+                        ' like the interpreter would import it, without importing'
+                        ' it. Can be repeated.')
+    parser.add_argument('-i', '--include', action='append', default=[],
+                        metavar='GLOB',
+                        help='Pattern of the files to parse in directories'
+                        ' (default: *.py)')
+    parser.add_argument('-x', '--exclude', action='append', default=[],
+                        metavar='GLOB',
+                        help='Pattern of the files or directories to skip'
+                        ' in directories')
+    parser.add_argument('--profile', metavar='JSON_FILE',
+                        help='Write the time spent in each phase,'
+                        ' in total and for the slowest files')
+    parser.add_argument('--profile-top', type=count(0), default=10, metavar='N',
+                        help='Number of slowest files in profile (default: 10)')
+    parser.add_argument('--profile-pstats', metavar='PSTATS_FILE',
+                        help='Write cProfile statistics of the whole run')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='Write metrics of the run: counters (files parsed,'
+                        ' cached or collapsed as duplicates...), phase timings'
+                        ' and peak memory, in Prometheus text format,'
+                        ' or JSON if FILE ends with .json')
+    parser.add_argument('--log-file',
+                        help='Write a log file, with tracing details')
+    parser.add_argument('--log-level', default='DEBUG',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Level of the records written to the log file'
+                        ' (default: DEBUG)')
+    parser.add_argument('--log-config', nargs='?', const=LOGGING_CFG,
+                        metavar='YAML_FILE',
+                        help='Configure logging from a YAML file instead'
+                        ' (default: logging.yaml from program directory,'
+                        ' synchronous tracing to py2puml.log)')
+    parser.add_argument('--serve', metavar='ADDRESS',
+                        help='Run a render server on a unix socket path, a port'
+                        ' or host:port, instead of processing py_file arguments.')
+    parser.add_argument('--workers', type=count(1), default=4, metavar='N',
+                        help='Number of requests served at once (default %(default)s).')
+    parser.add_argument('--allow-remote', action='store_true',
+                        help='Let --serve listen on an address other hosts can'
+                        ' connect to, giving them read access to any file'
+                        ' the server can read.')
+    parser.add_argument('--manifest', metavar='INI_FILE',
+                        help='Generate the diagrams of all the targets of a manifest,'
+                        ' instead of processing py_file arguments.'
+                        ' Files are parsed once for all targets.')
+    parser.add_argument('py_file', nargs='*',
+                        help='the Python source files or directories to parse,'
+                        ' or archives (.whl, .zip, .tar.gz), optionally'
+                        ' followed by !/PATH to parse a path inside.')
     return parser
 
+def read_config(config=None):
+    """Builds the configuration of a generator.
+
+    @param config: a ConfigParser, returned as is, or the name or list of
+           names of ini files to read, missing files being ignored.
+           None for the default settings.
+    @return ConfigParser
+    """
+    if isinstance(config, configparser.ConfigParser):
+        return config
+    cfg = configparser.ConfigParser()
+    if config:
+        cfg.read(config)
+    return cfg
+
+def generate_lines(paths, config=None, root=None, include=(), exclude=(),
+                   jobs=1, cache=None, errfile=None):
+    """Generates a PlantUML diagram, line by line.
+
+    Lines are yielded as soon as each source file is processed, files being
+    grouped by namespace first if root is given. This has no side effect
+    on the process: logging is left as configured by the caller, so it
+    can be called repeatedly, or concurrently from several threads.
+
+    >>> for line in generate_lines(['mypackage'], root='.'):
+    ...     print(line, end='')
+
+    @param paths: python files or directories to search for python files,
+           a single name being accepted too
+    @param config: ConfigParser, or ini file name(s), see `read_config()`.
+           Note that the default config files of the command are not read.
+    @param root: group modules in namespaces relative to this directory
+    @param include: more glob patterns of the files to search for
+    @param exclude: more glob patterns of the files or directories to skip
+    @param jobs: number of worker processes, None or 0 for one per CPU
+    @param cache ExtractionCache: persistent cache of extracted infos
+    @param errfile: where to report skipped files, default sys.stderr
+    @return iterator of lines, with line endings
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    buffer = io.StringIO()
+    gen = make_generator(buffer, read_config(config), root)
+    gen.errfile = errfile
+    gen.streaming = True
+    srcfiles = iter_sources(paths,
+                            include=gen.settings.include + tuple(include),
+                            exclude=gen.settings.exclude + tuple(exclude))
+
+    def drain():
+        "Takes the lines written so far."
+        lines = buffer.getvalue().splitlines(True)
+        buffer.seek(0)
+        buffer.truncate()
+        return lines
+
+    gen.header()
+    yield from drain()
+    for srcfile, infos in gen.extract_files(gen.output_order(srcfiles), "Skipping file",
+                                            jobs, cache):
+        if infos is not None:
+            gen.emit_file(srcfile, infos)
+            yield from drain()
+    gen.footer()
+    yield from drain()
+
+def generate(paths, config=None, root=None, **options):
+    """Generates a PlantUML diagram.
+
+    >>> puml = generate('mymodule.py', config='py2puml.ini')
+
+    See `generate_lines()` for parameters.
+    @return the diagram text
+    """
+    return ''.join(generate_lines(paths, config, root, **options))
+
 def run(cl_args):
     """Main application runner.
 
@@ -90,33 +333,213 @@ def run(cl_args):
     """
     logger.info("Running with args: %r", cl_args)
 
+    if (cl_args.serve or cl_args.manifest or cl_args.watch) and (
+            cl_args.if_changed or cl_args.depfile is not None):
+        sys.exit("--if-changed and -MD are not supported with --serve, --manifest or --watch")
+    if (cl_args.serve or cl_args.manifest) and (cl_args.profile or cl_args.profile_pstats):
+        sys.exit("--profile and --profile-pstats are not supported with --serve or --manifest")
+    if (cl_args.serve or cl_args.manifest) and cl_args.metrics:
+        sys.exit("--metrics is not supported with --serve or --manifest")
+
+    pstats_profile = None
+    if cl_args.profile_pstats:
+        import cProfile
+        pstats_profile = cProfile.Profile()
+        pstats_profile.enable()
+
     # Load configuration
-    cfg = configparser.ConfigParser()
-    if cl_args.config:
-        # provided config file completely replaces global settings
-        cfg.read(cl_args.config)
+    # provided config file completely replaces global settings
+    cfg = read_config(cl_args.config or CONFIG_FILENAMES)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Using config: %r",
+                    {s: {o:v for o, v in cfg.items(s)} for s, o in cfg.items()})
+
+    if cl_args.serve:
+        import server
+        try:
+            listening = server.make_server(server.parse_address(cl_args.serve),
+                                           server.RenderService(cfg),
+                                           workers=cl_args.workers,
+                                           allow_remote=cl_args.allow_remote)
+        except (OSError, ValueError) as err:
+            sys.exit("Cannot serve on %s: %s" % (cl_args.serve, err))
+        server.serve(listening)
+        return
+
+    if cl_args.manifest:
+        build_manifest(cl_args, cfg)
+        return
+
+    if cl_args.depfile is not None and cl_args.output == '-':
+        sys.exit("A dependency file needs an output file (-o)")
+    if cl_args.output == '-':
+        output = sys.stdout
     else:
-        cfg.read(CONFIG_FILENAMES)
-    logger.info("Using config: %r",
-                {s: {o:v for o, v in cfg.items(s)} for s, o in cfg.items()})
+        try:
+            if cl_args.if_changed:
+                import outputs
+                output = outputs.open_output(cl_args.output, if_changed=True)
+            else:
+                output = open(cl_args.output, 'w')
+        except OSError as err:
+            sys.exit("Cannot write output: %s" % err)
 
+    try:
+        inputs = write_diagram(cl_args, cfg, output)
+    except BaseException:
+        # a failed run leaves the output as it was
+        if cl_args.if_changed and output is not sys.stdout:
+            output.discard()
+        raise
+    if pstats_profile:
+        pstats_profile.disable()
+        pstats_profile.dump_stats(cl_args.profile_pstats)
+    # TODO detect and warn about empty results
+    if output is not sys.stdout:
+        output.close()
+    if cl_args.depfile is not None:
+        import outputs
+        config_files = [cl_args.config] if cl_args.config else CONFIG_FILENAMES
+        outputs.write_depfile(cl_args.depfile or outputs.depfile_name(cl_args.output),
+                              cl_args.output,
+                              inputs + [name for name in config_files if os.path.isfile(name)])
+
+def write_diagram(cl_args, cfg, output):
+    """Generates the diagram of the command line sources.
+
+    @param cl_args: argparser namespace
+    @param cfg ConfigParser: settings
+    @param output: file the diagram is written to
+    @return names of the files sources were read from, if a dependency
+            file is requested
+    """
     # setup .puml generator
-    if cl_args.root:
-        gen = PUML_Generator_NS(dest=cl_args.output,
-                                root=cl_args.root,
+    gen = make_generator(output, cfg, cl_args.root)
+    gen.read_ahead = cl_args.read_ahead
+    gen.streaming = cl_args.stream
+    if cl_args.profile or cl_args.metrics:
+        from profiler import Profiler
+        gen.profiler = Profiler()
+
+    cache = None
+    if cl_args.cache_dir:
+        from extraction_cache import ExtractionCache
+        cache = ExtractionCache(cl_args.cache_dir,
+                                max_size=cl_args.cache_size * 1024 * 1024,
                                 config=cfg)
+
+    # source files are searched lazily in directories
+    paths = cl_args.py_file + resolve_modules(cl_args)
+    include = gen.settings.include + tuple(cl_args.include)
+    exclude = gen.settings.exclude + tuple(cl_args.exclude)
+    srcfiles = iter_sources(paths, include=include, exclude=exclude)
+    inputs = []
+    if cl_args.depfile is not None:
+        srcfiles = record_inputs(srcfiles, inputs)
+
+    if cl_args.watch:
+        from watcher import Watcher
+        # directories are searched again on each scan, for new files
+        Watcher(gen, lambda: iter_sources(paths, include=include, exclude=exclude),
+                "Skipping file", jobs=cl_args.jobs, cache=cache).run(cl_args.interval)
+    elif cl_args.git_state:
+        from incremental import regenerate
+        regenerate(gen, srcfiles, cl_args.git_state, cl_args.git_base,
+                   "Skipping file", jobs=cl_args.jobs, cache=cache)
     else:
-        gen = PUML_Generator(dest=cl_args.output,
-                             config=cfg)
+        gen.header()
+        gen.do_files(srcfiles, "Skipping file",
+                     jobs=cl_args.jobs, cache=cache)
+        gen.footer()
+    if cache:
+        cache.prune()
+        cache.report()
+    if cl_args.profile:
+        gen.profiler.write(cl_args.profile, top=cl_args.profile_top)
+    if cl_args.metrics:
+        import metrics
+        metrics.write(cl_args.metrics, gen.profiler)
+    return inputs
 
-    gen.header()
-    for srcfile in cl_args.py_file:
-        gen.do_file(srcfile, "Skipping file")
+def record_inputs(srcfiles, inputs):
+    """Records the files sources are read from, for a dependency file.
 
-    gen.footer()
-    # TODO detect and warn about empty results
-    if cl_args.output != sys.stdout: # pragma: no cover
-        cl_args.output.close()
+    @param srcfiles: iterable of source file names
+    @param inputs: list extended with the file names, archives instead
+           of their members
+    @return iterator of srcfiles
+    """
+    import archives
+    for srcfile in srcfiles:
+        member = archives.split_member(srcfile)
+        inputs.append(member[0] if member else srcfile)
+        yield srcfile
+
+def resolve_modules(cl_args):
+    """Finds the source paths of the modules given on the command line.
+    Modules which cannot be found are reported and skipped.
+
+    @param cl_args: argparser namespace
+    @return list of paths
+    """
+    if not cl_args.module:
+        return []
+    from modules import ModuleResolver, default_cache_file
+    cache_file = default_cache_file()
+    if cl_args.cache_dir:
+        cache_file = os.path.join(cl_args.cache_dir, 'modules.json')
+    resolver = ModuleResolver(cache_file)
+    paths = []
+    for name in cl_args.module:
+        try:
+            paths.extend(resolver.resolve(name))
+        except ImportError as err:
+            sys.stderr.write("%s, skipping\n" % err)
+    try:
+        resolver.save()
+    except OSError as err:
+        logger.warning("Module cache not saved: %s", err)
+    return paths
+
+def build_manifest(cl_args, cfg):
+    """Generates the diagrams listed in a manifest file.
+
+    @param cl_args: argparser namespace
+    @param cfg ConfigParser: settings of targets without config
+    """
+    from manifest import Manifest
+    try:
+        manifest = Manifest.read(cl_args.manifest, cfg)
+    except (OSError, ValueError) as err:
+        sys.exit("Bad manifest: %s" % err)
+    cache = None
+    if cl_args.cache_dir:
+        from extraction_cache import ExtractionCache
+        cache = ExtractionCache(cl_args.cache_dir,
+                                max_size=cl_args.cache_size * 1024 * 1024,
+                                config=manifest.parse_config())
+    manifest.build("Skipping file", jobs=cl_args.jobs, cache=cache,
+                   read_ahead=cl_args.read_ahead)
+    if cache:
+        cache.prune()
+        cache.report()
+
+def main(argv=None):
+    """Command line entry point.
+
+    @param argv: command line arguments, default from sys.argv
+    """
+    parser = cli_parser()
+    cl_args = parser.parse_args(argv)
+    if not (cl_args.py_file or cl_args.module or cl_args.serve or cl_args.manifest):
+        parser.error('the following arguments are required: py_file')
+    listener = setup_logging(cl_args.log_file, cl_args.log_level,
+                             cl_args.log_config)
+    try:
+        run(cl_args)
+    finally:
+        if listener:
+            listener.stop()
 
 if __name__ == '__main__': # pragma: no cover
-    run(cli_parser().parse_args())
+    main()
@@ -0,0 +1,398 @@
+"""Header-only extraction of classes and globals, for huge source files.
+
+Generated modules (protobuf stubs, lookup tables) can weigh megabytes while
+only their class headers, method signatures and constructor assignments
+are needed: building their whole ast is slow and takes hundreds of bytes
+per literal. The `HeaderScanner` gives the same infos as a `TreeVisitor`
+walking the full tree, by lexing the source instead:
+
+- logical lines are delimited following the tokenizer rules for strings,
+  comments, brackets and line continuations; runs of plain code, bracketed
+  literals above all, are skipped by regular expressions, without
+  building tokens. The `tokenize` module being pure python, it would be
+  slower than `ast.parse()` itself.
+- statements are walked as the visitor does, by indentation; function
+  bodies are skipped, except constructors.
+- only class and function headers are parsed, with their decorators, by
+  `ast.parse()`, to build the infos exactly like the visitor.
+
+`UnsupportedSyntax` is raised for constructs the scanner does not handle
+(match statements, mixed tab and space indentation, lambda in compound
+statement headers...) or for errors it detects: the file is then parsed
+as usual, which reports syntax errors. Being a lexer, the scanner does not
+check the syntax of the code it skips.
+"""
+import ast
+import re
+import sys
+from functools import partial
+
+from code_info import CodeInfo, ClassInfo
+
+# statements walked through, their nested statements being visited
+COMPOUND_KEYWORDS = frozenset(('if', 'elif', 'else', 'for', 'while', 'try', 'except',
+                               'finally', 'with', 'async'))
+# soft keywords of statements not handled
+SOFT_KEYWORDS = frozenset(('match', 'case'))
+
+# special characters ending a run of plain code, out of and within brackets
+_TOP_SPECIAL = re.compile(r'[\n\\#\'"()\[\]{}=:;]')
+_NESTED_SPECIAL = re.compile(r'[\n\\#\'"()\[\]{}]')
+# rest of a string literal after its opening quotes, escapes included
+_STRING_END = {
+    "'": re.compile(r"[^'\\\n]*(?:\\.[^'\\\n]*)*'", re.S),
+    '"': re.compile(r'[^"\\\n]*(?:\\.[^"\\\n]*)*"', re.S),
+    "'''": re.compile(r"[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*'''", re.S),
+    '"""': re.compile(r'[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*"""', re.S),
+}
+_INDENT = re.compile(r'[ \t\f]*')
+_FIRST_WORD = re.compile(r'\w+')
+_LAMBDA = re.compile(r'\blambda\b')
+_SELF_ATTRIBUTE = re.compile(r'self\s*\.\s*(\w+)')
+_PARENTHESIZED = re.compile(r'\(([^(),]*)\)')
+_PARENTHESIZED_SELF = re.compile(r'^\(\s*self\s*\)')
+# characters before '=' making an augmented assignment or a comparison
+_NOT_ASSIGN = frozenset('=!<>+-*/%&|^@:')
+# f-strings may nest quotes of the same kind since python 3.12
+_NESTED_QUOTES = sys.version_info >= (3, 12)
+
+class UnsupportedSyntax(Exception):
+    """Raised when the source must be parsed as a whole."""
+
+class _Block:
+    """An indented block of statements."""
+    __slots__ = ('indent', 'on_end', 'skip')
+
+    def __init__(self, indent, on_end=None, skip=False):
+        # (column, column with tabs of size 1), like the tokenizer
+        self.indent = indent
+        # callback at the end of the block
+        self.on_end = on_end
+        # whether statements are ignored, in a function body
+        self.skip = skip
+
+class HeaderScanner:
+    """Extracts infos from a source file like a TreeVisitor, see module doc.
+
+    >>> infos = HeaderScanner(source, write_globals=False).scan()
+    """
+    def __init__(self, source, write_globals=False):
+        """Constructor.
+
+        @param source: file content, as bytes or str
+        @param write_globals: whether module globals are collected
+        """
+        if isinstance(source, bytes):
+            source = _decode(source)
+        if '\0' in source:
+            raise UnsupportedSyntax('null bytes')
+        self.text = source.replace('\r\n', '\n').replace('\r', '\n')
+        self.write_globals = write_globals
+        # collected infos, in the order a TreeVisitor reports them
+        self.infos = []
+        self.classinfo = None
+        self.moduleinfo = None
+        self.constructor = False
+        # decorators of the next definition
+        self.decorators = []
+
+    def scan(self):
+        """Walks the statements of the source.
+        @return list of ClassInfo/CodeInfo, like `InfoCollector.infos`
+        @raise UnsupportedSyntax if the source must be parsed as a whole
+        """
+        self.moduleinfo = CodeInfo() if self.write_globals else None
+        blocks = [_Block((0, 0))]
+        # block opened by the last header, starting on next line
+        pending = None
+        for indent, start, end, marks in self._logical_lines():
+            block = blocks[-1]
+            if pending is not None:
+                if _compare(indent, block.indent) <= 0:
+                    raise UnsupportedSyntax('expected an indented block')
+                blocks.append(_Block(indent, *pending))
+                pending = None
+            elif block.skip and _compare(indent, block.indent) >= 0:
+                continue
+            elif _compare(indent, block.indent) > 0:
+                raise UnsupportedSyntax('unexpected indent')
+            while _compare(indent, blocks[-1].indent) < 0:
+                self._end_block(blocks.pop())
+                if _compare(indent, blocks[-1].indent) > 0:
+                    raise UnsupportedSyntax('unindent does not match any outer level')
+            if blocks[-1].skip:
+                continue
+            pending = self._statement(start, end, marks)
+        if pending is not None:
+            raise UnsupportedSyntax('expected an indented block')
+        while len(blocks) > 1:
+            self._end_block(blocks.pop())
+        if self.moduleinfo:
+            self.infos.append(self.moduleinfo)
+        return self.infos
+
+    @staticmethod
+    def _end_block(block):
+        if block.on_end is not None:
+            block.on_end()
+
+    def _statement(self, start, end, marks):
+        """Handles the statements of a logical line.
+
+        @param marks: positions of top level ':', '=' and ';'
+        @return (on_end, skip) of the block opened on next line, if any
+        """
+        text = self.text
+        word = _FIRST_WORD.match(text, start)
+        word = word.group() if word else None
+        if text[start] == '@':
+            self.decorators.append(text[start + 1:end])
+            return None
+        if word in ('class', 'def') or word in COMPOUND_KEYWORDS:
+            colon = next((pos for pos in marks if text[pos] == ':'), None)
+            if colon is None:
+                raise UnsupportedSyntax('missing colon')
+            header = text[start:colon]
+            if _LAMBDA.search(header) and sum(text[pos] == ':' for pos in marks) > 1:
+                # the colon might be the one of the lambda
+                raise UnsupportedSyntax('lambda in a statement header')
+            on_end, skip = self._header(word, header)
+            if text[colon + 1:end].strip():
+                # simple statements on the same line
+                if not skip:
+                    self._simple_statements(colon + 1, end, [pos for pos in marks if pos > colon])
+                if on_end is not None:
+                    on_end()
+                return None
+            return on_end, skip
+        if word in SOFT_KEYWORDS and any(text[pos] == ':' for pos in marks):
+            raise UnsupportedSyntax('%s statement' % word)
+        self._simple_statements(start, end, marks)
+        return None
+
+    def _header(self, word, header):
+        """Handles a compound statement header, like the TreeVisitor.
+        @return (on_end, skip) of its block
+        """
+        decorators, self.decorators = self.decorators, []
+        if word == 'class':
+            prev_classinfo = self.classinfo
+            self.classinfo = ClassInfo(_parse_header(decorators, header))
+            return partial(self._end_class, prev_classinfo), False
+        if word != 'def':
+            # walked through, as async functions
+            return None, False
+        if self.classinfo:
+            node = _parse_header(decorators, header)
+            if node.name == '__init__':
+                self.constructor = True
+                return partial(self._end_constructor, node), False
+            self.classinfo.add_method(node)
+        elif self.moduleinfo:
+            self.moduleinfo.add_function(_parse_header(decorators, header))
+        return None, True
+
+    def _end_class(self, prev_classinfo):
+        self.infos.append(self.classinfo)
+        self.classinfo = prev_classinfo
+
+    def _end_constructor(self, node):
+        self.constructor = False
+        self.classinfo.add_method(node)
+
+    def _simple_statements(self, start, end, marks):
+        """Registers the assignments among simple statements."""
+        self.decorators = []
+        if not self.constructor and not self.classinfo and not self.moduleinfo:
+            return
+        bounds = []
+        for pos in marks + [end]:
+            if pos == end or self.text[pos] == ';':
+                self._assignment(start, bounds)
+                start = pos + 1
+                bounds = []
+            else:
+                bounds.append(pos)
+
+    def _assignment(self, start, marks):
+        """Registers the targets of an assignment statement, like the visitor.
+        @param marks: positions of top level ':' and '=' in the statement
+        """
+        text = self.text
+        if not marks or text[marks[0]] != '=':
+            # annotated assignments are not handled by the visitor
+            return
+        for pos in marks:
+            if text[pos] != '=':
+                # colon of a lambda in the value
+                break
+            target = _unparenthesize(text[start:pos].replace('\\\n', ' ').strip())
+            start = pos + 1
+            if self.constructor:
+                match = _SELF_ATTRIBUTE.fullmatch(target)
+                if match:
+                    self.classinfo.add_member(match.group(1))
+            elif target.isidentifier():
+                if self.classinfo:
+                    self.classinfo.add_classvar(target)
+                else:
+                    self.moduleinfo.add_variable(target)
+
+    def _logical_lines(self):
+        """Splits the source in logical lines, skipping blank and comment lines.
+
+        @return iterator of (indent, start, end, marks) tuples: indentation
+                columns, code bounds without final comment, and the positions
+                of top level ':', '=' and ';'
+        """
+        text = self.text
+        size = len(text)
+        pos = 0
+        while pos < size:
+            match = _INDENT.match(text, pos)
+            pos = match.end()
+            if pos >= size:
+                break
+            char = text[pos]
+            if char == '\n':
+                pos += 1
+                continue
+            if char == '#':
+                pos = _line_end(text, pos) + 1
+                continue
+            if char == '\\':
+                raise UnsupportedSyntax('line continuation at line start')
+            indent = _columns(match.group())
+            start = pos
+            code_end = None
+            marks = []
+            depth = 0
+            while True:
+                match = (_NESTED_SPECIAL if depth else _TOP_SPECIAL).search(text, pos)
+                if match is None:
+                    if depth:
+                        raise UnsupportedSyntax('unclosed bracket')
+                    end = pos = size
+                    break
+                pos = match.start()
+                char = text[pos]
+                if char == '\n':
+                    pos += 1
+                    if not depth:
+                        end = pos - 1
+                        break
+                elif char in '([{':
+                    depth += 1
+                    pos += 1
+                elif char in ')]}':
+                    if not depth:
+                        raise UnsupportedSyntax('unmatched bracket')
+                    depth -= 1
+                    pos += 1
+                elif char in '\'"':
+                    pos = self._string_end(pos)
+                elif char == '#':
+                    if not depth:
+                        code_end = pos
+                    pos = _line_end(text, pos)
+                elif char == '\\':
+                    if not text.startswith('\\\n', pos):
+                        raise UnsupportedSyntax('unexpected backslash')
+                    pos += 2
+                elif text.startswith('=', pos + 1) and char in '=:':
+                    # comparison or assignment expression
+                    pos += 2
+                else:
+                    if char != '=' or text[pos - 1] not in _NOT_ASSIGN:
+                        marks.append(pos)
+                    pos += 1
+            yield indent, start, end if code_end is None else code_end, marks
+
+    def _string_end(self, pos):
+        """Position after the string literal starting with a quote at pos."""
+        text = self.text
+        quote = text[pos] * 3
+        if not text.startswith(quote, pos):
+            quote = quote[0]
+        if _NESTED_QUOTES and text[pos - 1:pos] in ('f', 'F', 'r', 'R') and \
+                'f' in text[max(pos - 2, 0):pos].lower():
+            raise UnsupportedSyntax('f-string')
+        match = _STRING_END[quote].match(text, pos + len(quote))
+        if match is None:
+            raise UnsupportedSyntax('unterminated string')
+        return match.end()
+
+def scan(source, write_globals=False):
+    """Extracts the infos of a source file, see `HeaderScanner`.
+    @raise UnsupportedSyntax if the source must be parsed as a whole
+    """
+    return HeaderScanner(source, write_globals).scan()
+
+def _decode(source):
+    """Decodes the content of a source file, like the interpreter."""
+    import io
+    import tokenize
+    try:
+        encoding = tokenize.detect_encoding(io.BytesIO(source).readline)[0]
+        return source.decode(encoding)
+    except (SyntaxError, UnicodeDecodeError, LookupError) as err:
+        raise UnsupportedSyntax(str(err))
+
+def _line_end(text, pos):
+    """Position of the end of line from pos."""
+    end = text.find('\n', pos)
+    return len(text) if end < 0 else end
+
+def _columns(indent):
+    """Columns of an indentation, with tabs of size 8 and of size 1,
+    as compared by the tokenizer to detect inconsistent tabs."""
+    col = altcol = 0
+    for char in indent:
+        if char == ' ':
+            col += 1
+            altcol += 1
+        elif char == '\t':
+            col = (col // 8 + 1) * 8
+            altcol += 1
+        else:
+            # form feed
+            col = altcol = 0
+    return col, altcol
+
+def _compare(indent, other):
+    """Compares indentations.
+    @return -1, 0 or 1
+    @raise UnsupportedSyntax if tabs make the comparison ambiguous
+    """
+    col = (indent[0] > other[0]) - (indent[0] < other[0])
+    altcol = (indent[1] > other[1]) - (indent[1] < other[1])
+    if col != altcol:
+        raise UnsupportedSyntax('inconsistent use of tabs and spaces')
+    return col
+
+def _unparenthesize(target):
+    """Removes the parentheses of an assignment target like `(name)`
+    or `(self).name`, other ones making tuples or complex targets."""
+    if not target.startswith('('):
+        return target
+    if '#' in target:
+        raise UnsupportedSyntax('comment in target')
+    target = _PARENTHESIZED_SELF.sub('self', target)
+    while target.startswith('('):
+        match = _PARENTHESIZED.fullmatch(target)
+        if match is None:
+            if target.startswith('(('):
+                raise UnsupportedSyntax('nested parentheses in target')
+            break
+        target = match.group(1).strip()
+    return target
+
+def _parse_header(decorators, header):
+    """Parses a class or function header with its decorators.
+    @return the ast.ClassDef or ast.FunctionDef node
+    """
+    source = ''.join('@%s\n' % decorator for decorator in decorators) + header + ': pass\n'
+    try:
+        return ast.parse(source).body[0]
+    except SyntaxError as err:
+        raise UnsupportedSyntax('bad header: %s' % err.msg)
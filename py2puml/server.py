@@ -0,0 +1,322 @@
+"""Render server: generates diagrams on request, keeping parsed files warm.
+
+The server listens on a unix socket or a local TCP port: as it reads any
+file it can access on request, other hosts are only allowed to connect
+when explicitly asked, see `make_server()`. Requests and
+responses are JSON objects, one per line, several requests being allowed
+on a connection:
+
+    {"op": "render", "paths": ["/src/pkg"], "root": "/src",
+     "config": {"methods": {"omit-self": "True"}}, "include": [], "exclude": []}
+    -> {"ok": true, "puml": "@startuml\\n...", "errors": "", "files": 12}
+
+    {"op": "status"}
+    -> {"ok": true, "status": {"requests": ..., "latency": ..., "cache": ...}}
+
+Relative paths are relative to the working directory of the server.
+Config overrides apply to the configuration the server was started with.
+Failed requests get {"ok": false, "error": "..."}.
+"""
+import configparser
+import io
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from ast_visitor import extract
+from puml_generator import make_generator
+from settings import Settings
+from sources import iter_sources
+from watcher import Watcher
+
+logger = logging.getLogger() # (__name__) # pylint: disable=invalid-name
+
+# number of source files whose infos are kept, by default
+DEFAULT_MAX_FILES = 20000
+# number of requests served at once, by default
+DEFAULT_WORKERS = 4
+
+def parse_address(text):
+    """Reads a server address from the command line.
+
+    @param text: 'host:port', a port number on localhost,
+           or else the path of a unix socket
+    @return (host, port) tuple, or the unix socket path
+    """
+    if text.isdigit():
+        return ('127.0.0.1', int(text))
+    host, sep, port = text.rpartition(':')
+    if sep and port.isdigit() and '/' not in text:
+        return (host, int(port))
+    return text
+
+def request(address, message, timeout=None):
+    """Sends a request to a render server.
+
+    @param address: as returned by `parse_address()`
+    @param message: the request dict
+    @return the response dict
+    """
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(address)
+        with sock.makefile('rwb') as stream:
+            stream.write(json.dumps(message).encode('utf-8') + b'\n')
+            stream.flush()
+            return json.loads(stream.readline().decode('utf-8'))
+
+def _config_parser(data):
+    """Builds a ConfigParser from a dict of section -> option -> value."""
+    cfg = configparser.ConfigParser()
+    cfg.read_dict(data)
+    return cfg
+
+class ModelCache:
+    """Infos extracted from source files, kept as long as files are unchanged.
+
+    Files are identified by path, modification time and size, so unchanged
+    files are not even read. The least recently used files are forgotten
+    beyond `max_files`. Safe to use from several threads.
+    """
+    def __init__(self, max_files=DEFAULT_MAX_FILES):
+        self.max_files = max_files
+        # (srcfile, write_globals) -> (stamp, infos)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def extract(self, srcfile, settings, errormsg=None):
+        """Extracts the infos of a source file, unless known already.
+        @return (infos, errors) tuple, see `ast_visitor.extract()`
+        """
+        # infos only depend on the write-globals option
+        key = (srcfile, settings.write_globals)
+        stamp = Watcher.stamp(srcfile)
+        with self.lock:
+            entry = self.entries.get(key)
+            if stamp is not None and entry is not None and entry[0] == stamp:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], ''
+            self.misses += 1
+        result = extract(srcfile, settings, errormsg)
+        if stamp is not None and result.infos is not None:
+            with self.lock:
+                self.entries[key] = (stamp, result.infos)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_files:
+                    self.entries.popitem(last=False)
+        return result.infos, result.errors
+
+    def report(self):
+        """Cache usage statistics, as a dict."""
+        with self.lock:
+            total = self.hits + self.misses
+            return {'files': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / total if total else None}
+
+class RenderService:
+    """Serves render and status requests, see module documentation.
+
+    Requests are handled independently, so they can be served concurrently.
+    """
+    # recent requests latencies kept for statistics
+    LATENCY_WINDOW = 1000
+
+    def __init__(self, config=None, max_files=DEFAULT_MAX_FILES):
+        """Constructor.
+
+        @param config ConfigParser: settings, which requests can override
+        @param max_files: number of source files whose infos are kept
+        """
+        self.config = config or configparser.ConfigParser()
+        # resolved once, so that unknown options are reported once
+        self.settings = Settings(self.config)
+        self.models = ModelCache(max_files)
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.failures = 0
+        self.latencies = deque(maxlen=self.LATENCY_WINDOW)
+
+    def handle(self, message):
+        """Serves a request.
+        @param message: the request dict
+        @return the response dict
+        """
+        start = time.perf_counter()
+        op = message.get('op') if isinstance(message, dict) else None
+        try:
+            if op == 'render':
+                response = self.render(message)
+            elif op == 'status':
+                response = {'ok': True, 'status': self.status()}
+            else:
+                response = {'ok': False, 'error': 'Unknown request %r' % (op,)}
+        except Exception as err: # pylint: disable=broad-except
+            logger.exception("Failed request %r", message)
+            response = {'ok': False, 'error': '%s: %s' % (type(err).__name__, err)}
+        latency = time.perf_counter() - start
+        with self.lock:
+            self.requests[str(op)] += 1
+            if not response['ok']:
+                self.failures += 1
+            if op == 'render':
+                self.latencies.append(latency)
+        logger.info("%s request served in %.1f ms", op, latency * 1e3)
+        return response
+
+    def make_config(self, overrides=None):
+        """Builds the configuration of a request.
+
+        Only the overrides are checked: unknown options and bad values they
+        hold are reported, not those of the server configuration again.
+        @param overrides: dict of section -> option -> value
+        @return (ConfigParser, Settings) tuple
+        """
+        if not overrides:
+            return self.config, self.settings
+        Settings(_config_parser(overrides))
+        cfg = _config_parser(self.config)
+        cfg.read_dict(overrides)
+        return cfg, Settings(cfg, report=False)
+
+    def render(self, message):
+        """Generates the diagram of a render request."""
+        paths = message.get('paths') or []
+        if isinstance(paths, str):
+            paths = [paths]
+        dest = io.StringIO()
+        errors = io.StringIO()
+        cfg, settings = self.make_config(message.get('config'))
+        gen = make_generator(dest, cfg, message.get('root'), settings)
+        srcfiles = iter_sources(paths,
+                                include=settings.include + tuple(message.get('include') or ()),
+                                exclude=settings.exclude + tuple(message.get('exclude') or ()))
+        count = 0
+        gen.header()
+        for srcfile in srcfiles:
+            infos, error = self.models.extract(srcfile, settings, "Skipping file")
+            errors.write(error)
+            if infos is not None:
+                gen.emit_file(srcfile, infos)
+                count += 1
+        gen.footer()
+        return {'ok': True, 'puml': dest.getvalue(), 'errors': errors.getvalue(),
+                'files': count}
+
+    def status(self):
+        """Server statistics: requests, latency of renders and cache usage."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            requests = dict(self.requests)
+            failures = self.failures
+        latency = None
+        if latencies:
+            latency = {
+                'count': len(latencies),
+                'mean': sum(latencies) / len(latencies),
+                'p50': latencies[len(latencies) // 2],
+                'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                'max': latencies[-1],
+            }
+        return {'uptime': time.time() - self.started, 'requests': requests,
+                'failures': failures, 'latency': latency, 'cache': self.models.report()}
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Reads requests from a connection, one JSON object per line."""
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line.decode('utf-8'))
+            except ValueError as err:
+                response = {'ok': False, 'error': 'Bad request: %s' % err}
+            else:
+                response = self.server.service.handle(message)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+class _PoolMixIn:
+    """Handles each connection in a thread of the server pool."""
+    service = None
+    pool = None
+
+    def process_request(self, request, client_address):
+        """Hands the connection over to the pool."""
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception: # pylint: disable=broad-except
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+class _TCPServer(_PoolMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class _UnixServer(_PoolMixIn, socketserver.UnixStreamServer):
+        pass
+
+def is_loopback(host):
+    """Tells whether all the addresses of a host are local to this machine."""
+    import ipaddress
+    try:
+        infos = socket.getaddrinfo(host or None, None, socket.AF_INET, socket.SOCK_STREAM,
+                                   flags=socket.AI_PASSIVE)
+    except socket.gaierror:
+        return False
+    return all(ipaddress.ip_address(info[4][0]).is_loopback for info in infos)
+
+def make_server(address, service, workers=DEFAULT_WORKERS, allow_remote=False):
+    """Builds a server listening on given address.
+
+    @param address: as returned by `parse_address()`
+    @param service RenderService: serves the requests
+    @param workers: number of connections served at once
+    @param allow_remote: allow listening on a TCP address reachable from
+           other hosts, which could then read any file the server can
+    @return a socketserver, to be run by `serve()`
+    @raise ValueError if the address is not local and not allowed
+    """
+    if not isinstance(address, str) and not allow_remote and not is_loopback(address[0]):
+        raise ValueError("%s is not a loopback address, other hosts could connect"
+                         % (address[0] or 'all interfaces'))
+    if isinstance(address, str):
+        server = _UnixServer(address, _RequestHandler)
+    else:
+        server = _TCPServer(address, _RequestHandler)
+    server.service = service
+    server.pool = ThreadPoolExecutor(workers)
+    return server
+
+def serve(server):
+    """Serves requests until interrupted or terminated, then cleans up.
+    Must be called from the main thread."""
+    def terminate(signum, frame): # pylint: disable=unused-argument
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, terminate)
+    print("Serving diagrams on %s" % (server.server_address,), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.pool.shutdown()
+        if isinstance(server.server_address, str):
+            os.unlink(server.server_address)
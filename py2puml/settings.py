@@ -0,0 +1,121 @@
+"""Configuration settings, resolved once from the configuration files.
+"""
+import logging
+
+logger = logging.getLogger() # (__name__) # pylint: disable=invalid-name
+
+# Known configuration options: section -> option -> (attribute, type, default)
+OPTIONS = {
+    'puml': {
+        'prolog': ('prolog', str, ''),
+        'epilog': ('epilog', str, ''),
+    },
+    'methods': {
+        'omit-self': ('omit_self', bool, False),
+        'write-arg-list': ('methods_write_arglist', bool, True),
+        'omit-defaults': ('methods_omit_defaults', bool, False),
+    },
+    'module': {
+        'write-globals': ('write_globals', bool, False),
+        'write-arg-list': ('module_write_arglist', bool, True),
+        'omit-defaults': ('module_omit_defaults', bool, False),
+    },
+    'sources': {
+        'include': ('include', list, ()),
+        'exclude': ('exclude', list, ()),
+        'header-scan-size': ('header_scan_size', int, 0),
+    },
+}
+
+class Settings:
+    """Immutable set of options read from a ConfigParser.
+
+    Options are parsed once, unknown ones are reported as warnings, so they
+    can then be read as plain attributes, e.g. `settings.omit_self`.
+    Without configuration, all options get their default value.
+    List options (glob patterns) are separated by white space or new lines.
+    """
+    __slots__ = tuple(attr for section in OPTIONS.values()
+                      for attr, kind, default in section.values())
+
+    def __init__(self, config=None, report=True):
+        """Constructor.
+
+        @param config ConfigParser: settings to resolve (default None)
+        @param report: whether unknown options and bad values are reported,
+               False if they were already
+        """
+        for section, options in OPTIONS.items():
+            for option, (attr, kind, default) in options.items():
+                value = default
+                if config:
+                    value = self._read(config, section, option, kind, default, report)
+                object.__setattr__(self, attr, value)
+        if config and report:
+            self._check(config)
+
+    @staticmethod
+    def _read(config, section, option, kind, default, report=True):
+        """Reads an option value, reporting bad ones."""
+        try:
+            if kind is bool:
+                return config.getboolean(section, option, fallback=default)
+            if kind is int:
+                return config.getint(section, option, fallback=default)
+            value = config.get(section, option, fallback=None)
+        except ValueError as err:
+            if report:
+                logger.warning("Bad value for option %r in section [%s]: %s",
+                               option, section, err)
+            return default
+        if value is None:
+            return default
+        if kind is list:
+            return tuple(value.split())
+        return value
+
+    @staticmethod
+    def _check(config):
+        """Reports unknown sections and options."""
+        known = {option for options in OPTIONS.values() for option in options}
+        for option in config.defaults():
+            if option not in known:
+                logger.warning("Unknown option %r in section [%s]",
+                               option, config.default_section)
+        for section in config.sections():
+            options = OPTIONS.get(section)
+            for option in config.options(section):
+                if option in config.defaults():
+                    continue
+                if options is None:
+                    logger.warning("Unknown section [%s]", section)
+                    break
+                if option not in options:
+                    logger.warning("Unknown option %r in section [%s]",
+                                   option, section)
+
+    def write_arglist(self, section):
+        """Tells whether argument lists are written for 'methods' or 'module' functions."""
+        if section == 'methods':
+            return self.methods_write_arglist
+        return self.module_write_arglist
+
+    def omit_defaults(self, section):
+        """Tells whether default values are omitted for 'methods' or 'module' functions."""
+        if section == 'methods':
+            return self.methods_omit_defaults
+        return self.module_omit_defaults
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Settings are read-only")
+
+    def __getstate__(self):
+        return {attr: getattr(self, attr) for attr in self.__slots__}
+
+    def __setstate__(self, state):
+        for attr, value in state.items():
+            object.__setattr__(self, attr, value)
+
+    def __repr__(self):
+        return 'Settings(%s)' % ', '.join(
+            '%s=%r' % (attr, getattr(self, attr)) for attr in self.__slots__)
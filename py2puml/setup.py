@@ -74,7 +74,11 @@ setup(
 
     # Alternatively, if you want to distribute just a my_module.py, uncomment
     # this:
-    py_modules=["py2puml", "puml_generator"],
+    py_modules=["py2puml", "puml_generator", "ast_visitor", "code_info",
+                "version", "extraction_cache", "watcher",
+                "sources", "signature", "settings",
+                "profiler", "server", "incremental", "manifest", "archives",
+                "modules", "metrics", "scanner", "outputs"],
 
     # List run-time dependencies here.  These will be installed by pip when
     # your project is installed. For an analysis of "install_requires" vs pip's
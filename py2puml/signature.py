@@ -0,0 +1,166 @@
+"""Direct rendering of function signatures and simple expressions.
+
+These are the hot spots of the output formatting: every method and function
+argument list used to be copied and rendered by astor. Formatting here reads
+the ast nodes as they are, never copying nor changing them, and gives the
+same text as `astor.to_source()`. Expressions not handled directly, which
+are rare in signatures, are still rendered by astor.
+"""
+import ast
+import math
+
+def format_expr(node):
+    """Renders an expression as python source, e.g. a base class
+    or a decorator.
+
+    @param node ast.expr: the expression to render
+    @return source string, without line ending
+    """
+    text = _format_dotted_name(node)
+    if text is None:
+        import astor # only loaded for unusual expressions
+        text = astor.to_source(node).rstrip()
+    return text
+
+def _format_dotted_name(node):
+    """Renders a name or an attribute of a dotted name, None for other nodes."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        value = _format_dotted_name(node.value)
+        if value is not None:
+            return value + '.' + node.attr
+    return None
+
+def _format_param_expr(node):
+    """Renders a default value, as in a parameters list."""
+    text = _format_dotted_name(node)
+    if text is not None:
+        return text
+    if isinstance(node, ast.Constant) and getattr(node, 'kind', None) is None:
+        text = _format_constant(node.value)
+    elif (isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub)
+          and isinstance(node.operand, ast.Constant)
+          and type(node.operand.value) in (int, float)):
+        text = _format_constant(node.operand.value)
+        if text is not None:
+            text = '-' + text
+    if text is None:
+        # astor renders a standalone expression differently,
+        # so render it as the default value of a dummy parameter
+        import astor # only loaded for unusual expressions
+        args = ast.arguments(posonlyargs=[], args=[ast.arg(arg='_', annotation=None)],
+                             vararg=None, kwonlyargs=[], kw_defaults=[],
+                             kwarg=None, defaults=[node])
+        text = astor.to_source(args).rstrip()[len('_='):]
+    return text
+
+def _format_constant(value):
+    """Renders a constant value like astor, or None if not simple."""
+    kind = type(value)
+    if kind is str:
+        # plain strings only, quoting rules of astor are subtle
+        if "'" in value or '"' in value or '\\' in value or not value.isprintable():
+            return None
+        return "'" + value + "'"
+    if value is None or kind in (bool, int):
+        return repr(value)
+    if kind is float and math.isfinite(value):
+        return repr(value)
+    if value is Ellipsis:
+        return '...'
+    return None
+
+def _format_annotation(node):
+    """Renders the annotation of a parameter."""
+    text = _format_dotted_name(node)
+    if text is None and isinstance(node, ast.Constant) and type(node.value) is str \
+            and getattr(node, 'kind', None) is None:
+        text = _format_constant(node.value)
+    if text is None:
+        # astor parenthesizes most annotations, unlike default values,
+        # so render it as the annotation of a dummy parameter
+        import astor # only loaded for unusual expressions
+        text = astor.to_source(ast.arg(arg='_', annotation=node)).rstrip()[len('_: '):]
+    return text
+
+def _format_arg(arg):
+    """Renders a parameter name with its annotation if any."""
+    if arg.annotation is None:
+        return arg.arg
+    return arg.arg + ': ' + _format_annotation(arg.annotation)
+
+def split_arguments(args):
+    """Renders the parameters of a function definition, one by one.
+
+    The result holds no ast node and does not depend on formatting options,
+    these are applied by `join_params()`.
+
+    @param args ast.arguments: the function parameters, left unchanged
+    @return tuple of (text, default) pairs, default being None for parameters
+            without default value. Markers '/' and '*' are parameters too.
+    """
+    params = []
+    posonlyargs = getattr(args, 'posonlyargs', ())
+    positional = len(posonlyargs) + len(args.args)
+    # defaults apply to the last positional parameters
+    first_default = positional - len(args.defaults)
+    index = 0
+    for group in (posonlyargs, args.args):
+        for arg in group:
+            default = None
+            if index >= first_default:
+                default = _format_param_expr(args.defaults[index - first_default])
+            params.append((_format_arg(arg), default))
+            index += 1
+        if group is posonlyargs and group:
+            params.append(('/', None))
+
+    if args.vararg:
+        params.append(('*' + _format_arg(args.vararg), None))
+    elif args.kwonlyargs:
+        params.append(('*', None))
+    for arg, default in zip(args.kwonlyargs, args.kw_defaults):
+        if default is not None:
+            default = _format_param_expr(default)
+        params.append((_format_arg(arg), default))
+    if args.kwarg:
+        params.append(('**' + _format_arg(args.kwarg), None))
+    return tuple(params)
+
+def first_param_name(params):
+    """The name of the first positional parameter, None if there is none.
+
+    @param params: parameters as returned by `split_arguments()`
+    """
+    if not params or params[0][0].startswith('*'):
+        return None
+    return params[0][0].partition(':')[0]
+
+def join_params(params, omit_first=False, omit_defaults=False):
+    """Builds a parameters list from its rendered parameters.
+
+    @param params: parameters as returned by `split_arguments()`
+    @param omit_first: skip the first positional parameter (e.g. 'self')
+    @param omit_defaults: skip default values
+    @return the parameters list, as in the function definition
+    """
+    if omit_first and first_param_name(params) is not None:
+        params = params[1:]
+        # positional-only marker, unless they all were omitted
+        if params and params[0][0] == '/':
+            params = params[1:]
+    if omit_defaults:
+        return ', '.join(text for text, default in params)
+    return ', '.join(text if default is None else text + '=' + default
+                     for text, default in params)
+
+def format_arguments(args, omit_first=False, omit_defaults=False):
+    """Renders the parameters of a function definition.
+
+    @param args ast.arguments: the function parameters, left unchanged
+    @param omit_first: skip the first positional parameter (e.g. 'self')
+    @param omit_defaults: skip default values
+    @return the parameters list, as in the function definition
+    """
+    return join_params(split_arguments(args), omit_first, omit_defaults)
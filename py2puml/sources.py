@@ -0,0 +1,115 @@
+"""Selection of the python source files to parse.
+"""
+import fnmatch
+import logging
+import os
+
+logger = logging.getLogger() # (__name__) # pylint: disable=invalid-name
+
+# file name patterns selected by default when walking directories
+DEFAULT_INCLUDE = ('*.py',)
+
+def _match(name, relpath, patterns):
+    """Tells whether a directory entry matches any of given patterns.
+    Patterns containing a '/' are matched against the entry path relative
+    to the walked directory, others against the entry name only.
+    """
+    for pattern in patterns:
+        if fnmatch.fnmatchcase(relpath if '/' in pattern else name, pattern):
+            return True
+    return False
+
+def walk(top, include=DEFAULT_INCLUDE, exclude=()):
+    """Generates the source files found under a directory.
+
+    Entries are visited depth-first in name order, the files of a directory
+    coming before its subdirectories, so that files of a same package come
+    together. Excluded directories are pruned before descent, and symbolic
+    links to directories are not followed, like `os.walk()` does.
+
+    @param top: the directory to walk
+    @param include: glob patterns of the files to select
+    @param exclude: glob patterns of the files and directories to skip
+    """
+    stack = [(top, '')]
+    while stack:
+        path, relpath = stack.pop()
+        try:
+            entries = sorted(os.scandir(path), key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            entry_relpath = relpath + entry.name
+            if _match(entry.name, entry_relpath, exclude):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append((entry.path, entry_relpath + '/'))
+            elif _match(entry.name, entry_relpath, include):
+                yield entry.path
+        # stack is LIFO, push reversed to keep name order
+        stack.extend(reversed(subdirs))
+
+def walk_archive(path, include=DEFAULT_INCLUDE, exclude=()):
+    """Generates the source files found in an archive, see `archives`.
+
+    Members are selected and ordered like files of a directory by `walk()`.
+    Only the archive index is read.
+
+    @param path: the archive, or a directory or file inside it,
+           e.g. 'mypkg-1.0.tar.gz!/mypkg-1.0/src'
+    @param include: glob patterns of the files to select
+    @param exclude: glob patterns of the files and directories to skip
+    """
+    import archives
+    archive, inner = archives.split_member(path) or (path, '')
+    try:
+        opened = archives.open_archive(archive)
+        members = opened.members
+    except OSError as err:
+        logger.warning("Cannot read archive %s: %s, skipping", archive, err)
+        return
+    if inner in members:
+        yield archives.member_name(archive, inner)
+        return
+    prefix = inner + '/' if inner else ''
+    selected = []
+    for member in members:
+        if not member.startswith(prefix):
+            continue
+        parts = member[len(prefix):].split('/')
+        # excluded directories are pruned, like walk() does
+        if any(_match(part, '/'.join(parts[:i + 1]), exclude)
+               for i, part in enumerate(parts)):
+            continue
+        if _match(parts[-1], '/'.join(parts), include):
+            # files of a directory before its subdirectories
+            selected.append(([(1, part) for part in parts[:-1]] + [(0, parts[-1])], member))
+    # read together on first read, see Archive.read()
+    opened.want(member for key, member in selected)
+    for key, member in sorted(selected): # pylint: disable=unused-variable
+        yield archives.member_name(archive, member)
+
+def iter_sources(paths, include=None, exclude=()):
+    """Generates the source files to parse from command line arguments.
+
+    Files are yielded as given, directories and archives (.whl, .zip,
+    .tar.gz, optionally followed by '!/' and a path inside) are walked
+    lazily.
+
+    @param paths: names of source files or directories
+    @param include: glob patterns of the files to select in directories,
+                    `DEFAULT_INCLUDE` if empty
+    @param exclude: glob patterns of the files and directories to skip
+                    in directories
+    """
+    # archives support is imported when used, for a fast startup
+    import archives
+    include = include or DEFAULT_INCLUDE
+    for path in paths:
+        if os.path.isdir(path):
+            yield from walk(path, include, exclude)
+        elif archives.is_archive(path):
+            yield from walk_archive(path, include, exclude)
+        else:
+            yield path
@@ -0,0 +1,155 @@
+"""Tests for archives.py (pytest)"""
+import io
+import tarfile
+import zipfile
+import pytest
+# pylint: disable= invalid-name, redefined-outer-name, missing-docstring
+
+import archives
+from py2puml import generate
+from sources import iter_sources
+
+MEMBERS = {
+    'pkg/__init__.py': '',
+    'pkg/mod.py': 'class Mod:\n    def run(self, arg=1):\n        pass\n',
+    'pkg/sub/other.py': 'class Other(Mod):\n    pass\n',
+    'pkg/README.txt': 'not python',
+    'pkg/tests/test_mod.py': 'class TestMod:\n    pass\n',
+    'setup.py': 'import setuptools\n',
+}
+
+@pytest.fixture
+def wheel(tmp_path):
+    path = str(tmp_path / 'pkg-1.0-py3-none-any.whl')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, text in MEMBERS.items():
+            zf.writestr(name, text)
+    return path
+
+@pytest.fixture
+def sdist(tmp_path):
+    path = str(tmp_path / 'pkg-1.0.tar.gz')
+    with tarfile.open(path, 'w:gz') as tf:
+        for name, text in MEMBERS.items():
+            data = text.encode('utf-8')
+            info = tarfile.TarInfo('./pkg-1.0/' + name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return path
+
+@pytest.fixture
+def extracted(tmp_path):
+    directory = tmp_path / 'extracted'
+    for name, text in MEMBERS.items():
+        (directory / name).parent.mkdir(parents=True, exist_ok=True)
+        (directory / name).write_text(text)
+    return str(directory)
+
+def test_split_member():
+    assert archives.split_member('dist/a.whl!/pkg/mod.py') == ('dist/a.whl', 'pkg/mod.py')
+    assert archives.split_member('dist/a.whl!/pkg/') == ('dist/a.whl', 'pkg')
+    assert archives.split_member('dist/a.whl') is None
+    assert archives.is_archive('dist/a.whl')
+    assert archives.is_archive('dist/a.tar.gz!/pkg')
+    assert not archives.is_archive('dist/a.py')
+
+def test_iter_sources(wheel):
+    assert list(iter_sources([wheel])) == [wheel + '!/' + name for name in [
+        'setup.py', 'pkg/__init__.py', 'pkg/mod.py', 'pkg/sub/other.py',
+        'pkg/tests/test_mod.py']]
+    assert list(iter_sources([wheel + '!/pkg'], exclude=['tests'])) == [
+        wheel + '!/' + name for name in ['pkg/__init__.py', 'pkg/mod.py', 'pkg/sub/other.py']]
+    assert list(iter_sources([wheel + '!/pkg/mod.py'])) == [wheel + '!/pkg/mod.py']
+
+def test_iter_sources_tar(sdist):
+    assert list(iter_sources([sdist + '!/pkg-1.0/pkg/sub'])) == [
+        sdist + '!/pkg-1.0/pkg/sub/other.py']
+
+def test_bad_archive(tmp_path, caplog):
+    path = tmp_path / 'bad.zip'
+    path.write_text('not a zip')
+    assert list(iter_sources([str(path), str(tmp_path / 'missing.whl')])) == []
+    assert 'Cannot read archive' in caplog.text
+    path = tmp_path / 'bad.tar.gz'
+    path.write_text('not a tar.gz')
+    assert list(iter_sources([str(path)])) == []
+
+def test_read_member(wheel, sdist):
+    assert archives.read_member(wheel + '!/pkg/mod.py') == MEMBERS['pkg/mod.py'].encode()
+    # tar members in any order
+    for name in reversed(list(MEMBERS)):
+        assert archives.read_member(sdist + '!/pkg-1.0/' + name) == MEMBERS[name].encode()
+    with pytest.raises(FileNotFoundError):
+        archives.read_member(wheel + '!/pkg/missing.py')
+
+def test_tar_single_pass(sdist, monkeypatch):
+    opened = []
+    original = tarfile.open
+    def recording_open(*args, **kwargs):
+        opened.append(args)
+        return original(*args, **kwargs)
+    monkeypatch.setattr(tarfile, 'open', recording_open)
+    sources = list(iter_sources([sdist + '!/pkg-1.0/pkg'], exclude=['tests']))
+    archive = archives.open_archive(sdist)
+    assert len(opened) == 1
+    for name in reversed(sources):
+        archives.read_member(name)
+    # only the selected members, in the same pass
+    assert len(opened) == 2
+    assert not archive.contents
+    # read again, with the other python members
+    assert archives.read_member(sdist + '!/pkg-1.0/pkg/mod.py') == MEMBERS['pkg/mod.py'].encode()
+    assert len(opened) == 3
+    assert sorted(archive.contents) == ['pkg-1.0/pkg/__init__.py', 'pkg-1.0/pkg/sub/other.py',
+                                        'pkg-1.0/pkg/tests/test_mod.py', 'pkg-1.0/setup.py']
+
+def test_open_archives_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(archives, 'MAX_OPEN_ARCHIVES', 2)
+    paths = []
+    for i in range(3):
+        paths.append(str(tmp_path / ('a%d.zip' % i)))
+        with zipfile.ZipFile(paths[-1], 'w') as zf:
+            zf.writestr('a.py', 'A = %d\n' % i)
+    first = archives.open_archive(paths[0])
+    for path in paths:
+        assert archives.read_member(path + '!/a.py')
+    assert first.zip.fp is None
+    assert [key[0] for key in archives._ARCHIVES if key[0] in paths] == paths[1:]
+
+def test_reopen_changed(tmp_path):
+    path = str(tmp_path / 'a.zip')
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr('a.py', 'A = 1\n')
+    assert archives.read_member(path + '!/a.py') == b'A = 1\n'
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr('a.py', 'A = 2 # changed\n')
+    assert archives.read_member(path + '!/a.py') == b'A = 2 # changed\n'
+
+def test_read_needed_only(wheel, monkeypatch):
+    read = []
+    original = archives.Archive.read
+    def recording_read(self, member):
+        read.append(member)
+        return original(self, member)
+    monkeypatch.setattr(archives.Archive, 'read', recording_read)
+    generate(wheel + '!/pkg', exclude=['tests'])
+    assert sorted(read) == ['pkg/__init__.py', 'pkg/mod.py', 'pkg/sub/other.py']
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_generate(wheel, extracted, jobs):
+    assert generate(wheel, jobs=jobs) == generate(extracted)
+
+def test_generate_namespaces(wheel, sdist, extracted):
+    expected = generate(extracted, root=extracted)
+    assert 'namespace pkg {' in expected
+    # from archive-internal paths
+    assert generate(wheel, root='.') == expected
+    assert generate(sdist + '!/pkg-1.0', root=sdist + '!/pkg-1.0') == expected
+
+def test_syntax_error(tmp_path):
+    path = str(tmp_path / 'bad.whl')
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr('bad.py', 'class Bad(:\n')
+    errfile = io.StringIO()
+    generate(path, errfile=errfile)
+    assert errfile.getvalue().startswith('Syntax error in %s!/bad.py:1:' % path)
@@ -4,8 +4,9 @@ import ast
 import io
 # pylint: disable= invalid-name, missing-docstring, no-self-use, too-few-public-methods
 
-from ast_visitor import TreeVisitor
+from ast_visitor import TreeVisitor, extract, read_ahead, read_source
 from puml_generator import PUML_Generator
+from settings import Settings
 
 cfg = configparser.ConfigParser()
 cfg.read('py2puml.ini')
@@ -33,3 +34,104 @@ class Test_TreeVisitor(object):
         with open('examples/py2puml.puml') as f:
             expected = f.read()
         assert puml == expected
+
+    def test_extract(self):
+        infos, errors, cached, times, counts = extract('examples/person.py')
+        assert errors == ''
+        assert not cached
+        assert [info.classname for info in infos] == ['Person', 'Employee']
+
+    def test_extract_globals(self):
+        cfg_globals = configparser.ConfigParser()
+        cfg_globals.read_dict({'module': {'write-globals': 'True'}})
+        result = extract('examples/example.py', Settings(cfg_globals))
+        assert result.errors == ''
+        assert 'global_func' in [fdef.name for fdef in result.infos[-1].functions]
+
+    def test_extract_error(self):
+        infos, errors, cached, times, counts = extract('missing.py', errormsg="Skipping file")
+        assert infos is None
+        assert errors == "[Errno 2] No such file or directory: 'missing.py', skipping\n" \
+                         "Skipping file\n"
+
+def walk(source):
+    """Renders the infos of given source, walked with globals enabled."""
+    cfg_globals = configparser.ConfigParser()
+    cfg_globals.read_dict({'module': {'write-globals': 'True'}})
+    gen = PUML_Generator(dest=io.StringIO(), config=cfg_globals)
+    visitor = TreeVisitor('<test>', gen)
+    visitor.parse(source=source)
+    gen.fragment = []
+    visitor.visit_tree()
+    return gen.fragment
+
+def test_walk_compound_statements():
+    # definitions nested in compound statements are found, as with ast.NodeVisitor
+    lines = walk("try:\n"
+                 "    import fast\n"
+                 "except ImportError:\n"
+                 "    fast = None\n"
+                 "if fast:\n"
+                 "    class A:\n"
+                 "        for i in range(3):\n"
+                 "            x = i\n"
+                 "        def __init__(self):\n"
+                 "            if True:\n"
+                 "                self.a = 1\n"
+                 "            with open('f') as f:\n"
+                 "                self.b = f\n"
+                 "else:\n"
+                 "    def f(): pass\n"
+                 "async def g():\n"
+                 "    y = 1\n")
+    assert lines == ['class A {', '  {static} +x', '  +a', '  +b', '  -__init__(self)', '}\n',
+                     'class __module__ {', '  +fast', '  +y', '  +f()', '}\n']
+
+def test_walk_constructor_nested():
+    # quirks of the recursive descent are kept: definitions nested in a
+    # constructor belong to the class, and a nested constructor ends it
+    lines = walk("class A:\n"
+                 "    def __init__(self):\n"
+                 "        self.a = 1\n"
+                 "        def helper(): pass\n"
+                 "        class B:\n"
+                 "            def __init__(self):\n"
+                 "                self.b = 1\n"
+                 "        c = self.c = 1\n")
+    assert lines == ['class B {', '  +b', '  -__init__(self)', '}\n',
+                     'class A {', '  {static} +c', '  +a', '  +helper()', '  -__init__(self)', '}\n',
+                     'class __module__ {', '}\n']
+
+def test_walk_deep_expression():
+    # expressions are not walked, however deep
+    source = "if True:\n    f(" + "+".join(["1"] * 2000) + ")\nclass A: pass\n"
+    assert walk(source)[0] == 'class A {'
+
+def test_read_ahead_bounded():
+    consumed = []
+    def sources():
+        for i in range(20):
+            consumed.append(i)
+            yield 'examples/person.py'
+    results = read_ahead(sources(), 3)
+    srcfile, read = next(results)
+    assert len(consumed) <= 4
+    assert read == read_source('examples/person.py')
+    assert len(list(results)) == 19
+
+def test_read_ahead_disabled():
+    assert list(read_ahead(['a.py', 'b.py'], 0)) == [('a.py', None), ('b.py', None)]
+
+def test_read_encoding(tmp_path):
+    latin = tmp_path / 'latin.py'
+    latin.write_bytes(b"# -*- coding: latin-1 -*-\nclass Caf\xe9: pass\n")
+    result = extract(str(latin), read=read_source(str(latin)))
+    assert [info.classname for info in result.infos] == ['Caf\xe9']
+
+def test_read_bad_encoding(tmp_path):
+    bad = tmp_path / 'bad.py'
+    bad.write_bytes(b"# coding: klingon\nclass A: pass\n")
+    source, errors = read_source(str(bad), "Skipping file")
+    assert source is None
+    assert errors == "Encoding error in %s: unknown encoding: klingon\n" \
+                     "Skipping file\n" % bad
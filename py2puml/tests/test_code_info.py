@@ -1,9 +1,10 @@
 """Tests for code_info.py (pytest)"""
 import ast
+import pickle
 import pytest
 # pylint: disable= invalid-name, redefined-outer-name, missing-docstring, no-self-use, too-few-public-methods
 
-from code_info import ClassInfo, CodeInfo
+from code_info import ClassInfo, CodeInfo, FunctionInfo
 
 @pytest.fixture
 def ast_class0():
@@ -42,3 +43,45 @@ class TestClassInfo(object):
         cdef = ClassInfo(ast_class0)
         cdef.add_member('member')
         assert cdef.members == ['member']
+
+    def test_add_member_once(self, ast_class0):
+        cdef = ClassInfo(ast_class0)
+        for name in ('b', 'a', 'b', 'c', 'a'):
+            cdef.add_member(name)
+        assert cdef.members == ['b', 'a', 'c']
+
+    def test_bases(self):
+        node = ast.parse("class A(object, pkg.Base, f(x)): pass").body[0]
+        assert ClassInfo(node).bases == ('object', 'pkg.Base', 'f(x)')
+
+    def test_method(self):
+        node = ast.parse("class A:\n"
+                         "    @staticmethod\n"
+                         "    @functools.lru_cache\n"
+                         "    def f(x, y=1): pass\n").body[0]
+        cdef = ClassInfo(node)
+        cdef.add_method(node.body[0])
+        meth, = cdef.methods
+        assert isinstance(meth, FunctionInfo)
+        assert meth.name == 'f'
+        assert meth.params == (('x', None), ('y', '1'))
+        assert meth.markers == ('static', '@functools.lru_cache')
+        assert meth.static
+        # the ast is left unchanged
+        assert node.body[0].body
+
+    def test_pickle(self, ast_class1):
+        cdef = ClassInfo(ast_class1)
+        cdef.add_classvar('i')
+        cdef.add_member('m')
+        cdef.add_method(ast_class1.body[1])
+        copy = pickle.loads(pickle.dumps(cdef))
+        assert copy.classname == 'MyClass'
+        assert copy.classvars == ['i']
+        assert copy.members == ['m']
+        assert copy.methods[0].params == (('self', None),)
+
+def test_call_decorator():
+    node = ast.parse("@functools.lru_cache(maxsize=None)\n"
+                     "def f(): pass\n").body[0]
+    assert FunctionInfo.from_node(node).markers == ('@functools.lru_cache(maxsize=None)',)
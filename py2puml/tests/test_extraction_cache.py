@@ -0,0 +1,70 @@
+"""Tests for extraction_cache.py (pytest)"""
+import configparser
+import io
+import os
+import pytest
+# pylint: disable= invalid-name, redefined-outer-name, missing-docstring, no-self-use, too-few-public-methods
+
+from ast_visitor import extract
+from extraction_cache import ExtractionCache
+from puml_generator import PUML_Generator
+
+@pytest.fixture
+def cfg():
+    cfg = configparser.ConfigParser()
+    cfg.read('py2puml.ini')
+    return cfg
+
+@pytest.fixture
+def cache(tmpdir, cfg):
+    return ExtractionCache(str(tmpdir.join('cache')), config=cfg)
+
+def test_key(cache, cfg):
+    assert cache.key(b'class A: pass') == cache.key(b'class A: pass')
+    assert cache.key(b'class A: pass') != cache.key(b'class B: pass')
+    cfg.set('methods', 'omit-self', 'True')
+    other = ExtractionCache(cache.directory, config=cfg)
+    assert other.key(b'class A: pass') != cache.key(b'class A: pass')
+
+def test_fingerprint_ignores_other_sections(cfg):
+    fingerprint = ExtractionCache.config_fingerprint(cfg)
+    cfg.set('puml', 'epilog', 'A o-- B')
+    assert ExtractionCache.config_fingerprint(cfg) == fingerprint
+
+def test_get_put(cache):
+    key = cache.key(b'some content')
+    assert cache.get(key) is None
+    cache.put(key, ['infos'])
+    assert cache.get(key) == ['infos']
+
+def test_extract(cache):
+    result = extract('examples/person.py', cache=cache)
+    assert not result.cached
+    result = extract('examples/person.py', cache=cache)
+    assert result.cached
+    assert [info.classname for info in result.infos] == ['Person', 'Employee']
+
+def test_prune(cache):
+    keys = [cache.key(str(i).encode()) for i in range(4)]
+    for i, key in enumerate(keys):
+        cache.put(key, 'x' * 1000)
+        os.utime(cache.path(key), (i, i))
+    # use the oldest entry, making it the most recent one
+    assert cache.get(keys[0])
+    cache.max_size = 2500
+    assert cache.prune() == 2
+    assert cache.get(keys[0])
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is None
+    assert cache.get(keys[3])
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_do_files(cache, cfg, jobs):
+    sources = ['examples/person.py', 'missing.py', 'examples/example.py']
+    outputs = []
+    for run in range(2): # pylint: disable=unused-variable
+        gen = PUML_Generator(io.StringIO(), config=cfg)
+        gen.do_files(sources, jobs=jobs, cache=cache)
+        outputs.append(gen.dest.getvalue())
+    assert outputs[0] == outputs[1]
+    assert (cache.hits, cache.misses) == (2, 2)
@@ -0,0 +1,156 @@
+"""Tests for incremental.py (pytest)"""
+import configparser
+import io
+import os
+import subprocess
+import pytest
+# pylint: disable= invalid-name, redefined-outer-name, missing-docstring, no-self-use, too-few-public-methods
+
+from incremental import GitChanges, regenerate
+from puml_generator import PUML_Generator_NS
+
+def git(repo, *args):
+    subprocess.run(('git', '-c', 'user.name=test', '-c', 'user.email=test@example.com')
+                   + args, cwd=str(repo), check=True, stdout=subprocess.DEVNULL)
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    """A git checkout with a small package, as current directory."""
+    pkg = tmp_path / 'pkg'
+    pkg.mkdir()
+    (pkg / 'a.py').write_text("class A:\n    pass\n")
+    (pkg / 'b.py').write_text("class B:\n    def f(self): pass\n")
+    (pkg / 'c.py').write_text("class C(B):\n    x = 1\n")
+    git(tmp_path, 'init', '-q')
+    git(tmp_path, 'add', '.')
+    git(tmp_path, 'commit', '-q', '-m', 'initial')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def sources():
+    return sorted(os.path.join('pkg', name) for name in os.listdir('pkg') if name.endswith('.py'))
+
+def run(state='state.json', base=None):
+    """Regenerates incrementally.
+    @return (output, parsed files)"""
+    gen = PUML_Generator_NS(io.StringIO(), '.')
+    parsed = regenerate(gen, sources(), state, base)
+    return gen.dest.getvalue(), parsed
+
+def full():
+    """Output of a full regeneration."""
+    return run(state='full.json')[0]
+
+def test_first_run(repo):
+    out, parsed = run()
+    assert parsed == ['pkg/a.py', 'pkg/b.py', 'pkg/c.py']
+    assert 'namespace pkg {' in out
+    out, parsed = run()
+    assert parsed == []
+    assert out == full()
+
+def test_streaming(repo):
+    (repo / 'pkg' / 'sub').mkdir()
+    (repo / 'pkg' / 'sub' / 'd.py').write_text("class D:\n    pass\n")
+    (repo / 'pkg' / 'sub' / 'e.py').write_text("class E:\n    pass\n")
+    srcfiles = ['pkg/sub/d.py', 'pkg/a.py', 'pkg/sub/e.py']
+    outputs = []
+    for streaming in (False, True):
+        gen = PUML_Generator_NS(io.StringIO(), '.')
+        gen.streaming = streaming
+        regenerate(gen, srcfiles, 'state%d.json' % streaming)
+        outputs.append(gen.dest.getvalue())
+    assert outputs[0].count('namespace sub {') == 1
+    assert outputs[1] == outputs[0]
+
+def test_modified(repo):
+    run()
+    (repo / 'pkg' / 'b.py').write_text("class B:\n    def g(self): pass\n")
+    git(repo, 'commit', '-q', '-am', 'change')
+    out, parsed = run()
+    assert parsed == ['pkg/b.py']
+    assert '+g(self)' in out
+    assert out == full()
+
+def test_deleted_and_renamed(repo):
+    run()
+    git(repo, 'rm', '-q', 'pkg/a.py')
+    git(repo, 'mv', 'pkg/c.py', 'pkg/d.py')
+    git(repo, 'commit', '-q', '-m', 'move')
+    out, parsed = run()
+    # renamed file keeps its fragment, in its new namespace
+    assert parsed == []
+    assert 'class A' not in out
+    assert 'namespace d {' in out
+    assert out == full()
+
+def test_renamed_with_changes(repo):
+    run()
+    git(repo, 'mv', 'pkg/c.py', 'pkg/d.py')
+    (repo / 'pkg' / 'd.py').write_text("class C(B):\n    x = 1\n    y = 2\n")
+    git(repo, 'commit', '-q', '-am', 'move')
+    out, parsed = run()
+    assert parsed == ['pkg/d.py']
+    assert out == full()
+
+def test_uncommitted(repo):
+    run()
+    (repo / 'pkg' / 'a.py').write_text("class A2:\n    pass\n")
+    (repo / 'pkg' / 'e.py').write_text("class E:\n    pass\n")
+    out, parsed = run()
+    assert parsed == ['pkg/a.py', 'pkg/e.py']
+    assert 'class A2' in out and 'class E' in out
+    # uncommitted files are not saved, so reverting is noticed
+    git(repo, 'checkout', '--', 'pkg/a.py')
+    out, parsed = run()
+    assert parsed == ['pkg/a.py', 'pkg/e.py']
+    assert 'class A2' not in out
+
+def test_config_changed(repo):
+    run()
+    cfg = configparser.ConfigParser()
+    cfg.read_dict({'methods': {'omit-self': 'True'}})
+    gen = PUML_Generator_NS(io.StringIO(), '.', config=cfg)
+    assert regenerate(gen, sources(), 'state.json') == sources()
+    assert '+f()' in gen.dest.getvalue()
+
+def test_bad_base(repo, caplog):
+    run()
+    out, parsed = run(base='no-such-ref')
+    assert parsed == sources()
+    assert 'Cannot compare with no-such-ref' in caplog.text
+
+def test_git_changes(repo):
+    git(repo, 'mv', 'pkg/a.py', 'pkg/z.py')
+    (repo / 'new.py').write_text('')
+    changes = GitChanges('HEAD')
+    assert changes.renamed == {'pkg/z.py': 'pkg/a.py'}
+    assert changes.deleted == {'pkg/a.py'}
+    assert changes.changed == {'new.py'}
+    assert changes.unchanged('pkg/z.py') == 'pkg/a.py'
+    assert changes.unchanged('new.py') is None
+    assert changes.unchanged('../other.py') is None
+
+def test_ignored(repo):
+    (repo / '.gitignore').write_text('pkg/gen.py\n')
+    (repo / 'pkg' / 'gen.py').write_text("class G1:\n    pass\n")
+    out, parsed = run()
+    assert 'pkg/gen.py' in parsed
+    # ignored files are not saved, so their changes are noticed
+    (repo / 'pkg' / 'gen.py').write_text("class G2:\n    pass\n")
+    out, parsed = run()
+    assert parsed == ['pkg/gen.py']
+    assert 'class G2' in out and 'class G1' not in out
+
+def test_base_not_saved_commit(repo, caplog):
+    run()
+    (repo / 'pkg' / 'a.py').write_text("class V1:\n    pass\n")
+    git(repo, 'commit', '-q', '-am', 'change')
+    # fragments saved at the first commit are not valid at HEAD
+    out, parsed = run(base='HEAD')
+    assert parsed == sources()
+    assert 'class V1' in out
+    assert 'parsing all files' in caplog.text
+    out, parsed = run(base='HEAD')
+    assert parsed == []
+    assert out == full()
@@ -0,0 +1,105 @@
+"""Tests for manifest.py (pytest)"""
+import configparser
+import os
+import pytest
+# pylint: disable= invalid-name, redefined-outer-name, missing-docstring
+
+import puml_generator
+from manifest import Manifest
+from py2puml import generate, main
+
+HERE = os.getcwd()
+
+@pytest.fixture
+def manifest_file(tmp_path):
+    path = tmp_path / 'manifest.ini'
+    path.write_text("""\
+[DEFAULT]
+config = {here}/py2puml.ini
+
+[examples]
+sources = {here}/examples/person.py {here}/examples/example.py
+output = out/examples.puml
+
+[globals]
+sources = {here}/examples/exa*.py
+config = {here}/examples/globals.ini
+output = globals.puml
+
+[namespaces]
+sources = {here}/examples
+root = {here}
+exclude = bugged.py cal_clock3
+output = out/ns.puml
+""".format(here=HERE))
+    (tmp_path / 'out').mkdir()
+    return str(path)
+
+def test_read(manifest_file, tmp_path):
+    manifest = Manifest.read(manifest_file)
+    assert [t.name for t in manifest.targets] == ['examples', 'globals', 'namespaces']
+    examples, globals_, namespaces = manifest.targets
+    assert examples.output == str(tmp_path / 'out' / 'examples.puml')
+    assert examples.root is None
+    assert namespaces.root == HERE
+    assert globals_.srcfiles() == [HERE + '/examples/example.py']
+    assert globals_.settings.write_globals
+    assert not examples.settings.write_globals
+    srcfiles = namespaces.srcfiles()
+    assert HERE + '/examples/person.py' in srcfiles
+    assert HERE + '/examples/bugged.py' not in srcfiles
+
+def test_read_errors(tmp_path):
+    path = tmp_path / 'manifest.ini'
+    path.write_text("[target]\nsources = a.py\n")
+    with pytest.raises(ValueError, match="Missing 'output'"):
+        Manifest.read(str(path))
+    path.write_text("[target]\nsources = a.py\noutput = a.puml\nconfig = missing.ini\n")
+    with pytest.raises(ValueError, match="missing.ini"):
+        Manifest.read(str(path))
+
+def test_parse_once(manifest_file, monkeypatch):
+    parsed = []
+    extract = puml_generator.extract
+    def counting_extract(srcfile, *args):
+        parsed.append(srcfile)
+        return extract(srcfile, *args)
+    monkeypatch.setattr(puml_generator, 'extract', counting_extract)
+    counts = Manifest.read(manifest_file).build()
+    assert counts['examples'] == 2
+    assert counts['globals'] == 1
+    assert parsed.count(HERE + '/examples/example.py') == 1
+    assert len(parsed) == len(set(parsed))
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_build(manifest_file, tmp_path, jobs):
+    Manifest.read(manifest_file).build(jobs=jobs)
+    config = configparser.ConfigParser()
+    config.read('py2puml.ini')
+    assert (tmp_path / 'out' / 'examples.puml').read_text() == generate(
+        [HERE + '/examples/person.py', HERE + '/examples/example.py'], config=config)
+    assert (tmp_path / 'globals.puml').read_text() == generate(
+        HERE + '/examples/example.py', config='examples/globals.ini')
+    assert (tmp_path / 'out' / 'ns.puml').read_text() == generate(
+        'examples', config=config, root=HERE, exclude=['bugged.py', 'cal_clock3'])
+
+def test_cli(manifest_file, tmp_path):
+    main(['--manifest', manifest_file])
+    assert 'global_func' in (tmp_path / 'globals.puml').read_text()
+    assert 'global_func' not in (tmp_path / 'out' / 'examples.puml').read_text()
+
+def test_cli_bad_manifest(tmp_path):
+    with pytest.raises(SystemExit, match='Bad manifest'):
+        main(['--manifest', str(tmp_path / 'missing.ini')])
+
+def test_parse_config(tmp_path):
+    (tmp_path / 'big.ini').write_text("[sources]\nheader-scan-size = 5000\n")
+    (tmp_path / 'huge.ini').write_text("[sources]\nheader-scan-size = 90000\n")
+    path = tmp_path / 'manifest.ini'
+    path.write_text("[plain]\nsources = a.py\noutput = a.puml\n"
+                    "[big]\nsources = a.py\noutput = b.puml\nconfig = big.ini\n"
+                    "[huge]\nsources = a.py\noutput = c.puml\nconfig = huge.ini\n")
+    config = Manifest.read(str(path)).parse_config()
+    assert config.getint('sources', 'header-scan-size') == 5000
+    path.write_text("[plain]\nsources = a.py\noutput = a.puml\n")
+    assert not Manifest.read(str(path)).parse_config().has_section('sources')
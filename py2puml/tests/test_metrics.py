@@ -0,0 +1,77 @@
+"""Tests for metrics.py (pytest)"""
+import io
+import json
+import pytest
+# pylint: disable= invalid-name, missing-docstring
+
+import metrics
+from profiler import Profiler
+from puml_generator import PUML_Generator
+from py2puml import main
+
+def profiled_run(srcfiles, jobs=1):
+    gen = PUML_Generator(io.StringIO())
+    gen.profiler = Profiler()
+    gen.errfile = io.StringIO()
+    gen.header()
+    gen.do_files(srcfiles, jobs=jobs)
+    gen.footer()
+    return gen
+
+def test_counters():
+    gen = profiled_run(['examples/person.py', 'examples/bugged.py', 'examples/example.py'])
+    counters = metrics.collect(gen.profiler)['counters']
+    assert counters['files_scanned'] == 3
+    assert counters['files_parsed'] == 2
+    assert counters['files_syntax_errors'] == 1
+    assert counters['files_cached'] == 0
+    assert counters['classes'] == 6
+    assert counters['methods'] == 9
+    assert counters['globals'] == 0
+    assert counters['bytes_written'] == len(gen.dest.getvalue().encode('utf-8'))
+
+def test_counters_jobs():
+    serial = profiled_run(['examples/person.py', 'examples/bugged.py', 'examples/example.py'])
+    parallel = profiled_run(['examples/person.py', 'examples/bugged.py', 'examples/example.py'],
+                            jobs=2)
+    assert parallel.profiler.counters == serial.profiler.counters
+
+def test_counters_do_file():
+    gen = PUML_Generator(io.StringIO())
+    gen.profiler = Profiler()
+    gen.do_file('examples/person.py')
+    assert gen.profiler.counters['files_scanned'] == 1
+    assert gen.profiler.counters['files_parsed'] == 1
+    assert gen.profiler.counters['classes'] == 2
+
+def test_format_prometheus():
+    text = metrics.format_prometheus(metrics.collect(profiled_run(['examples/person.py']).profiler))
+    assert '# TYPE py2puml_files_parsed_total counter\npy2puml_files_parsed_total 1\n' in text
+    assert 'py2puml_phase_seconds{phase="parse"} ' in text
+    for line in text.splitlines():
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            assert name.startswith('py2puml_')
+            float(value)
+
+def test_cli(tmp_path):
+    prom = str(tmp_path / 'py2puml.prom')
+    main(['--metrics', prom, '-o', str(tmp_path / 'out.puml'), 'examples/person.py'])
+    with open(prom) as f:
+        assert 'py2puml_classes_total 2\n' in f.read()
+    output = str(tmp_path / 'metrics.json')
+    main(['--metrics', output, '-c', 'examples/globals.ini', '-o', str(tmp_path / 'out.puml'),
+          'examples/example.py'])
+    with open(output) as f:
+        report = json.load(f)
+    assert report['counters']['globals'] == 2
+    assert report['peak_rss_bytes'] > 0
+    assert 'parse' in report['phases']
+
+@pytest.mark.parametrize('args', [
+    ['--metrics', 'metrics.prom', '--serve', '127.0.0.1:0'],
+    ['--metrics', 'metrics.json', '--manifest', 'manifest.ini'],
+])
+def test_cli_errors(args):
+    with pytest.raises(SystemExit, match='not supported'):
+        main(args)
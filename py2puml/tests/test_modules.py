@@ -0,0 +1,77 @@
+"""Tests for modules.py (pytest)"""
+import importlib
+import json
+import os
+import sys
+import pytest
+# pylint: disable= invalid-name, redefined-outer-name, missing-docstring
+
+from modules import ModuleResolver, find_module_paths
+from py2puml import main
+
+@pytest.fixture
+def trap(tmp_path, monkeypatch):
+    """Package raising if imported, in sys.path."""
+    package = tmp_path / 'trap_pkg'
+    (package / 'sub').mkdir(parents=True)
+    (package / '__init__.py').write_text("raise RuntimeError('imported')\n")
+    (package / 'sub' / '__init__.py').write_text("raise RuntimeError('imported')\n")
+    (package / 'sub' / 'mod.py').write_text("class Mod:\n    pass\n")
+    (package / 'other.py').write_text("class Other:\n    pass\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    importlib.invalidate_caches()
+    yield str(package)
+    assert 'trap_pkg' not in sys.modules
+
+def test_find_stdlib():
+    assert find_module_paths('json') == [os.path.dirname(json.__file__)]
+    assert find_module_paths('json.decoder') == [json.decoder.__file__]
+
+def test_find_not_imported(trap):
+    assert find_module_paths('trap_pkg') == [trap]
+    assert find_module_paths('trap_pkg.sub') == [os.path.join(trap, 'sub')]
+    assert find_module_paths('trap_pkg.sub.mod') == [os.path.join(trap, 'sub', 'mod.py')]
+
+def test_find_errors(trap):
+    with pytest.raises(ModuleNotFoundError):
+        find_module_paths('trap_pkg.missing')
+    with pytest.raises(ModuleNotFoundError):
+        find_module_paths('trap_pkg.other.attr')
+    with pytest.raises(ImportError, match='No python source'):
+        find_module_paths('sys')
+
+def test_resolver_cache(trap, tmp_path):
+    cache_file = str(tmp_path / 'cache' / 'modules.json')
+    resolver = ModuleResolver(cache_file)
+    assert resolver.resolve('trap_pkg.other') == [os.path.join(trap, 'other.py')]
+    resolver.save()
+    resolver = ModuleResolver(cache_file)
+    assert resolver.resolve('trap_pkg.other') == [os.path.join(trap, 'other.py')]
+    assert resolver.hits == 1
+    # moved module resolved again
+    os.rename(os.path.join(trap, 'other.py'), os.path.join(trap, 'moved.py'))
+    importlib.invalidate_caches()
+    with pytest.raises(ModuleNotFoundError):
+        resolver.resolve('trap_pkg.other')
+
+def test_resolver_fingerprint(trap, tmp_path, monkeypatch):
+    cache_file = str(tmp_path / 'modules.json')
+    resolver = ModuleResolver(cache_file)
+    resolver.resolve('trap_pkg')
+    resolver.save()
+    monkeypatch.syspath_prepend(str(tmp_path / 'elsewhere'))
+    resolver = ModuleResolver(cache_file)
+    resolver.resolve('trap_pkg')
+    assert resolver.hits == 0
+
+def test_cli(trap, tmp_path, capsys):
+    output = str(tmp_path / 'out.puml')
+    main(['-m', 'trap_pkg.sub', '-m', 'trap_pkg.other', '-m', 'trap_pkg.missing',
+          '--cache-dir', str(tmp_path / 'cache'), '-o', output])
+    with open(output) as f:
+        puml = f.read()
+    assert 'class Mod {' in puml
+    assert 'class Other {' in puml
+    assert "No module named 'trap_pkg.missing', skipping" in capsys.readouterr().err
+    with open(str(tmp_path / 'cache' / 'modules.json')) as f:
+        assert sorted(json.load(f)['modules']) == ['trap_pkg.other', 'trap_pkg.sub']
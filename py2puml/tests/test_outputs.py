@@ -0,0 +1,104 @@
+"""Tests for outputs.py (pytest)"""
+import os
+import zipfile
+import pytest
+# pylint: disable= invalid-name, missing-docstring
+
+import outputs
+from py2puml import main
+
+def test_changed_output(tmp_path):
+    name = str(tmp_path / 'out.puml')
+    out = outputs.ChangedOutput(name)
+    out.write('@startuml\n')
+    out.write('@enduml\n')
+    assert not os.path.exists(name)
+    assert out.close()
+    with open(name) as f:
+        assert f.read() == '@startuml\n@enduml\n'
+    os.utime(name, (0, 0))
+
+    out = outputs.ChangedOutput(name)
+    out.write('@startuml\n@enduml\n')
+    assert not out.close()
+    assert os.stat(name).st_mtime == 0
+    assert os.listdir(str(tmp_path)) == ['out.puml']
+    # closing again does nothing
+    assert not out.close()
+
+    out = outputs.ChangedOutput(name)
+    out.write('@startuml\nclass A\n@enduml\n')
+    assert out.close()
+    assert os.stat(name).st_mtime != 0
+    assert os.listdir(str(tmp_path)) == ['out.puml']
+
+def test_open_output(tmp_path):
+    with pytest.raises(OSError):
+        outputs.open_output(str(tmp_path / 'missing' / 'out.puml'), if_changed=True)
+    out = outputs.open_output(str(tmp_path / 'out.puml'))
+    out.close()
+    assert not isinstance(out, outputs.ChangedOutput)
+
+def test_write_depfile(tmp_path):
+    name = str(tmp_path / 'out.d')
+    outputs.write_depfile(name, 'my docs/out.puml',
+                          ['a.py', 'dir/$b#.py', 'a.py', 'py2puml.ini'])
+    with open(name) as f:
+        assert f.read() == (
+            'my\\ docs/out.puml: \\\n'
+            '  a.py \\\n'
+            '  dir/$$b\\#.py \\\n'
+            '  py2puml.ini\n'
+            '\na.py:\n'
+            '\ndir/$$b\\#.py:\n'
+            '\npy2puml.ini:\n')
+    assert outputs.depfile_name('docs/out.puml') == 'docs/out.d'
+
+def test_cli(tmp_path):
+    wheel = str(tmp_path / 'pkg-1.0-py3-none-any.whl')
+    with zipfile.ZipFile(wheel, 'w') as archive:
+        archive.writestr('pkg/mod.py', 'class Packed:\n    pass\n')
+    output = str(tmp_path / 'out.puml')
+    args = ['--if-changed', '-MD', '-c', 'examples/globals.ini', '-o', output,
+            'examples/person.py', wheel]
+    main(args)
+    with open(output) as f:
+        assert 'class Packed' in f.read()
+    with open(str(tmp_path / 'out.d')) as f:
+        depfile = f.read()
+    assert depfile.startswith(output + ': \\\n  examples/person.py \\\n  %s \\\n'
+                              '  examples/globals.ini\n' % wheel)
+    os.utime(output, (0, 0))
+    main(args)
+    assert os.stat(output).st_mtime == 0
+    assert sorted(os.listdir(str(tmp_path))) == ['out.d', 'out.puml', os.path.basename(wheel)]
+
+    main(['-MF', str(tmp_path / 'deps.mk'), '-o', output, 'examples/person.py'])
+    assert os.stat(output).st_mtime != 0
+    with open(str(tmp_path / 'deps.mk')) as f:
+        assert f.read().startswith(output + ': \\\n  examples/person.py')
+
+@pytest.mark.parametrize('args', [
+    ['-MD', 'examples/person.py'],
+    ['--if-changed', '--watch', '-o', 'out.puml', 'examples/person.py'],
+    ['-MD', '--manifest', 'manifest.ini'],
+])
+def test_cli_errors(args):
+    with pytest.raises(SystemExit):
+        main(args)
+
+def test_failed_run(tmp_path):
+    output = str(tmp_path / 'out.puml')
+    with pytest.raises(OSError):
+        main(['--if-changed', '--profile', str(tmp_path / 'missing' / 'profile.json'),
+              '-o', output, 'examples/person.py'])
+    # neither an empty output, nor a temporary file
+    assert os.listdir(str(tmp_path)) == []
+
+def test_discard(tmp_path):
+    name = str(tmp_path / 'out.puml')
+    out = outputs.ChangedOutput(name)
+    out.write('@startuml\n')
+    out.discard()
+    assert not out.close()
+    assert os.listdir(str(tmp_path)) == []
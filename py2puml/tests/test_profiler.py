@@ -0,0 +1,59 @@
+"""Tests for profiler.py (pytest)"""
+import io
+import json
+import time
+import pytest
+# pylint: disable= invalid-name, redefined-outer-name, missing-docstring, no-self-use, too-few-public-methods
+
+from profiler import PhaseTimer, Profiler
+from puml_generator import PUML_Generator
+from py2puml import main
+
+def test_phase_timer():
+    timer = PhaseTimer()
+    time.sleep(0.01)
+    timer.lap('sleep')
+    timer.lap('other')
+    timer.lap('sleep')
+    assert set(timer.times) == {'sleep', 'other'}
+    wall, cpu = timer.times['sleep']
+    assert wall >= 0.01
+    assert cpu <= wall
+
+def test_report():
+    profiler = Profiler()
+    profiler.add('a.py', {'parse': [0.5, 0.4], 'visit': [0.1, 0.1]})
+    profiler.add('b.py', {'parse': [0.2, 0.2]})
+    profiler.add('a.py', {'write': [0.1, 0.0]})
+    profiler.add('c.py', None)
+    report = profiler.report(top=1)
+    assert report['files'] == 2
+    assert report['phases']['parse'] == pytest.approx({'wall': 0.7, 'cpu': 0.6})
+    assert [entry['file'] for entry in report['slowest']] == ['a.py']
+    assert report['slowest'][0]['wall'] == pytest.approx(0.7)
+    assert set(report['slowest'][0]['phases']) == {'parse', 'visit', 'write'}
+    assert report['run']['wall'] > 0
+
+def test_generator(tmpdir):
+    gen = PUML_Generator(io.StringIO())
+    gen.profiler = Profiler()
+    gen.do_files(['examples/person.py', 'missing.py', 'examples/example.py'], jobs=2)
+    assert set(gen.profiler.files) == {'examples/person.py', 'missing.py',
+                                       'examples/example.py'}
+    assert set(gen.profiler.files['examples/person.py']) == {
+        'read', 'parse', 'visit', 'format', 'write'}
+    assert set(gen.profiler.files['missing.py']) == {'read'}
+
+    filename = str(tmpdir.join('profile.json'))
+    gen.profiler.write(filename, top=2)
+    with open(filename) as f:
+        report = json.load(f)
+    assert len(report['slowest']) == 2
+
+@pytest.mark.parametrize('args', [
+    ['--profile', 'profile.json', '--serve', '127.0.0.1:0'],
+    ['--profile-pstats', 'run.pstats', '--manifest', 'manifest.ini'],
+])
+def test_cli_errors(args):
+    with pytest.raises(SystemExit, match='not supported'):
+        main(args)
@@ -2,9 +2,12 @@
 import ast
 import configparser
 import io
+import os
+import tracemalloc
 import pytest
 # pylint: disable= invalid-name, redefined-outer-name, missing-docstring, no-self-use, too-few-public-methods
 
+from profiler import Profiler
 from puml_generator import PUML_Generator, PUML_Generator_NS
 
 @pytest.fixture
@@ -215,6 +218,24 @@ scale 2
                 ('root', logging.WARNING,
                  "Unexpected name 'badself' for method 'self' parameter in meth()")]
 
+    def test_do_files_jobs(self, gen):
+        sources = ['examples/person.py', 'examples/example.py']
+        gen.do_files(sources)
+        serial = gen.dest.getvalue()
+        gen2 = PUML_Generator(io.StringIO(), config=gen.config)
+        gen2.do_files(sources, jobs=2)
+        assert gen2.dest.getvalue() == serial
+
+    def test_do_files_read_ahead(self, gen):
+        sources = ['examples/person.py', 'missing.py', 'examples/example.py']
+        gen.read_ahead = 0
+        gen.do_files(sources)
+        serial = gen.dest.getvalue()
+        gen2 = PUML_Generator(io.StringIO(), config=gen.config)
+        gen2.read_ahead = 1
+        gen2.do_files(iter(sources))
+        assert gen2.dest.getvalue() == serial
+
 class Test_PUML_Generator_NS(object):
     pyfilename = 'some/sub/path/module.py'
 
@@ -325,6 +346,66 @@ namespace dirA3 {
 }
 @enduml
 """
+    def test_grouped_sorted(self, gen):
+        sources = ['setup.py', 'dirA1/dirB1/module2.py', 'dirA1/module3.py',
+                   'dirA2/dir_and_module/module4.py', 'dirA2/dir_and_module.py']
+        for src in sources:
+            gen.write_file(src, ["# contents of " + src])
+        # held until the footer
+        assert gen.dest.getvalue() == ''
+        gen.footer()
+        streamed = PUML_Generator_NS(io.StringIO(), root='.', config=gen.config)
+        streamed.grouped = False
+        for src in sources:
+            streamed.write_file(src, ["# contents of " + src])
+        streamed.footer()
+        assert gen.dest.getvalue() == streamed.dest.getvalue()
+
+    def test_grouped_unsorted(self, gen):
+        sources = ['dirA/module1.py', 'dirB/module2.py', 'dirA/sub/module3.py',
+                   'dirB/module4.py', 'dirA/module5.py', 'dirA/sub.py']
+        for src in sources:
+            gen.write_file(src, ["# contents of " + src])
+        gen.footer()
+        print(gen.dest.getvalue())
+        assert gen.dest.getvalue() == """\
+namespace dirA {
+  namespace module1 {
+    # contents of dirA/module1.py
+  }
+  namespace sub {
+    namespace module3 {
+      # contents of dirA/sub/module3.py
+    }
+    # contents of dirA/sub.py
+  }
+  namespace module5 {
+    # contents of dirA/module5.py
+  }
+}
+namespace dirB {
+  namespace module2 {
+    # contents of dirB/module2.py
+  }
+  namespace module4 {
+    # contents of dirB/module4.py
+  }
+}
+@enduml
+"""
+
+    def test_grouped_do_file(self, gen):
+        gen.header()
+        gen.do_file('examples/person.py')
+        gen.do_file('examples/example.py')
+        gen.do_file('tests/test_code_info.py')
+        gen.do_file('examples/person.py')
+        gen.footer()
+        out = gen.dest.getvalue()
+        assert out.count('namespace examples {') == 1
+        assert out.count('namespace person {') == 1
+        assert out.index('namespace example {') < out.index('namespace tests {')
+
     def test_write_globals(self, cfg_write_globals):
         dest = io.StringIO()
         gen = PUML_Generator_NS(dest, root='.', config=cfg_write_globals)
@@ -334,5 +415,150 @@ namespace dirA3 {
         assert "global_func" in gen.dest.getvalue()
         assert_match_file(gen, 'examples/example_globals_NS.puml')
 
+    def test_write_globals_jobs(self, cfg_write_globals):
+        gen = PUML_Generator_NS(io.StringIO(), root='.', config=cfg_write_globals)
+        gen.header()
+        gen.do_files(['examples/example.py', 'examples/person.py'], jobs=2)
+        gen.footer()
+        serial = PUML_Generator_NS(io.StringIO(), root='.', config=cfg_write_globals)
+        serial.header()
+        serial.do_files(['examples/example.py', 'examples/person.py'])
+        serial.footer()
+        assert gen.dest.getvalue() == serial.dest.getvalue()
+
+
+def write_tree(directory, count):
+    """Writes count large modules in 4 packages.
+    @return their names, not sorted by package"""
+    body = ''.join('    def method%d(self, arg, option=None):\n'
+                   '        return [arg] * %d\n' % (i, i) for i in range(60))
+    srcfiles = []
+    for i in range(count):
+        package = os.path.join(directory, 'package%d' % (i % 4))
+        os.makedirs(package, exist_ok=True)
+        srcfile = os.path.join(package, 'module%d.py' % i)
+        with open(srcfile, 'w') as f:
+            f.write('class Class:\n    attr = %d\n' % i + body)
+        srcfiles.append(srcfile)
+    return srcfiles
+
+class Test_Streaming(object):
+
+    @staticmethod
+    def run(srcfiles, root, dest, streaming=True):
+        gen = PUML_Generator_NS(dest, root=root)
+        gen.streaming = streaming
+        gen.header()
+        gen.do_files(srcfiles)
+        gen.footer()
+        return gen
+
+    def test_grouped_output(self, tmp_path):
+        srcfiles = write_tree(str(tmp_path), 8)
+        streamed = self.run(srcfiles, str(tmp_path), io.StringIO())
+        grouped = self.run(srcfiles, str(tmp_path), io.StringIO(), streaming=False)
+        assert streamed.dest.getvalue() == grouped.dest.getvalue()
+        assert streamed.dest.getvalue().count('namespace package0 {') == 1
+
+    def test_peak_memory(self, tmp_path):
+        srcfiles = write_tree(str(tmp_path), 96)
+        # keeps identifiers interned, for a stable interpreter state
+        with open(srcfiles[0]) as f:
+            tree = ast.parse(f.read()) # pylint: disable=unused-variable
+        peaks = []
+        for count in (24, 96, None):
+            with open(os.devnull, 'w') as dest:
+                tracemalloc.start()
+                try:
+                    self.run(srcfiles[:count], str(tmp_path), dest, streaming=count is not None)
+                    peaks.append(tracemalloc.get_traced_memory()[1])
+                finally:
+                    tracemalloc.stop()
+        streamed_24, streamed_96, grouped_96 = peaks
+        # 4 times more files, about the same memory, models kept for
+        # duplicates being bounded too
+        assert streamed_96 < streamed_24 * 1.1
+        # while all fragments are held when grouping
+        assert grouped_96 > streamed_96 * 1.5
+
+
+class Test_Dedup(object):
+
+    @staticmethod
+    def vendored(directory):
+        """Same helper module vendored in 3 services, and a broken one twice.
+        @return source file names"""
+        srcfiles = []
+        for service in ('alpha', 'beta', 'gamma'):
+            os.makedirs(os.path.join(directory, service, 'vendor'))
+            for name, text in (('helpers.py', 'class Helper:\n    def run(self):\n        pass\n'),
+                               ('main_%s.py' % service, 'class %s:\n    pass\n' % service.title()),
+                               ('bad.py', 'class Bad(:\n')):
+                srcfile = os.path.join(directory, service, 'vendor', name)
+                with open(srcfile, 'w') as f:
+                    f.write(text)
+                srcfiles.append(srcfile)
+        return srcfiles[:-1]
+
+    @staticmethod
+    def run(srcfiles, root, jobs=1, dedup=True):
+        gen = PUML_Generator_NS(io.StringIO(), root=root)
+        gen.profiler = Profiler()
+        gen.errfile = io.StringIO()
+        if not dedup:
+            gen.dedup_models = 0
+        gen.header()
+        gen.do_files(srcfiles, jobs=jobs)
+        gen.footer()
+        return gen
+
+    @pytest.mark.parametrize('jobs', [1, 2])
+    def test_parsed_once(self, tmp_path, jobs):
+        srcfiles = self.vendored(str(tmp_path))
+        gen = self.run(srcfiles, str(tmp_path), jobs)
+        counters = gen.profiler.counters
+        assert counters['files_scanned'] == 8
+        # helpers.py once, each main and both bad.py
+        if jobs == 1:
+            assert counters['files_parsed'] == 4
+            assert counters['files_duplicate'] == gen.duplicates == 2
+        else:
+            # helpers.py once per worker, at least one of them getting two
+            assert counters['files_parsed'] + counters['files_duplicate'] == 6
+            assert counters['files_duplicate'] == gen.duplicates >= 1
+        assert counters['files_syntax_errors'] == 2
+        # errors still reported for each path
+        assert gen.errfile.getvalue().count('Syntax error in ') == 2
+        plain = self.run(srcfiles, str(tmp_path), jobs, dedup=False)
+        assert plain.duplicates == 0
+        assert gen.dest.getvalue() == plain.dest.getvalue()
+
+    def test_namespaces_per_path(self, tmp_path):
+        output = self.run(self.vendored(str(tmp_path)), str(tmp_path)).dest.getvalue()
+        for service in ('alpha', 'beta', 'gamma'):
+            assert output.count('namespace %s {' % service) == 1
+        assert output.count('namespace helpers {') == 3
+        assert output.count('class Helper {') == 3
+
+    def test_workers_read(self, tmp_path, monkeypatch):
+        import puml_generator
+        def fail(*args):
+            raise AssertionError("read in the main process")
+        monkeypatch.setattr(puml_generator, 'read_ahead', fail)
+        monkeypatch.setattr(puml_generator, 'read_source', fail)
+        gen = self.run(self.vendored(str(tmp_path)), str(tmp_path), jobs=2)
+        assert gen.dest.getvalue().count('class Helper {') == 3
+
+    def test_bounded(self, tmp_path):
+        srcfiles = self.vendored(str(tmp_path))
+        gen = PUML_Generator(io.StringIO())
+        gen.errfile = io.StringIO()
+        gen.dedup_models = 1
+        # helpers.py models dropped by each main file
+        assert all(infos for _, infos in gen.extract_files(srcfiles[:2] + srcfiles[3:5]))
+        assert gen.duplicates == 0
+        assert len(list(gen.extract_files([srcfiles[0], srcfiles[3]]))) == 2
+        assert gen.duplicates == 1
+
 
 #TODO test bad config file
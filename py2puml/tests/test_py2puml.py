@@ -1,7 +1,13 @@
 """Tests for py2puml (pytest)"""
-# pylint: disable=invalid-name, missing-docstring
+# pylint: disable=invalid-name, missing-docstring, redefined-outer-name
+import ast
+import io
+import logging
+import os
+import pytest
 
-from py2puml import run, cli_parser
+from py2puml import run, cli_parser, setup_logging, generate, generate_lines
+from py2puml import CONFIG_FILENAMES
 from version import __version__
 
 def test_cli_usage(capsys):
@@ -31,7 +37,7 @@ def test_run_multiple_sources(capsys):
 
     assert err == ''
     assert out.count('namespace ') == 4
-    assert out.count('class ') == 5
+    assert out.count('class ') == 9
 
     with open('examples/py2puml_NS.puml') as f:
         expected = f.read()
@@ -106,3 +112,180 @@ def test_run_filenotfound_error(capsys):
 [Errno 2] No such file or directory: 'missing.py', skipping
 Skipping file
 """
+
+def test_run_jobs(capsys):
+    args = cli_parser().parse_args(
+        '--jobs 2 --root . py2puml.py puml_generator.py code_info.py ast_visitor.py'.split())
+    assert args.jobs == 2
+    run(args)
+    out, err = capsys.readouterr()
+
+    assert err == ''
+    with open('examples/py2puml_NS.puml') as f:
+        expected = f.read()
+    assert expected == out
+
+def test_run_jobs_errors_order(capsys):
+    args = cli_parser().parse_args(
+        '-j 2 missing.py examples/person.py examples/bugged.py'.split())
+    run(args)
+    out, err = capsys.readouterr()
+
+    with open('examples/person.puml') as f:
+        expected = f.read()
+    assert expected == out
+    assert err.startswith("[Errno 2] No such file or directory: 'missing.py', skipping\n"
+                          "Skipping file\n"
+                          "Syntax error in examples/bugged.py:")
+
+def test_run_cache(capsys, tmpdir):
+    cache_dir = str(tmpdir.join('cache'))
+    argv = ['--cache-dir', cache_dir, 'examples/person.py']
+    for run_count in range(2): # pylint: disable=unused-variable
+        run(cli_parser().parse_args(argv))
+        out, err = capsys.readouterr()
+        assert err == ''
+        with open('examples/person.puml') as f:
+            expected = f.read()
+        assert expected == out
+    assert len(tmpdir.join('cache').listdir()) == 1
+
+def test_run_directory(capsys):
+    argv = ['--root', '.', '--exclude', 'calendar_clock.py', 'examples/cal_clock3']
+    run(cli_parser().parse_args(argv))
+    out, err = capsys.readouterr()
+    assert err == ''
+
+    run(cli_parser().parse_args(['--root', '.',
+                                 'examples/cal_clock3/calendar.py',
+                                 'examples/cal_clock3/clock.py']))
+    expected, err = capsys.readouterr()
+    assert expected == out
+
+def test_run_profile(capsys, tmpdir):
+    profile = str(tmpdir.join('profile.json'))
+    pstats = str(tmpdir.join('run.pstats'))
+    run(cli_parser().parse_args(['--profile', profile, '--profile-pstats', pstats,
+                                 'examples/person.py']))
+    out, err = capsys.readouterr()
+    assert err == ''
+    with open('examples/person.puml') as f:
+        assert f.read() == out
+    import json
+    import pstats as pstats_module
+    with open(profile) as f:
+        assert json.load(f)['slowest'][0]['file'] == 'examples/person.py'
+    assert pstats_module.Stats(pstats).total_calls > 0
+
+@pytest.fixture
+def root_logger():
+    "Restores the root logger configuration after test"
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+def test_setup_logging_default(root_logger):
+    handlers = root_logger.handlers[:]
+    assert setup_logging() is None
+    assert not root_logger.isEnabledFor(logging.INFO)
+    added = [h for h in root_logger.handlers if h not in handlers]
+    assert [type(h) for h in added] == [logging.StreamHandler]
+
+def test_setup_logging_file(root_logger, tmpdir):
+    log_file = str(tmpdir.join('py2puml.log'))
+    listener = setup_logging(log_file, 'INFO')
+    try:
+        assert root_logger.isEnabledFor(logging.INFO)
+        assert not root_logger.isEnabledFor(logging.DEBUG)
+        run(cli_parser().parse_args(['-o', str(tmpdir.join('out.puml')),
+                                     'examples/person.py']))
+    finally:
+        listener.stop()
+    with open(log_file) as f:
+        log = f.read()
+    assert "INFO in __init__ at " in log
+    assert "New ClassInfo: ClassDef(name='Person'" in log
+
+def test_setup_logging_again(root_logger, tmpdir):
+    handlers = root_logger.handlers[:]
+    setup_logging()
+    setup_logging(str(tmpdir.join('py2puml.log'))).stop()
+    setup_logging()
+    added = [h for h in root_logger.handlers if h not in handlers]
+    assert [type(h) for h in added] == [logging.StreamHandler]
+
+def test_setup_logging_jobs(root_logger, tmpdir):
+    log_file = str(tmpdir.join('py2puml.log'))
+    listener = setup_logging(log_file, 'DEBUG')
+    try:
+        run(cli_parser().parse_args(['-j', '2', '-o', str(tmpdir.join('out.puml')),
+                                     'examples/person.py', 'examples/example.py']))
+    finally:
+        listener.stop()
+    with open(log_file) as f:
+        log = f.read()
+    # records of the worker processes
+    assert "New ClassInfo: ClassDef(name='Person'" in log
+    assert "New ClassInfo: ClassDef(name='MyVisitor'" in log
+
+def test_no_dump_unless_logged(root_logger, monkeypatch, capsys):
+    setup_logging()
+    def fail(node):
+        raise AssertionError("ast.dump() called")
+    monkeypatch.setattr(ast, 'dump', fail)
+    run(cli_parser().parse_args(['examples/person.py']))
+    out, err = capsys.readouterr()
+    assert err == ''
+
+def test_lazy_imports():
+    # optional and slow modules are not loaded at startup
+    import subprocess
+    import sys
+    code = ("import sys, py2puml; print(' '.join(m for m in"
+            " ('setuptools_scm', 'yaml', 'astor', 'concurrent.futures', 'logging.handlers',"
+            " 'extraction_cache', 'watcher', 'json') if m in sys.modules))")
+    out = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True)
+    assert out.split() == []
+
+def test_generate():
+    with open('examples/person.puml') as f:
+        expected = f.read()
+    assert generate('examples/person.py', config='py2puml.ini') == expected
+
+def test_generate_lines_namespaces(capsys):
+    args = cli_parser().parse_args('--root . py2puml.py puml_generator.py'.split())
+    run(args)
+    out, err = capsys.readouterr()
+    lines = generate_lines(['py2puml.py', 'puml_generator.py'],
+                           config=CONFIG_FILENAMES, root='.')
+    assert next(lines) == '@startuml\n'
+    assert ''.join(lines) == out[len('@startuml\n'):]
+
+def test_generate_no_side_effects(root_logger, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'mod.py').write_text("class A:\n    pass\n")
+    handlers = list(root_logger.handlers)
+    errors = io.StringIO()
+    puml = generate(['mod.py', 'missing.py'], errfile=errors)
+    assert 'class A {' in puml
+    assert 'missing.py' in errors.getvalue()
+    assert root_logger.handlers == handlers
+    assert sorted(os.listdir(str(tmp_path))) == ['mod.py']
+
+def test_generate_concurrent():
+    from concurrent.futures import ThreadPoolExecutor
+    sources = ['examples/person.py', 'examples/example.py', 'puml_generator.py']
+    expected = [generate(src, root='.') for src in sources]
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda src: generate(src, root='.'), sources * 4))
+    assert results == expected * 4
+
+@pytest.mark.parametrize('args', [['-j', '-1'], ['--jobs', 'x'], ['--workers', '0'],
+                                  ['--interval', '0'], ['--interval', '-1'],
+                                  ['--interval', 'nan']])
+def test_bad_count(args, capsys):
+    with pytest.raises(SystemExit):
+        cli_parser().parse_args(args + ['examples/person.py'])
+    assert 'usage:' in capsys.readouterr()[1]
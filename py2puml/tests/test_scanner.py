@@ -0,0 +1,149 @@
+"""Tests for scanner.py (pytest)"""
+import configparser
+import io
+import pytest
+# pylint: disable= invalid-name, redefined-outer-name, missing-docstring
+
+import scanner
+from ast_visitor import extract
+from profiler import Profiler
+from puml_generator import PUML_Generator
+from py2puml import generate, read_config
+from settings import Settings
+
+TRICKY = '''\
+"""Module docstring with 'quotes', class Fake: and def fake():"""
+import os
+CONSTANT = 1; OTHER = CONSTANT == 2
+a = b = {'key': 'value: "x"', 'x=': [1, 2,
+                                      3]}
+x: int = 3
+counter += 1
+t = (1, 2); (p, q) = 1, 2; (single) = 0
+f = lambda arg=1: arg
+text = r"raw \\" string" + b'bytes' + \'\'\'long
+class NotAClass:
+    def not_a_method(self):
+\'\'\'
+
+@decorator(with_args=True)
+def function(first, *args, key: 'str' = 'default', **kwargs) -> dict:
+    class Hidden:
+        pass
+    return {}
+
+async def coroutine():
+    pass
+
+if os.name:
+    class Conditional(Base, metaclass=Meta): # comment:
+        attr = 1 ; other = 2
+        def __init__(self, value=lambda: None):
+            self.value = value
+            if value:
+                self.maybe, self.pair = value, value
+            (self).parenthesized = 1
+            self.chained = self.again = 0
+            self.data[0] = 0
+            def nested(this):
+                this.not_member = 1
+        @property
+        def prop(self): return self.value
+        @staticmethod
+        def static(x, y=-1.5, *, z=None): pass
+        async def asynchronous(self):
+            in_async = 1
+        class Inner: pass
+else:
+    class Other(object): pass
+
+class \\
+    Continued(Conditional):
+\tdef method(self, *, kw): pass
+'''
+
+def render(infos, write_globals):
+    cfg = configparser.ConfigParser()
+    cfg.read_dict({'module': {'write-globals': str(write_globals)}})
+    gen = PUML_Generator(io.StringIO(), cfg)
+    for info in infos:
+        info.done(gen)
+    return gen.dest.getvalue()
+
+def extract_ast(tmp_path, source, write_globals):
+    srcfile = tmp_path / 'module.py'
+    srcfile.write_bytes(source if isinstance(source, bytes) else source.encode('utf-8'))
+    cfg = configparser.ConfigParser()
+    cfg.read_dict({'module': {'write-globals': str(write_globals)}})
+    result = extract(str(srcfile), Settings(cfg))
+    return render(result.infos, write_globals)
+
+@pytest.mark.parametrize('write_globals', [False, True])
+@pytest.mark.parametrize('source', [
+    TRICKY,
+    TRICKY.replace('\n', '\r\n'),
+    '',
+    'class A:\n    """Doc."""\n',
+    '# -*- coding: latin-1 -*-\nclass Caf\xe9:\n    x = "\xe9"\n'.encode('latin-1'),
+    '\ufeffclass Bom: pass\n'.encode('utf-8'),
+    'class A:\n    def __init__(self): self.x = 1; self.y = 2\n    z = 3\n',
+    'try:\n    import a\nexcept ImportError:\n    a = None\nfinally:\n    b = 1\n',
+    'class A:\n    with ctx() as c:\n        attr = c\n    for i in range(3): loop = i\n',
+])
+def test_same_as_ast(tmp_path, source, write_globals):
+    expected = extract_ast(tmp_path, source, write_globals)
+    assert render(scanner.scan(source, write_globals), write_globals) == expected
+
+@pytest.mark.parametrize('source', [
+    'match command:\n    case "go":\n        pass\n',
+    'class A:\n  x = 1\n\ty = 2\n',
+    'class A:\nx = 1\n',
+    'x = 1\n    y = 2\n',
+    'class A:\n    x = (1,\n',
+    'x = "unterminated\n',
+    'class A(:\n    pass\n',
+    'if lambda: 0: pass\n',
+    '((a)) = 1\n',
+])
+def test_unsupported(source):
+    with pytest.raises(scanner.UnsupportedSyntax):
+        scanner.scan(source, write_globals=True)
+
+def test_skipped_bodies_not_checked():
+    # syntax errors in function bodies are not detected
+    infos = scanner.scan('class A:\n    def f(self):\n        x = = 1\n')
+    assert [info.classname for info in infos] == ['A']
+
+def test_threshold(tmp_path):
+    big = tmp_path / 'big.py'
+    big.write_text(TRICKY + ''.join('ROW%d = %d\n' % (i, i) for i in range(200)))
+    small = tmp_path / 'small.py'
+    small.write_text('class Small:\n    pass\n')
+    bad = tmp_path / 'bad.py'
+    bad.write_text('match x:\n    case 1:\n        pass\n' + '#' * 4000 + '\n')
+    config = tmp_path / 'scan.ini'
+    config.write_text('[module]\nwrite-globals = True\n[sources]\nheader-scan-size = 2000\n')
+    srcfiles = [str(big), str(small), str(bad)]
+    parsed = tmp_path / 'parse.ini'
+    parsed.write_text('[module]\nwrite-globals = True\n')
+    assert generate(srcfiles, str(config)) == generate(srcfiles, str(parsed))
+
+    gen = PUML_Generator(io.StringIO(), read_config(str(config)))
+    gen.profiler = Profiler()
+    gen.do_files(srcfiles)
+    counters = gen.profiler.counters
+    assert counters['files_parsed'] == 3
+    assert counters['files_header_scanned'] == 1
+    assert counters['files_header_fallbacks'] == 1
+
+def test_do_file(tmp_path):
+    srcfile = tmp_path / 'big.py'
+    srcfile.write_text(TRICKY)
+    cfg = configparser.ConfigParser()
+    cfg.read_dict({'sources': {'header-scan-size': '1'}})
+    scanned = PUML_Generator(io.StringIO(), cfg)
+    scanned.do_file(str(srcfile))
+    parsed = PUML_Generator(io.StringIO())
+    parsed.do_file(str(srcfile))
+    assert scanned.dest.getvalue() == parsed.dest.getvalue()
+    assert 'class Conditional' in scanned.dest.getvalue()
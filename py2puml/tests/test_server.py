@@ -0,0 +1,140 @@
+"""Tests for server.py (pytest)"""
+import configparser
+import os
+import threading
+import zipfile
+import pytest
+# pylint: disable= invalid-name, redefined-outer-name, missing-docstring, no-self-use, too-few-public-methods
+
+from py2puml import generate
+from server import RenderService, make_server, parse_address, request
+
+@pytest.fixture
+def cfg():
+    config = configparser.ConfigParser()
+    config.read('py2puml.ini')
+    return config
+
+@pytest.fixture
+def service(cfg):
+    return RenderService(cfg)
+
+@pytest.fixture
+def address(tmp_path, service):
+    """Address of a running server, on a unix socket."""
+    path = str(tmp_path / 'py2puml.sock')
+    server = make_server(path, service, workers=2)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield path
+    server.shutdown()
+    thread.join()
+    server.server_close()
+    server.pool.shutdown()
+
+def test_parse_address():
+    assert parse_address('8080') == ('127.0.0.1', 8080)
+    assert parse_address('localhost:8080') == ('localhost', 8080)
+    assert parse_address('/tmp/py2puml.sock') == '/tmp/py2puml.sock'
+    assert parse_address('py2puml.sock') == 'py2puml.sock'
+
+def test_render(service, cfg):
+    response = service.handle({'op': 'render', 'paths': ['examples/person.py']})
+    assert response['ok']
+    assert response['errors'] == ''
+    assert response['files'] == 1
+    assert response['puml'] == generate('examples/person.py', config=cfg)
+
+def test_render_warm(service, tmp_path):
+    src = tmp_path / 'mod.py'
+    src.write_text("class A:\n    pass\n")
+    message = {'op': 'render', 'paths': [str(src)]}
+    service.handle(message)
+    assert 'class A {' in service.handle(message)['puml']
+    assert service.models.report()['hits'] == 1
+    # modified file is parsed again
+    src.write_text("class B:\n    pass\n")
+    os.utime(str(src), ns=(0, 0))
+    assert 'class B {' in service.handle(message)['puml']
+    assert service.models.report()['misses'] == 2
+
+def test_render_overrides(service):
+    response = service.handle({'op': 'render', 'paths': ['examples/person.py'],
+                               'config': {'methods': {'omit-self': 'True'}}})
+    assert '(self' not in response['puml']
+    # extracted infos do not depend on formatting options
+    assert service.models.report()['hits'] == 0
+    response = service.handle({'op': 'render', 'paths': ['examples/person.py']})
+    assert '(self' in response['puml']
+    assert service.models.report()['hits'] == 1
+
+def test_render_warnings_once(cfg, caplog):
+    cfg['methods']['omit-selff'] = 'True'
+    service = RenderService(cfg)
+    assert caplog.text.count("Unknown option 'omit-selff'") == 1
+    for i in range(2):
+        service.handle({'op': 'render', 'paths': ['examples/person.py'],
+                        'config': {'module': {'write-globalz': 'True'}}})
+    assert caplog.text.count("Unknown option 'omit-selff'") == 1
+    # overrides are checked on each request
+    assert caplog.text.count("Unknown option 'write-globalz'") == 2
+
+def test_render_archive_warm(service, tmp_path):
+    wheel = str(tmp_path / 'pkg-1.0-py3-none-any.whl')
+    with zipfile.ZipFile(wheel, 'w') as zf:
+        zf.writestr('pkg/a.py', 'class A:\n    pass\n')
+        zf.writestr('pkg/b.py', 'class B:\n    pass\n')
+    message = {'op': 'render', 'paths': [wheel]}
+    first = service.handle(message)['puml']
+    assert service.handle(message)['puml'] == first
+    assert service.models.report()['hits'] == 2
+
+def test_render_errors(service):
+    response = service.handle({'op': 'render', 'paths': ['missing.py']})
+    assert response['ok']
+    assert response['files'] == 0
+    assert 'missing.py' in response['errors']
+
+def test_bad_request(service):
+    assert not service.handle({'op': 'explode'})['ok']
+    assert not service.handle(['render'])['ok']
+    assert service.status()['failures'] == 2
+
+def test_status(service):
+    service.handle({'op': 'render', 'paths': ['examples/person.py']})
+    status = service.status()
+    assert status['requests'] == {'render': 1}
+    assert status['latency']['count'] == 1
+    assert status['cache']['misses'] == 1
+
+def test_socket(address, cfg):
+    expected = generate('examples/person.py', config=cfg)
+    response = request(address, {'op': 'render', 'paths': ['examples/person.py']}, timeout=10)
+    assert response['puml'] == expected
+    status = request(address, {'op': 'status'}, timeout=10)['status']
+    # counted once served
+    assert status['requests'] == {'render': 1}
+
+def test_socket_concurrent(address, cfg):
+    from concurrent.futures import ThreadPoolExecutor
+    sources = ['examples/person.py', 'examples/example.py']
+    expected = [generate(src, config=cfg) for src in sources]
+    def render(src):
+        return request(address, {'op': 'render', 'paths': [src]}, timeout=10)['puml']
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(render, sources * 4))
+    assert results == expected * 4
+
+@pytest.mark.parametrize('host', ['0.0.0.0', ''])
+def test_remote_refused(service, host):
+    with pytest.raises(ValueError, match='not a loopback address'):
+        make_server((host, 0), service)
+
+def test_loopback(service):
+    for host in ('127.0.0.1', 'localhost'):
+        server = make_server((host, 0), service, workers=1)
+        server.server_close()
+        server.pool.shutdown()
+    server = make_server(('0.0.0.0', 0), service, workers=1, allow_remote=True)
+    server.server_close()
+    server.pool.shutdown()
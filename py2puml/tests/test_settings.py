@@ -0,0 +1,89 @@
+"""Tests for settings.py (pytest)"""
+import configparser
+import logging
+import pickle
+import pytest
+# pylint: disable= invalid-name, redefined-outer-name, missing-docstring, no-self-use, too-few-public-methods
+
+from settings import Settings
+
+def config(text):
+    cfg = configparser.ConfigParser()
+    cfg.read_string(text)
+    return cfg
+
+def test_defaults():
+    settings = Settings()
+    assert settings.prolog == ''
+    assert not settings.write_globals
+    assert not settings.omit_self
+    assert settings.write_arglist('methods')
+    assert settings.write_arglist('module')
+    assert not settings.omit_defaults('methods')
+    assert settings.include == ()
+
+def test_config_files(caplog):
+    cfg = configparser.ConfigParser()
+    cfg.read(['py2puml.ini', 'config-full.ini'])
+    with caplog.at_level(logging.WARNING):
+        settings = Settings(cfg)
+    assert caplog.records == []
+    assert settings.prolog.startswith('skinparam monochrome true')
+    assert settings.write_globals
+    assert settings.omit_self
+    assert '__pycache__' in settings.exclude
+    assert settings.header_scan_size == 1000000
+
+def test_default_section():
+    settings = Settings(config("""\
+    [DEFAULT]
+    omit-defaults = True
+    [methods]
+    """))
+    assert settings.omit_defaults('methods')
+    # missing section: no default
+    assert not settings.omit_defaults('module')
+
+def test_unknown(caplog):
+    with caplog.at_level(logging.WARNING):
+        settings = Settings(config("""\
+        [methods]
+        omit-slef = True
+        [modules]
+        write-globals = True
+        """))
+    assert not settings.omit_self
+    assert [r.getMessage() for r in caplog.records] == [
+        "Unknown option 'omit-slef' in section [methods]",
+        "Unknown section [modules]"]
+
+def test_not_reported(caplog):
+    with caplog.at_level(logging.WARNING):
+        settings = Settings(config("[methods]\nomit-slef = True\nomit-self = maybe\n"),
+                            report=False)
+    assert not settings.omit_self
+    assert not caplog.records
+
+def test_bad_value(caplog):
+    with caplog.at_level(logging.WARNING):
+        settings = Settings(config("[methods]\nomit-self = maybe\n"))
+    assert not settings.omit_self
+    assert caplog.records[0].getMessage().startswith(
+        "Bad value for option 'omit-self' in section [methods]")
+    settings = Settings(config("[sources]\nheader-scan-size = 1M\n"))
+    assert settings.header_scan_size == 0
+    assert caplog.records[1].getMessage().startswith(
+        "Bad value for option 'header-scan-size' in section [sources]")
+
+def test_read_only():
+    settings = Settings()
+    with pytest.raises(AttributeError):
+        settings.omit_self = True
+    with pytest.raises(AttributeError):
+        settings.other = True
+
+def test_pickle():
+    settings = Settings(config("[methods]\nomit-self = True\n"))
+    copy = pickle.loads(pickle.dumps(settings))
+    assert copy.omit_self
+    assert repr(copy) == repr(settings)
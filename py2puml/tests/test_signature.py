@@ -0,0 +1,94 @@
+"""Tests for signature.py (pytest)"""
+import ast
+import copy
+import astor
+import pytest
+# pylint: disable= invalid-name, redefined-outer-name, missing-docstring, no-self-use, too-few-public-methods
+
+from signature import first_param_name, format_arguments, format_expr, split_arguments
+
+SIGNATURES = [
+    "",
+    "self",
+    "arg1, arg2, arg3=None",
+    "self, name, details={}, **kwargs",
+    "a: 'annotation', b=1, c=2, *d, e, f=3, **g",
+    "a: int=1, *, b: str='x', **k",
+    "*, a",
+    "*args: int, **kwargs: 'typing.Any'",
+    "a, b, c=-1, d=-0.5, e=(1, 2), f=[], g={'k': 1}",
+    "a=1.5, b=None, c=True, d=b'x', e='a\\nb', f=..., g=1j, h=1e400",
+    "a='é', b=\"it's\", c='say \"hi\"', d='', e=u'x'",
+    "x=a.b.c, y=lambda q: q, z=not x, w: List[int]=None",
+    "f: typing.Callable[[int], str]=print, *, g=f(1), h=x if y else z",
+    "a: int | None, d: a + b, e: lambda: 0",
+    "b: x if c else y=None, c: -1=-1",
+    "a: a or b, b: not a, c: a < b, d: 1j",
+    "e: 1, f: 1.5, g: None, h: ..., i: True",
+    "*args: int | str, k: (1, 2), **kw: 'x' if a else 'y'",
+]
+
+def parse_args(text):
+    return ast.parse("def f(%s): pass" % text).body[0].args
+
+def astor_args(args, omit_first=False, omit_defaults=False):
+    "Previous implementation"
+    args = copy.deepcopy(args)
+    if omit_first:
+        args.args.pop(0)
+    if omit_defaults:
+        args.defaults = []
+        args.kw_defaults = []
+    return astor.to_source(args).rstrip()
+
+@pytest.mark.parametrize('text', SIGNATURES)
+def test_format_arguments(text):
+    args = parse_args(text)
+    dump = ast.dump(args)
+    assert format_arguments(args) == astor_args(args)
+    assert format_arguments(args, omit_defaults=True) == \
+        astor_args(args, omit_defaults=True)
+    # node is left unchanged
+    assert ast.dump(args) == dump
+
+@pytest.mark.parametrize('text', [s for s in SIGNATURES if s.startswith(('self', 'arg1'))])
+def test_format_arguments_omit_first(text):
+    args = parse_args(text)
+    assert format_arguments(args, omit_first=True) == astor_args(args, omit_first=True)
+
+@pytest.mark.parametrize('text', [
+    "a, /, b",
+    "a, b=1, /, c=2",
+    "a, /, b, c=-1, *args, d=(1, 2), **kwargs",
+])
+def test_positional_only(text):
+    # astor misplaces defaults of positional-only parameters
+    assert format_arguments(parse_args(text)) == text
+
+def test_long_signature():
+    # astor wraps long lines, unwanted in diagrams
+    text = ", ".join("argument%d=None" % i for i in range(20))
+    assert format_arguments(parse_args(text)) == text
+
+def test_omit_positional_only():
+    assert format_arguments(parse_args("self, /, a"), omit_first=True) == "a"
+    assert format_arguments(parse_args("self, a, /, b"), omit_first=True) == "a, /, b"
+
+def test_first_param_name():
+    assert first_param_name(split_arguments(parse_args(""))) is None
+    assert first_param_name(split_arguments(parse_args("*, a"))) is None
+    assert first_param_name(split_arguments(parse_args("*args"))) is None
+    assert first_param_name(split_arguments(parse_args("self, a"))) == 'self'
+    assert first_param_name(split_arguments(parse_args("self: 'A', a"))) == 'self'
+    assert first_param_name(split_arguments(parse_args("cls, /, a"))) == 'cls'
+
+def test_split_arguments():
+    params = split_arguments(parse_args("a, b: int=1, *args, c=None, **kw"))
+    assert params == (('a', None), ('b: int', '1'), ('*args', None),
+                      ('c', 'None'), ('**kw', None))
+
+@pytest.mark.parametrize('text', [
+    "name", "package.module.Class", "f(x).attr", "namedtuple('Point', 'x y')", "x[1]"])
+def test_format_expr(text):
+    node = ast.parse(text, mode='eval').body
+    assert format_expr(node) == astor.to_source(node).rstrip()
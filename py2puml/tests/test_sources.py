@@ -0,0 +1,55 @@
+"""Tests for sources.py (pytest)"""
+import os
+import pytest
+# pylint: disable= invalid-name, redefined-outer-name, missing-docstring, no-self-use, too-few-public-methods
+
+from sources import iter_sources, walk
+
+@pytest.fixture
+def tree(tmpdir):
+    for name in ['setup.py', 'README.md',
+                 'pkg/__init__.py', 'pkg/mod.py', 'pkg/test_mod.py',
+                 'pkg/sub/other.py', 'pkg/__pycache__/mod.py',
+                 '.venv/lib/site.py', 'build/lib/pkg/mod.py']:
+        tmpdir.join(name).write('', ensure=True)
+    return tmpdir
+
+def relpaths(paths, top):
+    return [os.path.relpath(path, str(top)) for path in paths]
+
+def test_walk(tree):
+    assert relpaths(walk(str(tree)), tree) == [
+        'setup.py',
+        '.venv/lib/site.py',
+        'build/lib/pkg/mod.py',
+        'pkg/__init__.py', 'pkg/mod.py', 'pkg/test_mod.py',
+        'pkg/__pycache__/mod.py',
+        'pkg/sub/other.py']
+
+def test_walk_exclude(tree):
+    exclude = ['.*', '__pycache__', 'build', 'test_*.py']
+    assert relpaths(walk(str(tree), exclude=exclude), tree) == [
+        'setup.py', 'pkg/__init__.py', 'pkg/mod.py', 'pkg/sub/other.py']
+
+def test_walk_relpath_patterns(tree):
+    assert relpaths(walk(str(tree), include=['pkg/sub/*.py']), tree) == [
+        'pkg/sub/other.py']
+    assert relpaths(walk(str(tree), exclude=['.*', 'b*', 'pkg/sub', 'pkg/_*']), tree) == [
+        'setup.py', 'pkg/mod.py', 'pkg/test_mod.py']
+
+def test_walk_prunes(tree, monkeypatch):
+    visited = []
+    scandir = os.scandir
+    def spy(path):
+        visited.append(os.path.basename(path))
+        return scandir(path)
+    monkeypatch.setattr(os, 'scandir', spy)
+    list(walk(str(tree), exclude=['build', '.venv']))
+    assert 'build' not in visited
+    assert 'lib' not in visited
+
+def test_iter_sources(tree):
+    paths = iter_sources(['missing.py', str(tree.join('pkg'))], exclude=['__pycache__'])
+    assert next(paths) == 'missing.py'
+    assert relpaths(paths, tree) == [
+        'pkg/__init__.py', 'pkg/mod.py', 'pkg/test_mod.py', 'pkg/sub/other.py']
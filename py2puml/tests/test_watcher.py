@@ -0,0 +1,101 @@
+"""Tests for watcher.py (pytest)"""
+import configparser
+import io
+import os
+import pytest
+# pylint: disable= invalid-name, redefined-outer-name, missing-docstring, no-self-use, too-few-public-methods
+
+from puml_generator import PUML_Generator, PUML_Generator_NS
+from sources import iter_sources
+from watcher import Watcher
+
+@pytest.fixture
+def sources(tmpdir):
+    tmpdir.join('a.py').write("class A:\n    pass\n")
+    tmpdir.join('b.py').write("class B:\n    pass\n")
+    return [str(tmpdir.join('a.py')), str(tmpdir.join('b.py'))]
+
+def touch(filename, text):
+    "Rewrites a file, making sure its modification time changes"
+    stat = os.stat(filename)
+    with open(filename, 'w') as f:
+        f.write(text)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+def test_update(sources):
+    gen = PUML_Generator(io.StringIO())
+    watcher = Watcher(gen, sources)
+    assert watcher.update() == sources
+    assert gen.dest.getvalue() == "@startuml\n" \
+        "class A {\n}\n\n" \
+        "class B {\n}\n\n" \
+        "@enduml\n"
+    assert watcher.update() == []
+
+    touch(sources[0], "class C:\n    def f(self): pass\n")
+    assert watcher.update() == sources[:1]
+    assert gen.dest.getvalue() == "@startuml\n" \
+        "class C {\n  +f(self)\n}\n\n" \
+        "class B {\n}\n\n" \
+        "@enduml\n"
+
+def test_update_ns(sources, tmpdir):
+    cfg = configparser.ConfigParser()
+    cfg.read('py2puml.ini')
+    gen = PUML_Generator_NS(io.StringIO(), root=str(tmpdir), config=cfg)
+    watcher = Watcher(gen, sources)
+    watcher.update()
+    expected = io.StringIO()
+    gen_ref = PUML_Generator_NS(expected, root=str(tmpdir), config=cfg)
+    gen_ref.header()
+    gen_ref.do_files(sources)
+    gen_ref.footer()
+    assert gen.dest.getvalue() == expected.getvalue()
+
+    # rewritten output is the same as a fresh run
+    touch(sources[1], "class B:\n    pass\n")
+    assert watcher.update() == sources[1:]
+    assert gen.dest.getvalue() == expected.getvalue()
+
+def test_update_streaming(sources, tmpdir):
+    sub = tmpdir.mkdir('sub')
+    sub.join('c.py').write("class C:\n    pass\n")
+    sub.join('d.py').write("class D:\n    pass\n")
+    sources = [str(sub.join('c.py'))] + sources + [str(sub.join('d.py'))]
+    gen = PUML_Generator_NS(io.StringIO(), root=str(tmpdir))
+    gen.streaming = True
+    Watcher(gen, sources).update()
+    expected = io.StringIO()
+    gen_ref = PUML_Generator_NS(expected, root=str(tmpdir))
+    gen_ref.header()
+    gen_ref.do_files(sources)
+    gen_ref.footer()
+    assert expected.getvalue().count('namespace sub {') == 1
+    assert gen.dest.getvalue() == expected.getvalue()
+
+def test_deleted(sources, capsys):
+    gen = PUML_Generator(io.StringIO())
+    watcher = Watcher(gen, sources)
+    watcher.update()
+    os.remove(sources[1])
+    assert watcher.update() == sources[1:]
+    assert "class B" not in gen.dest.getvalue()
+    out, err = capsys.readouterr()
+    assert out == ''
+    assert err.startswith('[Errno 2] No such file or directory:')
+
+def test_directory(tmpdir):
+    tmpdir.join('a.py').write("class A:\n    pass\n")
+    gen = PUML_Generator(io.StringIO())
+    watcher = Watcher(gen, lambda: iter_sources([str(tmpdir)]))
+    assert watcher.update() == [str(tmpdir.join('a.py'))]
+    # added files are found
+    tmpdir.join('b.py').write("class B:\n    pass\n")
+    assert watcher.update() == [str(tmpdir.join('b.py'))]
+    assert "class B" in gen.dest.getvalue()
+    assert watcher.update() == []
+    # removed files are dropped, without error
+    os.remove(str(tmpdir.join('a.py')))
+    assert watcher.update() == [str(tmpdir.join('a.py'))]
+    assert "class A" not in gen.dest.getvalue()
+    assert list(watcher.fragments) == [str(tmpdir.join('b.py'))]
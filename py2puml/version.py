@@ -2,5 +2,12 @@
 Mercurial, etc) instead of in the code, and automatically extract it from there
 using setuptools_scm.
 """
-from setuptools_scm import get_version
-__version__ = get_version(root='..', relative_to=__file__)
+
+def __getattr__(name):
+    """Computes `__version__` on first use only,
+    as setuptools_scm is slow to import and runs git."""
+    if name == '__version__':
+        from setuptools_scm import get_version
+        value = globals()['__version__'] = get_version(root='..', relative_to=__file__)
+        return value
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
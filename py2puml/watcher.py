@@ -0,0 +1,123 @@
+"""Keeps a PlantUML diagram up to date with its python sources.
+"""
+import logging
+import os
+import time
+
+import archives
+
+logger = logging.getLogger() # (__name__) # pylint: disable=invalid-name
+
+class Watcher:
+    """Regenerates the output of a PUML_Generator when sources change.
+
+    Source files are polled for modification time and size changes, and
+    searched again in directories for added or removed files. Only the
+    modified ones are parsed again, the rendered fragments of the others
+    are kept in memory, so the whole output can be rewritten quickly after
+    each change.
+    """
+    def __init__(self, gen, srcfiles, errormsg=None, jobs=1, cache=None):
+        """Constructor.
+
+        @param gen PUML_Generator: output generator
+        @param srcfiles: list of source file names, or a function returning
+               them, called on each scan, e.g. to walk directories again
+        @param errormsg: message to print when a file is skipped
+        @param jobs: number of processes for parsing many files at once
+        @param cache ExtractionCache: persistent cache of extracted infos
+        """
+        self.gen = gen
+        # finds the source files, None if they are given once for all
+        self.find = srcfiles if callable(srcfiles) else None
+        self.srcfiles = [] if self.find else list(srcfiles)
+        self.errormsg = errormsg
+        self.jobs = jobs
+        self.cache = cache
+        # (mtime, size) of source files at last scan, None if missing
+        self.stamps = {}
+        # rendered fragments, None for skipped files
+        self.fragments = {}
+
+    @staticmethod
+    def stamp(srcfile):
+        """Identifies a version of given file by its modification time and size,
+        that of their archive plus their name for archive members."""
+        path, sep, member = srcfile.partition(archives.MEMBER_SEPARATOR)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if sep:
+            return stat.st_mtime_ns, stat.st_size, member
+        return stat.st_mtime_ns, stat.st_size
+
+    def scan(self):
+        """Looks for source files modified, added or removed since last scan.
+        @return the list of modified files, all of them on first scan.
+        """
+        changed = []
+        if self.find:
+            srcfiles = list(self.find())
+            found = set(srcfiles)
+            for srcfile in self.srcfiles:
+                if srcfile not in found:
+                    self.stamps.pop(srcfile, None)
+                    self.fragments.pop(srcfile, None)
+                    changed.append(srcfile)
+            self.srcfiles = srcfiles
+        for srcfile in self.srcfiles:
+            stamp = self.stamp(srcfile)
+            if srcfile not in self.stamps or self.stamps[srcfile] != stamp:
+                self.stamps[srcfile] = stamp
+                changed.append(srcfile)
+        return changed
+
+    def refresh(self, srcfiles):
+        """Parses given files again and renders their new fragments."""
+        jobs = self.jobs if len(srcfiles) > 1 else 1
+        for srcfile, infos in self.gen.extract_files(
+                srcfiles, self.errormsg, jobs, self.cache):
+            if infos is None:
+                self.fragments[srcfile] = None
+            else:
+                self.fragments[srcfile] = self.gen.render(infos)
+
+    def write(self):
+        """Rewrites the whole output from the rendered fragments."""
+        dest = self.gen.dest
+        if dest.seekable():
+            dest.seek(0)
+            dest.truncate()
+        self.gen.header()
+        # grouped by namespace, even if streaming
+        for srcfile in self.gen.output_order(self.srcfiles):
+            fragment = self.fragments.get(srcfile)
+            if fragment is not None:
+                self.gen.write_file(srcfile, fragment)
+        self.gen.footer()
+        dest.flush()
+
+    def update(self):
+        """Regenerates the output if some source files changed.
+        @return the list of modified files
+        """
+        changed = self.scan()
+        if changed:
+            # files no longer found are only dropped
+            self.refresh([srcfile for srcfile in changed if srcfile in self.stamps])
+            self.write()
+            logger.info("Regenerated output, changed: %s", ', '.join(changed))
+        return changed
+
+    def run(self, interval=1.0):
+        """Watches source files until interrupted.
+
+        @param interval: seconds between two scans
+        """
+        try:
+            while True:
+                self.update()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass